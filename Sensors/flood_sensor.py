@@ -3,58 +3,92 @@ This program will serve as thread of "main.py" to detect
 water with a liquid sensor. If the Voltage is "HIGH"
 it means there's no water detected, when the Voltage is
 "LOW" will send a signal to "main.py" and then to
-"metrics_receiver.py" so submmit a job to MINT 
+"metrics_receiver.py" so submmit a job to MINT.
+The pin is watched with edge interrupts (gpiozero), every
+debounced transition is timestamped, and a flood between
+two reads is latched so a short pulse is never missed.
 """
 
 
 
 import os
-import time
 import logging
-import RPi.GPIO as GPIO
+import threading
+from collections import deque
 from dotenv import load_dotenv
+from hal import get_backend, get_clock
 
 
 
 # === ENVIRONMENT  VARIABLES ===
 load_dotenv("./Env/.env.config")  # Config env variables
 
+# === CONFIGURATION ===
+FLOOD_DEBOUNCE = float(os.getenv('FLOOD_DEBOUNCE') or 0.05) # Seconds the pin changes are ignored after an edge
+FLOOD_TRANSITIONS = int(os.getenv('FLOOD_TRANSITIONS') or 256) # Transitions kept in memory
+
 # === SENSOR SETUP ===
 CHANNEL = int(os.getenv('FLOOD_SENSOR'))
-GPIO.setmode(GPIO.BCM) # (BCM or BOARD)
-GPIO.setup(CHANNEL, GPIO.IN)
+# LOW = water detected, so the device is active on LOW
+flood_sensor = get_backend().digital_input(CHANNEL, active_state=False, bounce_time=FLOOD_DEBOUNCE)
+CLOCK = get_clock()
+
+# === GLOBALS SETUP to track the state ===
+state_lock = threading.Lock()
+flooded = bool(flood_sensor.is_active) # Current debounced state
+latched = flooded # Water seen since the last read
+transitions = deque(maxlen=FLOOD_TRANSITIONS) # (epoch seconds, monotonic ns, 1 = water / 0 = dry)
 
 # === LOGGING SETUP ===
 logger = logging.getLogger(__name__)
 
 
 
-def get_flood_data():
+def record_transition(state):
     """
-    This function return two signals for further processing
-    based if the liquid sensordetects water or not.
+    Called by the pin interrupts. Only keeps the new state and its time.
     """
+    global flooded, latched
+    with state_lock:
+        if state == flooded:
+            return
+        flooded = state
+        latched = latched or state
+        transitions.append((CLOCK.time(), CLOCK.monotonic_ns(), int(state)))
+    if state:
+        logger.info("🌊 Water detected by the Flood Sensor.")
+    else:
+        logger.info("☀️ Flood Sensor dry again.")
+
+# Configure the event Manager of the Sensor
+flood_sensor.when_activated = lambda: record_transition(True)
+flood_sensor.when_deactivated = lambda: record_transition(False)
 
-    try:
-        while True:
-            sensor_state = GPIO.input(CHANNEL)
 
-            # HIGH = No water detected -> do nothing
-            if sensor_state == GPIO.HIGH:
-                time.sleep(5) # Wait 5 seconds to try to detect again
-                # return "NOTHING_DETECTED"
-                return 0
+def get_flood_data():
+    """
+    This function return two signals for further processing
+    based if the liquid sensordetects water or not: 1 if there
+    was water at any moment since the last call, otherwise 0.
+    It doesn't touch the pin, so it never blocks.
+    """
+    global latched
+    with state_lock:
+        value = 1 if latched or flooded else 0
+        # The latch restarts from the current state
+        latched = flooded
+    return value
 
-            else:
-                # Return if Flood is DETECTED
-                #logger.info("Flooding has been DETECTED and sent to submmit the Model!")
-                return 1
 
-    except Exception as e:
-        logger.info("\n❌ An error has occurred with the Flood Sensor: \n\n %s", e)
+def get_flood_transitions(since=None):
+    """
+    Timestamped transitions (epoch seconds, monotonic ns, state), oldest first
+    """
+    with state_lock:
+        return [item for item in transitions if since is None or item[0] > since]
 
 if __name__ == "__main__":
-    get_flood_data()
+    print(get_flood_data())
 
 
 
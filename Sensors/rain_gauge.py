@@ -9,6 +9,11 @@ as an hourly average and stored.
 sent to Upstream-dso each day. If the average of the mm per minute 
 from the past 60 logs is more than 10mm it will send all the 
 information that it have in queue to send that day
+
+Every tip is kept with its monotonic time in a ring buffer, so
+the totals per read are exact (the tip counter is never reset)
+and the rain intensity over the last seconds or minutes can be
+computed at any time.
 """
 
 
@@ -16,8 +21,10 @@ information that it have in queue to send that day
 import os
 import time
 import logging
-from gpiozero import Button
+import threading
+from array import array
 from dotenv import load_dotenv
+from hal import get_backend, get_clock
 
 
 
@@ -27,12 +34,7 @@ load_dotenv("./Env/.env.config") # PATH WHEN RUN ON THREAD
 
 # === CONFIGURATION ===
 BUCKET_SIZE = float(os.getenv('BUCKET_SIZE'))  # mm per tip, adjust if needed
-
-# === SENSOR SETUP ===
-rain_sensor = Button(int(os.getenv('RAINFALL_SENSOR'))) # Previous 27
-
-# === GLOBALS SETUP to track counts and timing ===
-count = 0
+RAIN_TIP_CAPACITY = int(os.getenv('RAIN_TIP_CAPACITY') or 4096) # Tip times kept in the ring buffer
 
 # === LOGGING SETUP ===
 logger = logging.getLogger(__name__)
@@ -41,12 +43,63 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 
 
+class TipLog:
+    """
+    Ring buffer of the tip times (monotonic ns) with a total that only
+    grows. Each sliding window keeps a cursor on its oldest tip that
+    only moves forward, so an intensity never rescans the history.
+    """
+
+    def __init__(self, capacity=RAIN_TIP_CAPACITY):
+        self.capacity = capacity
+        self.times = array("Q", bytes(8 * capacity))
+        self.total = 0 # Tips since the start
+        self.lock = threading.Lock()
+        self.cursors = {} # window ns -> index of the oldest tip in the window
+        self.read_total = 0 # Total at the last get_rain_data()
+
+    def record(self, moment_ns=None):
+        with self.lock:
+            self.times[self.total % self.capacity] = moment_ns if moment_ns is not None else CLOCK.monotonic_ns()
+            self.total += 1
+
+    def take_interval(self):
+        """
+        Tips since the previous call (exact, even if the ring wrapped)
+        """
+        with self.lock:
+            tips = self.total - self.read_total
+            self.read_total = self.total
+        return tips
+
+    def tips_in_window(self, window_seconds, now_ns=None):
+        """
+        Tips in the last "window_seconds" (at most the capacity of the ring)
+        """
+        window_ns = int(window_seconds * 1e9)
+        now_ns = now_ns if now_ns is not None else CLOCK.monotonic_ns()
+        with self.lock:
+            cursor = max(self.cursors.get(window_ns, 0), self.total - self.capacity)
+            while cursor < self.total and self.times[cursor % self.capacity] <= now_ns - window_ns:
+                cursor += 1
+            self.cursors[window_ns] = cursor
+            return self.total - cursor
+
+
+# === SENSOR SETUP ===
+rain_sensor = get_backend().button(int(os.getenv('RAINFALL_SENSOR'))) # Previous 27
+CLOCK = get_clock()
+
+# === GLOBALS SETUP to track counts and timing ===
+TIP_LOG = TipLog()
+
+
+
 def bucket_tipped():
     """
-    This function is called by the sensor event. It only increase the counter.
+    This function is called by the sensor event. It only records the tip.
     """
-    global count
-    count += 1
+    TIP_LOG.record(CLOCK.monotonic_ns())
 
 # Configure the event Manager of the Sensor
 rain_sensor.when_pressed = bucket_tipped
@@ -54,35 +107,31 @@ rain_sensor.when_pressed = bucket_tipped
 
 def get_rain_data():
     """
-    Counts the ammount of precipitation per minute and return the result in mm.
+    Counts the ammount of precipitation since the last call and return the result in mm.
     """
-    global count
-    # Count the total number in the 60 seconds interval
-    current_count = count
-
     try:
         # Calculate the count by the bucket size to get the volume
-        minute_tips = current_count * BUCKET_SIZE 
-
-        # Restart the counter
-        count = 0
-        
-        return minute_tips
+        return TIP_LOG.take_interval() * BUCKET_SIZE
 
     except Exception as e:
         logger.info("\n❌ An error has occurred with the Rain Sensor: \n\n %s", e)
         return 0
 
 
+def get_rain_intensity(window_seconds=60):
+    """
+    Rain intensity in mm/h over the last "window_seconds"
+    """
+    return TIP_LOG.tips_in_window(window_seconds) * BUCKET_SIZE * 3600 / window_seconds
+
+
 def run_accumulation_test(duration_seconds=60):
     """
     Simulate the job for a 60 seconds collection
     """
-    global count
-
     logger.info("--- 🧪 ACCUMULATION TEST %d SECONDS ---" % duration_seconds)
     logger.info("💧 Raingauge Counter started")
-    logger.info("   Initial counter: %d" % count)
+    logger.info("   Initial counter: %d" % TIP_LOG.total)
 
     start_time = time.time()
 
@@ -90,7 +139,8 @@ def run_accumulation_test(duration_seconds=60):
         time.sleep(1) 
         
     # Call get_rain_data()
-    total_tips_accumulated = count
+    total_tips_accumulated = TIP_LOG.total - TIP_LOG.read_total
+    intensity = get_rain_intensity(duration_seconds)
     logger.info("⏱️ End of the period of  %d seconds." % duration_seconds)
 
     final_result_mm = get_rain_data()
@@ -99,7 +149,8 @@ def run_accumulation_test(duration_seconds=60):
     logger.info("✅ Results of the collection cycle:")
     logger.info("   Total Counts (Tips): %d" % total_tips_accumulated)
     logger.info("   Precipitation accumulated: %.3f mm" % final_result_mm)
-    logger.info("   Global counter after reset: %d" % count)
+    logger.info("   Intensity: %.2f mm/h" % intensity)
+    logger.info("   Tips since start: %d" % TIP_LOG.total)
     logger.info("-" * 40)
 
 if __name__ == "__main__":
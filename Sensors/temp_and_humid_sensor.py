@@ -2,68 +2,175 @@
 This program requires a HiLetgo Module Sensor to work.
 Have the option to record the Temperatura in Celcius or
 Fahrenheit by just commented the formula or not.
+The sensor is read by a background thread on its own cadence,
+with a capped number of retries spaced as the DHT11 requires,
+and callers get the last valid value at once.
 """
 
 import os
 import time
 import logging
 import datetime
-import dht11 as dh
-import RPi.GPIO as GPIO
+import threading
 from dotenv import load_dotenv
+from hal import get_backend, get_clock
 
 
 
 # === ENVIRONMENT  VARIABLES ===
 load_dotenv("./Env/.env.config")  # Config env variables
 
+# === CONFIGURATION ===
+DHT_READ_INTERVAL = float(os.getenv('DHT_READ_INTERVAL') or 30) # Seconds between read cycles
+DHT_MAX_RETRIES = int(os.getenv('DHT_MAX_RETRIES') or 5) # Attempts per cycle before giving up
+DHT_MIN_SPACING = float(os.getenv('DHT_MIN_SPACING') or 2) # Seconds between two attempts (DHT11 needs >= 1)
+DHT_MAX_AGE = float(os.getenv('DHT_MAX_AGE') or 600) # Seconds a value is still returned without a new one
+
 # === SENSOR SETUP ===
 CHANNEL = int(os.getenv('TEMP_&_HUMID_SENSOR'))
-GPIO.setmode(GPIO.BCM) # (BCM or BOARD)
-instance = dh.DHT11(pin = CHANNEL)
+instance = get_backend().dht11(CHANNEL)
+CLOCK = get_clock()
 
 # === LOGGING SETUP ===
 logger = logging.getLogger(__name__)
 
 
 
+class DHTReader:
+    """
+    Background reads of the DHT11: the last valid value with its time,
+    and the attempts, successes and read latency
+    """
+
+    def __init__(self, sensor, interval=DHT_READ_INTERVAL, max_retries=DHT_MAX_RETRIES, min_spacing=DHT_MIN_SPACING):
+        self.sensor = sensor
+        self.interval = interval
+        self.max_retries = max_retries
+        self.min_spacing = min_spacing
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_good = None # (temperature_c, humidity)
+        self.last_good_at = None # CLOCK.monotonic() of the last valid value
+        self.last_attempt = 0.0
+        self.attempts = 0
+        self.successes = 0
+        self.failed_cycles = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="dht11-reader", daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            started = CLOCK.monotonic()
+            self.read_cycle()
+            CLOCK.wait(self.stop_event, max(0.0, self.interval - (CLOCK.monotonic() - started)))
+
+    def read_cycle(self):
+        """
+        Up to "max_retries" attempts, "min_spacing" seconds apart
+        """
+        for attempt in range(self.max_retries):
+            wait_time = self.last_attempt + self.min_spacing - CLOCK.monotonic()
+            if wait_time > 0 and CLOCK.wait(self.stop_event, wait_time):
+                return False
+
+            started = time.perf_counter() # Latency in real time
+            try:
+                result = self.sensor.read()
+                valid = result.is_valid()
+            except Exception as e:
+                logger.debug("DHT11 read error: %s", e)
+                valid = False
+            latency = time.perf_counter() - started
+            self.last_attempt = CLOCK.monotonic()
+
+            with self.lock:
+                self.attempts += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                if valid:
+                    self.successes += 1
+                    self.last_good = (result.temperature, result.humidity)
+                    self.last_good_at = self.last_attempt
+            if valid:
+                return True
+
+        with self.lock:
+            self.failed_cycles += 1
+        logger.warning("⚠️ No valid Temperature and Humidity value after %d attempts.", self.max_retries)
+        return False
+
+    def latest(self):
+        """
+        (value, age in seconds) of the last valid read, (None, None) if there is none
+        """
+        with self.lock:
+            if self.last_good is None:
+                return None, None
+            return self.last_good, CLOCK.monotonic() - self.last_good_at
+
+    def stats(self):
+        with self.lock:
+            return {
+                "attempts": self.attempts,
+                "successes": self.successes,
+                "success_rate": round(self.successes / self.attempts, 3) if self.attempts else None,
+                "failed_cycles": self.failed_cycles,
+                "latency_mean_ms": round(self.latency_total / self.attempts * 1000, 1) if self.attempts else None,
+                "latency_max_ms": round(self.latency_max * 1000, 1),
+            }
+
+
+# === GLOBALS SETUP ===
+READER = DHTReader(instance)
+
+
+
 def get_temp_and_humid_data():
     """
     This function register Temperature and Humidity information
-    based on a HiLetgo Module Sensor.
+    based on a HiLetgo Module Sensor. It returns the last valid
+    (temperature, humidity) of the background reader at once, or
+    None when there is none newer than DHT_MAX_AGE seconds.
     """
-    #logger.info("🌡️ Starting Temperature and Humidity monitoring...")
+    READER.start()
+    value, age = READER.latest()
+    if value is None or age > DHT_MAX_AGE:
+        return None
 
-    try:
-        while True:
-            # Read data from the sensor
-            result = instance.read()
+    temperature_c, humidity = value
+    # Celcius string convertion
+    temperature = f"{temperature_c:.1f}ºC"
 
-            if result.is_valid():
-                # Valid data received
-                temperature_c = result.temperature
-                humidity = result.humidity
-                #now = datetime.datetime.now()
-                #time_string = f"{now.hour}:{now.minute}:{now.second}"
+    # Fahrenheit convertion (uncomment the next lines to convert "temperature" to Fahrenheit)
+    # temperature_f_calc = (temperature_c * 9/5) + 32
+    # temperature = f"{temperature_f_calc:.1f}-F"
 
-                # Celcius string convertion
-                temperature = f"{temperature_c:.1f}ºC"
+    logger.debug("Temperature: %s | Humedity: %.1f %% | Age: %.0f s", temperature, humidity, age)
+    return temperature_c, humidity
 
-                # Fahrenheit convertion (uncomment the next lines to convert "temperature" to Fahrenheit)
-                # temperature_f_calc = (temperature_c * 9/5) + 32
-                # temperature = f"{temperature_f_calc:.1f}-F"
 
-                #logger.info("Time: %s | Temperature: %s | Humedity: %.1f %%", time_string, temperature, humidity)
-                return temperature_c, humidity
+def get_temp_and_humid_age():
+    """
+    Seconds since the last valid value (None if there is none)
+    """
+    return READER.latest()[1]
 
-                # If the lecture was successful, wait 5 seconds for the next one
-                time.sleep(5)
-            # else:
-                # Los códigos de error a menudo indican un fallo temporal de lectura
-                # logger.error("Error reading the sensor. Code: %s. Trying again...", result.error_code)
 
-    except Exception as e:
-        logger.info("\n❌ An error has occurred with the Temperature and Humidity Sensor: \n\n %s", e)
+def get_temp_and_humid_stats():
+    return READER.stats()
 
 if __name__ == "__main__":
-    get_temp_and_humid_data()
+    READER.start()
+    time.sleep(DHT_MIN_SPACING * DHT_MAX_RETRIES + 1)
+    now = datetime.datetime.now()
+    print(f"Time: {now.hour}:{now.minute}:{now.second} | Value: {get_temp_and_humid_data()} | Stats: {get_temp_and_humid_stats()}")
@@ -10,9 +10,12 @@ import sys
 import os
 
 from dotenv import load_dotenv
-from upstream.client import UpstreamClient
 from upstream_api_client.models import CampaignsIn, StationCreate
 
+# Shared Upstream session from the project root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from upstream_session import get_upstream_session
+
 # === ENVIRONMENT  VARIABLES ===
 load_dotenv("../Env/.env.public")  # Public env variables
 load_dotenv("../Env/.env")         # Tapis credentials
@@ -21,16 +24,11 @@ load_dotenv("../Env/.env")         # Tapis credentials
 # Initialize client with CKAN integration
 try:
     print("🌐 Establishing connection...")
-    client = UpstreamClient(
-        username=os.getenv('userid'),
-        password=os.getenv('password'),
-        base_url=os.getenv('BASE_URL'),
-        ckan_url=os.getenv('CKAN_URL'),
-        ckan_organization=os.getenv('CKAN_ORG'),
-    )
-
-    if client.authenticate():
-        print("✅ Connected to Upstream Successfully!\n")
+    # Same client and token cache as metrics_uploader.py
+    client = get_upstream_session().get_client()
+    if not client.is_authenticated():
+        raise RuntimeError("Upstream login did not return a valid token")
+    print("✅ Connected to Upstream Successfully!\n")
 
 except Exception as e:
     print(f"\n❌ Authentication Error or Not Allowed!\n\n{str(e)}")
@@ -0,0 +1,74 @@
+"""
+This program measures the drain of a backlog after an outage:
+a spool of N readings (as left by a long disconnection and a
+reboot) is sent in chunks of at most SEND_CHUNK_BYTES with
+"pending_chunk()" and acknowledged, for several backlog sizes,
+so the time per reading shows if the drain stays linear. It
+also times the server receive loop for the whole backlog as a
+single payload, appending 4 KB pieces to bytes (as before) and
+to a bytearray.
+Run from the project root:
+    python Tests/Benchmarks/backlog_drain_benchmark.py [readings,...] [chunk_bytes]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from send_buffer import SendBuffer
+
+SIZES = [int(value) for value in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10000, 20000, 40000, 80000]
+CHUNK_BYTES = int(sys.argv[2]) if len(sys.argv) > 2 else 256 * 1024
+RECV_SIZE = 4096
+
+
+def fill(spool_dir, readings):
+    buffer = SendBuffer(spool_dir=spool_dir, max_bytes=1 << 40)
+    for number in range(readings):
+        buffer.append({"Sensor": "Rain Gauge", "Value": 0.2794, "Station_Id": 1, "Lat_deg": 18.2, "Lon_deg": -67.1,
+                       "Time": f"2026-01-01 00:{number % 60:02d}:00"})
+    buffer.close()
+
+
+def drain(spool_dir):
+    """
+    (seconds, chunks, readings, largest payload) to send the whole spool
+    """
+    started = time.perf_counter()
+    buffer = SendBuffer(spool_dir=spool_dir, max_bytes=1 << 40) # As after a reboot
+    chunks = sent = largest = 0
+    more = True
+    while more:
+        payload, count, last_seq, more = buffer.pending_chunk(CHUNK_BYTES)
+        if not count:
+            break
+        buffer.acknowledge(last_seq)
+        chunks += 1
+        sent += count
+        largest = max(largest, len(payload))
+    return time.perf_counter() - started, chunks, sent, largest
+
+
+def receive(payload, container):
+    started = time.perf_counter()
+    data = container()
+    for start in range(0, len(payload), RECV_SIZE):
+        data += payload[start:start + RECV_SIZE]
+    return time.perf_counter() - started
+
+
+
+if __name__ == "__main__":
+    print(f"chunks of at most {CHUNK_BYTES} bytes")
+    print(f"{'readings':>10}{'chunks':>8}{'drain s':>10}{'us/reading':>12}{'max chunk B':>13}{'one payload MB':>16}{'recv bytes s':>14}{'recv bytearray s':>18}")
+    for size in SIZES:
+        with tempfile.TemporaryDirectory() as spool_dir:
+            fill(spool_dir, size)
+            whole, _, _ = SendBuffer(spool_dir=spool_dir, max_bytes=1 << 40).pending()
+            seconds, chunks, sent, largest = drain(spool_dir)
+        assert sent == size, f"{sent} readings sent, expected {size}"
+        print(f"{size:>10}{chunks:>8}{seconds:>10.2f}{seconds / size * 1e6:>12.1f}{largest:>13}{len(whole) / 1e6:>16.1f}"
+              f"{receive(whole, bytes):>14.2f}{receive(whole, bytearray):>18.3f}")
@@ -0,0 +1,71 @@
+"""
+This program measures the memory per buffered reading on the
+node: a list of reading dicts (as "main.py" used to keep them)
+against the pre-encoded buffer of "send_buffer.py", and the
+time to build the payload to send from each of them.
+Run from the project root:
+    python Tests/Benchmarks/buffer_memory_benchmark.py [readings]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+READINGS = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+
+
+def make_reading(index):
+    sensor = ("Rain Gauge", "Temperature and Humidity", "Flood Sensor")[index % 3]
+    value = [round(random.uniform(10, 35), 1), round(random.uniform(20, 95), 1)] if index % 3 == 1 else round(random.uniform(0, 5), 2)
+    return {"Sensor": sensor, "Value": value, "Station_Id": 1, "Lat_deg": -33.4489, "Lon_deg": -70.6693}
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, used
+
+
+if __name__ == "__main__":
+    from send_buffer import SendBuffer
+
+    readings = [make_reading(index) for index in range(READINGS)]
+
+    def build_list():
+        # Fresh dicts, so the memory of each reading is counted
+        return [json.loads(json.dumps(reading)) for reading in readings]
+
+    def build_buffer():
+        buffer = SendBuffer(spool_dir=spool_dir, memory_readings=READINGS + 1, max_memory_age=3600)
+        for reading in readings:
+            buffer.append(reading)
+        return buffer
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        dict_list, list_bytes = measure(build_list)
+        buffer, buffer_bytes = measure(build_buffer)
+
+        started = time.perf_counter()
+        list_payload = json.dumps(dict_list).encode("utf-8")
+        list_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        buffer_payload, count, _ = buffer.pending()
+        buffer_seconds = time.perf_counter() - started
+
+    assert json.loads(buffer_payload) == json.loads(list_payload) and count == READINGS
+
+    print(f"{READINGS} readings")
+    print(f"{'representation':<20}{'bytes/reading':>15}{'total MB':>12}{'payload ms':>12}")
+    print(f"{'list of dicts':<20}{list_bytes / READINGS:>15.1f}{list_bytes / 1e6:>12.2f}{list_seconds * 1000:>12.1f}")
+    print(f"{'pre-encoded buffer':<20}{buffer_bytes / READINGS:>15.1f}{buffer_bytes / 1e6:>12.2f}{buffer_seconds * 1000:>12.1f}")
@@ -0,0 +1,77 @@
+"""
+This program runs the sensor side of "main.py" off-device: the
+sensor modules on the simulated backend replay a synthetic trace
+at high speed through the scheduler, the aggregator and the send
+buffer, then it prints the reads, jitter and buffered data, and
+checks that every rain tip of the trace reached the buffer.
+Run from the project root:
+    python Tests/Benchmarks/node_pipeline_benchmark.py [simulated_hours] [speed]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT)
+os.chdir(ROOT) # The sensor modules read ./Env/.env.config
+
+HOURS = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+SPEED = float(sys.argv[2]) if len(sys.argv) > 2 else 1000
+os.environ.update(SENSOR_BACKEND="simulated", SIM_SPEED=str(SPEED), SIM_HOURS=str(HOURS), DHT_READ_INTERVAL="30")
+
+
+
+if __name__ == "__main__":
+    import hal
+    from send_buffer import SendBuffer
+    from sensor_scheduler import SensorScheduler
+    from sensor_aggregator import SensorAggregator, MODE_SUM, MODE_MAX, MODE_MEAN
+    from Sensors.rain_gauge import get_rain_data, BUCKET_SIZE, TIP_LOG
+    from Sensors.flood_sensor import get_flood_data, get_flood_transitions
+    from Sensors.temp_and_humid_sensor import get_temp_and_humid_data, get_temp_and_humid_stats
+
+    backend = hal.get_backend()
+    clock = backend.clock
+    with tempfile.TemporaryDirectory() as spool_dir:
+        buffer = SendBuffer(spool_dir=spool_dir, memory_readings=10 ** 7, max_memory_age=10 ** 9)
+        aggregator = SensorAggregator(lambda name, value, stats, at: buffer.append({"Sensor": name, "Value": value}))
+        aggregator.register("Rain Gauge", MODE_SUM)
+        aggregator.register("Flood Sensor", MODE_MAX, transitions=True)
+        aggregator.register("Temperature and Humidity", MODE_MEAN)
+
+        scheduler = SensorScheduler(lambda name, value, due: aggregator.add(name, value, due))
+        scheduler.add("Rain Gauge", get_rain_data, 60)
+        scheduler.add("Flood Sensor", get_flood_data, 1)
+        scheduler.add("Temperature and Humidity", get_temp_and_humid_data, 60)
+
+        cpu_started = time.process_time()
+        real_started = time.perf_counter()
+        scheduler.start()
+        backend.start() # The sensor modules have registered their devices
+        while not backend.finished.is_set():
+            clock.sleep(aggregator.next_flush() - clock.time())
+            aggregator.flush(clock.time())
+        scheduler.stop()
+        aggregator.flush()
+        real_seconds = time.perf_counter() - real_started
+        cpu_seconds = time.process_time() - cpu_started
+
+        # Last rain tips after the last rain read
+        tips_left = TIP_LOG.total - TIP_LOG.read_total
+        payload, count, _ = buffer.pending()
+        readings = json.loads(payload) if count else []
+
+    rain_buffered = sum(reading["Value"] for reading in readings if reading["Sensor"] == "Rain Gauge")
+    rain_trace = TIP_LOG.total * BUCKET_SIZE
+    print(f"{HOURS:g} simulated hours at {clock.speed:.0f}x in {real_seconds:.1f} s (CPU {cpu_seconds:.1f} s)")
+    print(f"trace events replayed: {backend.replayed}, flood transitions: {len(get_flood_transitions())}")
+    for name, stats in scheduler.stats().items():
+        print(f"  {name:<26} {stats}")
+    print(f"  DHT11 reader               {get_temp_and_humid_stats()}")
+    print(f"readings buffered: {count} ({len(payload)} bytes)")
+    print(f"rain: trace {rain_trace:.2f} mm, buffered {rain_buffered:.2f} mm + {tips_left * BUCKET_SIZE:.2f} mm not read yet")
+    assert abs(rain_trace - rain_buffered - tips_left * BUCKET_SIZE) < 1e-6, "rain tips lost in the pipeline"
+    assert TIP_LOG.total == sum(1 for event in backend.events if event[1] == hal.EVENT_TIP), "trace tips not replayed"
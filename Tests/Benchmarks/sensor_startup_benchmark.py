@@ -0,0 +1,95 @@
+"""
+This program measures how long the sensors of a node take to be
+ready: importing the drivers one after the other (as "main.py"
+did) against the registry of "sensor_registry.py", where each
+driver is imported by its first read in a scheduler worker.
+The drivers are stand-ins whose import waits like a hardware
+setup, plus one that always fails, which stops the sequential
+start but not the registry.
+Run from the project root:
+    python Tests/Benchmarks/sensor_startup_benchmark.py [setup_seconds,...]
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+SETUP_SECONDS = [float(value) for value in sys.argv[1].split(",")] if len(sys.argv) > 1 else [0.3, 0.5, 1.0]
+
+DRIVER = """
+import time
+time.sleep({seconds})
+def read():
+    return 1
+"""
+BROKEN_DRIVER = """
+raise OSError("no device on the pin")
+"""
+
+
+def write_drivers(directory, prefix):
+    """
+    {name: "module:function"} of the stand-in drivers written to "directory"
+    """
+    targets = {}
+    for index, seconds in enumerate(SETUP_SECONDS):
+        with open(os.path.join(directory, f"{prefix}_sensor_{index}.py"), "w") as file:
+            file.write(DRIVER.format(seconds=seconds))
+        targets[f"Sensor {index} ({seconds:g} s setup)"] = f"{prefix}_sensor_{index}:read"
+    with open(os.path.join(directory, f"{prefix}_broken.py"), "w") as file:
+        file.write(BROKEN_DRIVER)
+    targets["Broken sensor"] = f"{prefix}_broken:read"
+    return targets
+
+
+def sequential(targets):
+    import importlib
+    started = time.perf_counter()
+    ready = {}
+    for name, target in targets.items():
+        module, _, func = target.partition(":")
+        try:
+            getattr(importlib.import_module(module), func)
+        except Exception as e:
+            return ready, f"stopped at {name}: {e}"
+        ready[name] = time.perf_counter() - started
+    return ready, None
+
+
+def concurrent(targets):
+    from sensor_registry import SensorRegistry, SensorDriver
+    drivers = {name: SensorDriver(name, target, "config") for name, target in targets.items()}
+    registry = SensorRegistry(lambda driver: None, drivers=drivers, retry=60)
+    registry.start()
+    with ThreadPoolExecutor(max_workers=len(drivers)) as executor: # First read of every sensor, as the scheduler does
+        values = dict(zip(drivers, executor.map(lambda name: registry.reader(name)(), drivers)))
+    assert values["Broken sensor"] is None and all(value == 1 for name, value in values.items() if name != "Broken sensor")
+    return {name: stats["ready_after_s"] for name, stats in registry.stats().items()}
+
+
+def show(seconds, missing):
+    return f"{seconds:.2f}" if seconds is not None else missing
+
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as directory:
+        sys.path.insert(0, directory)
+        sequential_ready, error = sequential(write_drivers(directory, "sequential"))
+        registry_ready = concurrent(write_drivers(directory, "registry"))
+
+    print(f"{'sensor':<28}{'sequential s':>14}{'registry s':>12}")
+    for name, registry_seconds in registry_ready.items():
+        print(f"{name:<28}{show(sequential_ready.get(name), '-'):>14}{show(registry_seconds, 'retrying'):>12}")
+    if error:
+        print(f"sequential start {error} (the node would not start)")
+    print(f"all working sensors ready: sequential {max(sequential_ready.values()):.2f} s, "
+          f"registry {max(value for value in registry_ready.values() if value is not None):.2f} s")
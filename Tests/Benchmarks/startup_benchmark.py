@@ -0,0 +1,58 @@
+"""
+This program measures the startup cost of each entry point:
+the time to import the module in a fresh interpreter, the peak
+RSS after the import and which heavy dependencies got loaded.
+Run from the project root:
+    python Tests/Benchmarks/startup_benchmark.py [runs]
+"""
+
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+ENTRY_POINTS = ["metrics_receiver", "metrics_uploader", "upload_queue", "archive_manager", "main"]
+HEAVY_MODULES = ["requests", "upstream", "tapipy", "pandas", "urllib3"]
+
+PROBE = """
+import sys, time, json, resource
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [name for name in {heavy} if name in sys.modules],
+}}))
+"""
+
+# Placeholders for the variables that the entry points read on start
+ENVIRONMENT = dict(os.environ, STATION_ID=os.getenv("STATION_ID", "1"), CAMPAIGN_ID=os.getenv("CAMPAIGN_ID", "1"),
+                   GPS_LAT=os.getenv("GPS_LAT", "0"), GPS_LON=os.getenv("GPS_LON", "0"), RECENT_API_PORT="0",
+                   RECEIVER_PORT=os.getenv("RECEIVER_PORT") or "4040")
+
+
+def measure(module):
+    results = []
+    for _ in range(RUNS):
+        completed = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                   cwd=ROOT, env=ENVIRONMENT, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return None, completed.stderr.strip().splitlines()[-1]
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return results, None
+
+
+if __name__ == "__main__":
+    print(f"{'entry point':<20}{'import ms':>12}{'max RSS MB':>12}  heavy modules loaded")
+    for module in ENTRY_POINTS:
+        results, error = measure(module)
+        if results is None:
+            print(f"{module:<20}{'-':>12}{'-':>12}  not importable here: {error}")
+            continue
+        seconds = statistics.median(result["seconds"] for result in results)
+        rss = statistics.median(result["rss_mb"] for result in results)
+        print(f"{module:<20}{seconds * 1000:>12.1f}{rss:>12.1f}  {', '.join(results[0]['heavy']) or '-'}")
@@ -0,0 +1,93 @@
+"""
+This program benchmarks the per-station uploads of
+"metrics_uploader.py" against a local stand-in of the
+Upstream API with a configurable latency.
+Run from the project root:
+    python Tests/Benchmarks/upload_benchmark.py [stations] [latency_seconds]
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+STATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+ROWS_PER_STATION = 60
+
+
+
+class StandInUpstream(BaseHTTPRequestHandler):
+    """
+    Answers the login and the CSV uploads after LATENCY seconds
+    """
+    protocol_version = "HTTP/1.1"
+    uploads = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(LATENCY)
+        if self.path.endswith("/token"):
+            body = {"access_token": "benchmark", "expires_in": 3600}
+        else:
+            with StandInUpstream.lock:
+                StandInUpstream.uploads += 1
+            body = {"uploaded": True}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_hourly_file(path):
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file)
+        writer.writerow(['Precipitation', 'Temperature', 'Humidity', 'Flooding', 'Node_Id', 'Station_Id', 'collectiontime', "Lat_deg", "Lon_deg"])
+        for minute in range(ROWS_PER_STATION):
+            for station in range(1, STATIONS + 1):
+                writer.writerow([0.0, 21.5, 60, 0, f"NODE_{station}", station, f"2025-10-18 13:{minute:02d}:00", 30.28, -97.73])
+
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInUpstream)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.update({
+        "BASE_URL": f"http://127.0.0.1:{server.server_address[1]}",
+        "userid": "benchmark", "password": "benchmark",
+        "STATION_ID": os.getenv("STATION_ID") or "1", "CAMPAIGN_ID": os.getenv("CAMPAIGN_ID") or "1",
+    })
+    import metrics_uploader
+
+    metrics_uploader.init_sensor_file()
+    hourly_file = os.path.join(tempfile.mkdtemp(), "metrics_data_benchmark.csv")
+    create_hourly_file(hourly_file)
+
+    print(f"Stations: {STATIONS} | Rows: {STATIONS * ROWS_PER_STATION} | Latency: {LATENCY}s")
+    print(f"{'workers':>8} {'seconds':>9} {'stations/s':>11} {'ok':>4}")
+    for workers in (1, 2, 4, 8):
+        metrics_uploader.UPLOAD_WORKERS = workers
+        metrics_uploader.UPLOAD_HOST_CONCURRENCY = workers
+        metrics_uploader.HOST_SEMAPHORES.clear()
+
+        start = time.perf_counter()
+        success = metrics_uploader.submit_file_to_upstream(hourly_file)
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>8} {elapsed:>9.2f} {STATIONS / elapsed:>11.1f} {str(success):>4}")
+
+    os.remove(hourly_file)
+    server.shutdown()
@@ -0,0 +1,103 @@
+"""
+This program stress tests the handoff between the sensor threads
+and the sender of "send_buffer.py": several writers append
+readings while a sender takes the pending payload, waits for a
+simulated ACK (sometimes lost) and acknowledges what it sent,
+with small memory chunks so the disk spool is used too, and
+optionally a size cap per send. The writers and the sender move
+in lockstep: each send runs while the writers append their next
+step of readings, so sends, spills and appends really overlap.
+Each send must start right after the last acknowledged seq (no
+gap, no duplicate), and every reading must be delivered exactly
+once and in order.
+Run from the project root:
+    python Tests/send_buffer_test.py [writers] [readings_per_writer] [max_payload_bytes] [step]
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from send_buffer import SendBuffer
+
+WRITERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+READINGS = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+MAX_BYTES = int(sys.argv[3]) if len(sys.argv) > 3 else None # Payload cap per send (None = everything)
+STEP = int(sys.argv[4]) if len(sys.argv) > 4 else 50 # Readings of each writer between two sends
+LOST_ACK_RATE = 0.2 # Share of the sends whose ACK never arrives
+MEMORY_READINGS = 300 # Small memory buffer: lost ACKs make it spill while sending
+
+
+
+def writer(buffer, writer_id, step):
+    for number in range(READINGS):
+        buffer.append({"Sensor": "Rain Gauge", "Value": number, "Station_Id": writer_id, "Lat_deg": 0.0, "Lon_deg": 0.0})
+        if (number + 1) % STEP == 0:
+            step.wait() # Lockstep with the sender
+
+
+def send_once(buffer, delivered, acknowledged):
+    """
+    One exchange with a simulated server. Return the last acknowledged seq.
+    """
+    payload, count, last_seq, _ = buffer.pending_chunk(MAX_BYTES)
+    if not count:
+        return acknowledged
+    readings = json.loads(payload)
+    assert len(readings) == count, f"payload has {len(readings)} readings, expected {count}"
+    assert MAX_BYTES is None or count == 1 or len(payload) <= MAX_BYTES, f"payload of {len(payload)} bytes over the cap"
+    first_seq = last_seq - count + 1
+    assert first_seq <= acknowledged + 1, f"seqs {acknowledged + 1}-{first_seq - 1} skipped (gap)"
+    assert first_seq >= acknowledged + 1, f"seqs {first_seq}-{acknowledged} sent again after their ACK (duplicate)"
+    if random.random() < LOST_ACK_RATE:
+        # The server may or may not have the data, the node must send it again
+        return acknowledged
+    delivered.extend(readings)
+    buffer.acknowledge(last_seq)
+    return last_seq
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as spool_dir:
+        buffer = SendBuffer(spool_dir=spool_dir, memory_readings=MEMORY_READINGS, max_memory_age=3600, max_bytes=1 << 40)
+        delivered = []
+        acknowledged = 0
+        step = threading.Barrier(WRITERS + 1)
+        threads = [threading.Thread(target=writer, args=(buffer, writer_id, step)) for writer_id in range(WRITERS)]
+        for thread in threads:
+            thread.start()
+
+        # One send per step, while the writers append the next one
+        sends = 0
+        for _ in range(READINGS // STEP):
+            acknowledged = send_once(buffer, delivered, acknowledged)
+            sends += 1
+            step.wait()
+        for thread in threads:
+            thread.join()
+        interleaved = sends
+
+        # Restart half-way through the drain: the spool must give back the rest
+        buffer.close()
+        buffer = SendBuffer(spool_dir=spool_dir, memory_readings=MEMORY_READINGS, max_memory_age=3600, max_bytes=1 << 40)
+        while len(buffer):
+            acknowledged = send_once(buffer, delivered, acknowledged)
+            sends += 1
+
+    # Exactly once, in order, for each writer
+    received = {}
+    for reading in delivered:
+        received.setdefault(reading["Station_Id"], []).append(reading["Value"])
+    for writer_id in range(WRITERS):
+        values = received.get(writer_id, [])
+        assert values == list(range(READINGS)), f"writer {writer_id}: {len(values)} readings, lost or duplicated"
+    assert buffer.dropped == 0
+    assert interleaved >= READINGS // STEP, "the sends didn't overlap the writers"
+
+    print(f"✅ {WRITERS * READINGS} readings delivered exactly once, without seq gaps or duplicates, in {sends} sends "
+          f"({interleaved} while writing, {LOST_ACK_RATE:.0%} ACKs lost, cap {MAX_BYTES or '-'} bytes).")
@@ -0,0 +1,193 @@
+"""
+This program switches "main.py" between a quiet and an event
+profile. The rain intensity of the last minutes (from the rain
+gauge values) and the flood sensor decide the profile, with
+separate enter and exit thresholds plus a minimum time in the
+event profile so it doesn't flap. A profile sets the sampling
+period of each sensor and how often the buffered data is
+offered to the server. Switches, time in each profile and the
+data held back are counted to evaluate the bandwidth saved.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import logging
+import threading
+from collections import deque
+from dotenv import load_dotenv
+from hal import get_clock
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_dotenv("./Env/.env.config")
+
+
+# ====== PROFILE SETTINGS ======
+ADAPTIVE_PROFILES = (os.getenv("ADAPTIVE_PROFILES") or "false").strip().lower() in ("1", "true", "yes")
+QUIET_REPORT_INTERVAL = float(os.getenv("QUIET_REPORT_INTERVAL") or 900) # Seconds between data offers when quiet
+EVENT_REPORT_INTERVAL = float(os.getenv("EVENT_REPORT_INTERVAL") or 60) # Seconds between data offers in an event
+EVENT_RAIN_ENTER = float(os.getenv("EVENT_RAIN_ENTER") or 2.0) # mm/h to enter the event profile
+EVENT_RAIN_EXIT = float(os.getenv("EVENT_RAIN_EXIT") or 0.5) # mm/h under which the event may end
+EVENT_RAIN_WINDOW = float(os.getenv("EVENT_RAIN_WINDOW") or 600) # Seconds of rain for the intensity
+EVENT_MIN_DURATION = float(os.getenv("EVENT_MIN_DURATION") or 1800) # Seconds in event after the last trigger
+
+
+# ====== PROFILES ======
+PROFILE_QUIET = "quiet"
+PROFILE_EVENT = "event"
+REPORT_SLACK = 5.0 # Seconds, the server asks at minute boundaries
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+##################################### ADAPTIVE PROFILES ##########################################
+##################################################################################################
+class Profile:
+    """
+    Sampling periods per sensor and seconds between data offers
+    """
+
+    __slots__ = ("name", "periods", "report_interval")
+
+    def __init__(self, name, periods, report_interval):
+        self.name = name
+        self.periods = periods
+        self.report_interval = report_interval
+
+
+class ProfileController:
+    """
+    Chooses the profile from the rain and flood values and tells the
+    client when the buffered data should be offered. "on_switch(profile)"
+    applies the sampling periods of a new profile.
+    """
+
+    def __init__(self, quiet, event, on_switch=None, rain_sensor="Rain Gauge", flood_sensor="Flood Sensor",
+                 rain_enter=EVENT_RAIN_ENTER, rain_exit=EVENT_RAIN_EXIT, rain_window=EVENT_RAIN_WINDOW,
+                 min_duration=EVENT_MIN_DURATION, enabled=ADAPTIVE_PROFILES, clock=None):
+        self.profiles = {PROFILE_QUIET: quiet, PROFILE_EVENT: event}
+        self.on_switch = on_switch
+        self.rain_sensor = rain_sensor
+        self.flood_sensor = flood_sensor
+        self.rain_enter = rain_enter
+        self.rain_exit = rain_exit
+        self.rain_window = rain_window
+        self.min_duration = min_duration
+        self.enabled = enabled
+        self.clock = clock or get_clock() # Simulated time with the simulated sensors
+        self.lock = threading.Lock()
+        self.rain = deque() # (time, mm) in the window
+        self.rain_total = 0.0
+        self.flooded = False
+        self.active = quiet
+        self.since = self.clock.time()
+        self.last_trigger = None
+        self.last_report = 0.0
+        self.switches = 0
+        self.seconds = {PROFILE_QUIET: 0.0, PROFILE_EVENT: 0.0}
+        self.offers_sent = 0
+        self.offers_held = 0
+        self.bytes_sent = 0
+
+    def observe(self, sensor_name, value, at=None):
+        """
+        Take a rain or flood value (called for each read)
+        """
+        if not self.enabled or value is None:
+            return
+        at = at or self.clock.time()
+        with self.lock:
+            if sensor_name == self.rain_sensor:
+                self.rain.append((at, float(value)))
+                self.rain_total += float(value)
+            elif sensor_name == self.flood_sensor:
+                self.flooded = bool(value)
+            else:
+                return
+            switch = self.evaluate(at)
+        if switch is not None and self.on_switch is not None:
+            self.on_switch(switch)
+
+    def rain_rate(self, at):
+        """
+        Rain intensity in mm/h over the window (must be called with the lock held)
+        """
+        while self.rain and self.rain[0][0] <= at - self.rain_window:
+            self.rain_total -= self.rain.popleft()[1]
+        return max(self.rain_total, 0.0) * 3600 / self.rain_window
+
+    def evaluate(self, at):
+        """
+        Return the new profile on a switch (must be called with the lock held)
+        """
+        rate = self.rain_rate(at)
+        if self.flooded or rate >= (self.rain_exit if self.active.name == PROFILE_EVENT else self.rain_enter):
+            self.last_trigger = at
+            target = PROFILE_EVENT
+        elif self.active.name == PROFILE_EVENT and at - (self.last_trigger or at) < self.min_duration:
+            target = PROFILE_EVENT # Hold the event a while after the last trigger
+        else:
+            target = PROFILE_QUIET
+
+        if target == self.active.name:
+            return None
+        now = self.clock.time()
+        self.seconds[self.active.name] += now - self.since
+        self.since = now
+        self.active = self.profiles[target]
+        self.switches += 1
+        if target == PROFILE_EVENT:
+            self.last_report = 0.0 # Offer the held data right away
+        logger.info("🔀 Switched to the %s profile (rain %.2f mm/h, flood %d). Switches: %d.", target, rate, self.flooded, self.switches)
+        return self.active
+
+    def report_due(self, now=None):
+        """
+        True if the buffered data should be offered to the server now
+        """
+        if not self.enabled:
+            return True # Every exchange, as without profiles
+        now = self.clock.time() if now is None else now
+        with self.lock:
+            return now - self.last_report >= self.active.report_interval - REPORT_SLACK
+
+    def record_offer(self, sent_bytes=0, held=False, now=None):
+        """
+        Count an exchange with the server (data sent or held back)
+        """
+        with self.lock:
+            if held:
+                self.offers_held += 1
+                return
+            self.offers_sent += 1
+            self.bytes_sent += sent_bytes
+            self.last_report = self.clock.time() if now is None else now
+
+    def stats(self):
+        with self.lock:
+            seconds = dict(self.seconds)
+            seconds[self.active.name] += self.clock.time() - self.since
+            return {
+                "profile": self.active.name,
+                "switches": self.switches,
+                "quiet_seconds": round(seconds[PROFILE_QUIET]),
+                "event_seconds": round(seconds[PROFILE_EVENT]),
+                "offers_sent": self.offers_sent,
+                "offers_held": self.offers_held,
+                "bytes_sent": self.bytes_sent,
+            }
+
+    def log_stats(self):
+        logger.info("📈 Profiles: %s", ", ".join(f"{key}={value}" for key, value in self.stats().items()))
+##################################################################################################
@@ -0,0 +1,368 @@
+"""
+This program keeps the hourly CSV files produced by
+"metrics_receiver.py" in an archive partitioned by day
+and hour, and maintains a small manifest index with the
+row count, stations, time bounds, checksum and upload
+status of each partition, so queries only open the
+partitions they need.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import re
+import sys
+import csv
+import json
+import shutil
+import hashlib
+import logging
+import datetime
+import threading
+from settings import load_environment
+from file_compressor import open_metrics_file, get_codec
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_environment()
+
+
+# ====== ARCHIVE PATHS ======
+LOG_DIR = "./Logs/"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR") or os.path.join(LOG_DIR, "Archive/")
+MANIFEST_FILE = os.path.join(ARCHIVE_DIR, "manifest.json")
+
+
+# Keep uploaded files in the archive (false = delete them, manifest entry is kept)
+KEEP_UPLOADED_FILES = (os.getenv("ARCHIVE_KEEP_UPLOADED") or "true").strip().lower() in ("1", "true", "yes")
+
+
+# ====== UPLOAD STATUS VALUES ======
+STATUS_PENDING = "pending"
+STATUS_UPLOADED = "uploaded"
+STATUS_FAILED = "failed"
+
+
+# ====== GLOBAL LOCKS ======
+MANIFEST_LOCK = threading.Lock()
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+FILENAME_PATTERN = re.compile(r"(\d{8})_(\d{2})\d{4}")
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+###################################### MANIFEST HANDLING #########################################
+##################################################################################################
+def load_manifest():
+    """
+    Read the manifest index, an empty one is returned if it doesn't exist
+    """
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+        manifest.setdefault("partitions", {})
+        return manifest
+    except FileNotFoundError:
+        return {"partitions": {}}
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error("❌ Manifest %s unreadable, rebuilding it from the archive: %s", MANIFEST_FILE, e)
+        return rebuild_manifest(save=False)
+
+
+def save_manifest(manifest):
+    """
+    Write the manifest atomically (temp file + rename) so a
+    power loss never leaves a half written index
+    """
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    tmp_path = MANIFEST_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def scan_csv_file(file_path):
+    """
+    Read a metrics CSV once and return its row count, stations,
+    time bounds, size and SHA-256 checksum
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(65536), b""):
+            sha256.update(block)
+
+    rows = 0
+    stations = set()
+    start = end = None
+    with open_metrics_file(file_path) as file:
+        for row in csv.DictReader(file):
+            rows += 1
+            station_id = row.get("Station_Id")
+            if station_id:
+                stations.add(station_id)
+            collection_time = row.get("collectiontime")
+            if collection_time:
+                if start is None or collection_time < start:
+                    start = collection_time
+                if end is None or collection_time > end:
+                    end = collection_time
+
+    return {
+        "rows": rows,
+        "stations": sorted(stations),
+        "start": start,
+        "end": end,
+        "size_bytes": os.path.getsize(file_path),
+        "codec": get_codec(file_path),
+        "sha256": sha256.hexdigest(),
+    }
+
+
+def get_partition_dir(file_name, start=None):
+    """
+    Return the day/hour directory of a partition, based on the first
+    collection time of its rows or, if empty, on the file name
+    """
+    if start:
+        stamp = datetime.datetime.strptime(start, TIME_FORMAT)
+    else:
+        match = FILENAME_PATTERN.search(file_name)
+        if match:
+            stamp = datetime.datetime.strptime(match.group(1) + match.group(2), "%Y%m%d%H")
+        else:
+            stamp = datetime.datetime.now()
+    return os.path.join(ARCHIVE_DIR, stamp.strftime("%Y-%m-%d"), stamp.strftime("%H"))
+
+
+def rebuild_manifest(save=True):
+    """
+    Scan the archive directories and rebuild the manifest from the
+    files found (upload status is unknown and set to "pending")
+    """
+    manifest = {"partitions": {}}
+    if os.path.isdir(ARCHIVE_DIR):
+        for root, _, files in os.walk(ARCHIVE_DIR):
+            for name in sorted(files):
+                if not name.startswith("metrics_data_"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    entry = scan_csv_file(path)
+                except Exception as e:
+                    logger.error("❌ Could not scan archived file %s: %s", path, e)
+                    continue
+                entry.update({"file": path, "upload_status": STATUS_PENDING})
+                manifest["partitions"][partition_key(name)] = entry
+
+    if save:
+        with MANIFEST_LOCK:
+            save_manifest(manifest)
+    logger.info("📚 Manifest rebuilt with %d partitions.", len(manifest["partitions"]))
+    return manifest
+
+
+def partition_key(file_path):
+    """
+    Key of a partition in the manifest (file name without extension)
+    """
+    return os.path.basename(file_path).split(".")[0]
+##################################################################################################
+
+
+
+###################################### ARCHIVE OPERATIONS ########################################
+##################################################################################################
+def archive_file(file_path, upload_status=STATUS_PENDING):
+    """
+    Move a rotated hourly file into its day/hour partition and record it
+    in the manifest. Return the manifest entry, or None on failure.
+    """
+    try:
+        entry = scan_csv_file(file_path)
+    except Exception as e:
+        logger.error("❌ Could not scan %s before archiving: %s", file_path, e)
+        return None
+
+    name = os.path.basename(file_path)
+    key = partition_key(name)
+    now = datetime.datetime.now().strftime(TIME_FORMAT)
+
+    try:
+        destination_dir = get_partition_dir(name, entry["start"])
+        os.makedirs(destination_dir, exist_ok=True)
+        destination = os.path.join(destination_dir, name)
+        if os.path.abspath(destination) != os.path.abspath(file_path):
+            shutil.move(file_path, destination)
+
+        if upload_status == STATUS_UPLOADED and not KEEP_UPLOADED_FILES:
+            os.remove(destination)
+            destination = None
+
+    except OSError as e:
+        logger.error("❌ Failed to archive %s: %s", file_path, e)
+        return None
+
+    entry.update({
+        "file": destination,
+        "upload_status": upload_status,
+        "archived_at": now,
+        "uploaded_at": now if upload_status == STATUS_UPLOADED else None,
+    })
+
+    with MANIFEST_LOCK:
+        manifest = load_manifest()
+        manifest["partitions"][key] = entry
+        save_manifest(manifest)
+
+    logger.info("🗄️ Archived %s (%d rows, %d stations) as %s.", name, entry["rows"], len(entry["stations"]), upload_status)
+    return entry
+
+
+def set_upload_status(key, upload_status):
+    """
+    Update the upload status of an archived partition
+    """
+    key = partition_key(key)
+    with MANIFEST_LOCK:
+        manifest = load_manifest()
+        entry = manifest["partitions"].get(key)
+        if entry is None:
+            logger.warning("⚠️ Partition %s not found in the manifest.", key)
+            return False
+
+        entry["upload_status"] = upload_status
+        if upload_status == STATUS_UPLOADED:
+            entry["uploaded_at"] = datetime.datetime.now().strftime(TIME_FORMAT)
+            if not KEEP_UPLOADED_FILES and entry.get("file") and os.path.exists(entry["file"]):
+                os.remove(entry["file"])
+                entry["file"] = None
+        save_manifest(manifest)
+    return True
+
+
+def verify_partition(key):
+    """
+    Check the archived file of a partition against its manifest checksum
+    """
+    entry = load_manifest()["partitions"].get(partition_key(key))
+    if not entry or not entry.get("file") or not os.path.exists(entry["file"]):
+        return False
+    return scan_csv_file(entry["file"])["sha256"] == entry["sha256"]
+##################################################################################################
+
+
+
+######################################## ARCHIVE QUERIES #########################################
+##################################################################################################
+def query_partitions(start=None, end=None, station_id=None, upload_status=None):
+    """
+    Return the manifest entries that can contain rows in [start, end]
+    for the given station, ordered by time. Times are strings in
+    "%Y-%m-%d %H:%M:%S" format, any filter can be None.
+    """
+    station_id = str(station_id) if station_id is not None else None
+    selected = []
+
+    for key, entry in load_manifest()["partitions"].items():
+        if upload_status and entry.get("upload_status") != upload_status:
+            continue
+        if station_id is not None and station_id not in entry.get("stations", []):
+            continue
+        if entry.get("start") is None:
+            continue
+        if end is not None and entry["start"] > end:
+            continue
+        if start is not None and entry["end"] < start:
+            continue
+        selected.append(dict(entry, key=key))
+
+    return sorted(selected, key=lambda entry: entry["start"])
+
+
+def read_rows(start=None, end=None, station_id=None):
+    """
+    Generator of the archived rows (dicts) in [start, end] for a
+    station, only opening the partitions selected by the manifest
+    """
+    station_id = str(station_id) if station_id is not None else None
+
+    for entry in query_partitions(start, end, station_id):
+        if not entry.get("file") or not os.path.exists(entry["file"]):
+            continue
+        with open_metrics_file(entry["file"]) as file:
+            for row in csv.DictReader(file):
+                collection_time = row.get("collectiontime") or ""
+                if start is not None and collection_time < start:
+                    continue
+                if end is not None and collection_time > end:
+                    continue
+                if station_id is not None and row.get("Station_Id") != station_id:
+                    continue
+                yield row
+
+
+def get_upload_backlog():
+    """
+    Return the archived partitions that are still not uploaded
+    """
+    return [
+        dict(entry, key=key)
+        for key, entry in sorted(load_manifest()["partitions"].items())
+        if entry.get("upload_status") != STATUS_UPLOADED
+    ]
+
+
+def print_status():
+    """
+    Show the archive content and the upload backlog
+    """
+    partitions = load_manifest()["partitions"]
+    backlog = get_upload_backlog()
+
+    print(f"🗄️ Archive: {ARCHIVE_DIR}")
+    print(f"   Partitions: {len(partitions)}")
+    print(f"   Rows: {sum(entry.get('rows', 0) for entry in partitions.values())}")
+    print(f"   Upload backlog: {len(backlog)} partitions, {sum(entry.get('rows', 0) for entry in backlog)} rows")
+    for entry in backlog:
+        print(f"   - {entry['key']} [{entry['upload_status']}] {entry['start']} -> {entry['end']} stations={','.join(entry['stations'])}")
+##################################################################################################
+
+
+
+#################################### PROGRAM EXECUTION ###########################################
+##################################################################################################
+if __name__ == "__main__":
+    # Usage:
+    #   python archive_manager.py status
+    #   python archive_manager.py rebuild
+    #   python archive_manager.py query "<start>" "<end>" [station_id]
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+
+    if command == "status":
+        print_status()
+    elif command == "rebuild":
+        rebuild_manifest()
+        print_status()
+    elif command == "query" and len(sys.argv) >= 4:
+        station = sys.argv[4] if len(sys.argv) > 4 else None
+        writer = None
+        for archived_row in read_rows(sys.argv[2], sys.argv[3], station):
+            if writer is None:
+                writer = csv.DictWriter(sys.stdout, fieldnames=list(archived_row.keys()))
+                writer.writeheader()
+            writer.writerow(archived_row)
+    else:
+        print("Usage: python archive_manager.py { status | rebuild | query <start> <end> [station_id] }")
+##################################################################################################
@@ -0,0 +1,232 @@
+"""
+This program limits the bandwidth used by "metrics_uploader.py"
+on metered links: a token bucket caps the upload byte rate
+while each request body is being sent, optional daily windows restrict when regular uploads may run,
+and data with flooding can bypass both. Every upload is
+recorded with its size and the time it was throttled.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import csv
+import time
+import logging
+import datetime
+import threading
+from settings import load_environment
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_environment()
+UPLOAD_RATE_LIMIT = int(os.getenv("UPLOAD_RATE_LIMIT") or 0) # Bytes per second, 0 = no limit
+UPLOAD_BURST_BYTES = int(os.getenv("UPLOAD_BURST_BYTES") or 0) # Bucket size, 0 = one second of rate
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES") or 16384) # Request body bytes paid to the bucket at a time
+UPLOAD_WINDOWS = os.getenv("UPLOAD_WINDOWS") or "" # e.g. "22:00-06:00,13:00-14:00", empty = always
+UPLOAD_FLOOD_BYPASS = (os.getenv("UPLOAD_FLOOD_BYPASS") or "true").strip().lower() in ("1", "true", "yes")
+
+
+# ====== PATHS ======
+LOG_DIR = "./Logs/"
+UPLOAD_STATS_FILE = os.path.join(LOG_DIR, "upload_stats.csv")
+STATS_HEADER = ["station", "bytes", "throttled_seconds", "upload_seconds", "bypass", "uploaded_at"]
+STATS_LOCK = threading.Lock()
+
+
+# ====== SHARED LIMITER ======
+_LIMITER = None
+_LIMITER_LOCK = threading.Lock()
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+####################################### TOKEN BUCKET #############################################
+##################################################################################################
+class TokenBucket:
+    """
+    Byte-rate limiter shared by the upload threads. A block takes its
+    bytes at once and may leave the bucket in debt, the next blocks
+    wait until the debt is paid back at "rate" bytes/s.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, size):
+        """
+        Reserve "size" bytes, sleeping while the bucket is in debt.
+        Return the seconds spent waiting.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= size
+            wait_time = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+
+class ThrottledReader:
+    """
+    Request body read by the HTTP client in blocks of at most
+    UPLOAD_CHUNK_BYTES, each one paid to the limiter before it is
+    sent, so the rate stays capped during the whole upload
+    """
+
+    def __init__(self, stream, limiter, urgent=False, chunk_bytes=UPLOAD_CHUNK_BYTES):
+        self.stream = stream
+        self.limiter = limiter
+        self.urgent = urgent
+        self.chunk_bytes = chunk_bytes
+        self.throttled = 0.0 # Seconds waited for this body
+
+    def __len__(self):
+        return len(self.stream) # Content-Length of the request
+
+    def read(self, size=-1):
+        size = self.chunk_bytes if size is None or size < 0 else min(size, self.chunk_bytes)
+        data = self.stream.read(size)
+        if data:
+            self.throttled += self.limiter.throttle(len(data), self.urgent)
+        return data
+##################################################################################################
+
+
+
+####################################### UPLOAD WINDOWS ###########################################
+##################################################################################################
+def parse_windows(spec):
+    """
+    "HH:MM-HH:MM,..." -> [(start_minute, end_minute)], a window
+    can cross midnight ("22:00-06:00")
+    """
+    windows = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            start, end = (datetime.datetime.strptime(value.strip(), "%H:%M") for value in item.split("-"))
+        except ValueError:
+            logger.error("❌ Invalid upload window '%s' ignored (expected HH:MM-HH:MM)", item)
+            continue
+        windows.append((start.hour * 60 + start.minute, end.hour * 60 + end.minute))
+    return windows
+
+
+def in_windows(windows, moment):
+    if not windows:
+        return True
+    minute = moment.hour * 60 + moment.minute
+    for start, end in windows:
+        if (start <= minute < end) if start < end else (minute >= start or minute < end):
+            return True
+    return False
+
+
+def next_window_start(windows, moment):
+    """
+    Epoch time of the next window opening after "moment"
+    """
+    base = moment.replace(second=0, microsecond=0)
+    for minutes in range(1, 2 * 24 * 60):
+        candidate = base + datetime.timedelta(minutes=minutes)
+        if in_windows(windows, candidate):
+            return candidate.timestamp()
+    return moment.timestamp()
+##################################################################################################
+
+
+
+##################################### BANDWIDTH LIMITER ##########################################
+##################################################################################################
+class BandwidthLimiter:
+    """
+    Rate cap, upload windows and counters of the uploader
+    """
+
+    def __init__(self, rate=UPLOAD_RATE_LIMIT, burst=UPLOAD_BURST_BYTES, windows=UPLOAD_WINDOWS, flood_bypass=UPLOAD_FLOOD_BYPASS):
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.windows = parse_windows(windows)
+        self.flood_bypass = flood_bypass
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+        self.bytes_bypassed = 0
+        self.throttled_seconds = 0.0
+
+    def upload_allowed(self, urgent=False, moment=None):
+        """
+        True if an upload may run now (urgent = flood data with bypass enabled)
+        """
+        return (urgent and self.flood_bypass) or in_windows(self.windows, moment or datetime.datetime.now())
+
+    def next_window(self, moment=None):
+        return next_window_start(self.windows, moment or datetime.datetime.now())
+
+    def throttle(self, size, urgent=False):
+        """
+        Wait for "size" bytes of a request body. Return the seconds throttled.
+        """
+        if self.bucket is None or (urgent and self.flood_bypass):
+            return 0.0
+        return self.bucket.acquire(size)
+
+    def reader(self, stream, urgent=False):
+        """
+        Pace the reads of a request body (see ThrottledReader)
+        """
+        return ThrottledReader(stream, self, urgent)
+
+    def record(self, station_id, size, throttled, seconds, urgent=False):
+        """
+        Count an upload and append it to the stats CSV
+        """
+        bypass = bool(urgent and self.flood_bypass)
+        with self.lock:
+            self.bytes_sent += size
+            self.throttled_seconds += throttled
+            if bypass:
+                self.bytes_bypassed += size
+        try:
+            with STATS_LOCK:
+                new_file = not os.path.exists(UPLOAD_STATS_FILE)
+                with open(UPLOAD_STATS_FILE, "a", newline="", encoding="utf-8") as file:
+                    writer = csv.writer(file)
+                    if new_file:
+                        writer.writerow(STATS_HEADER)
+                    writer.writerow([
+                        station_id, size, round(throttled, 3), round(seconds, 3), int(bypass),
+                        datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    ])
+        except OSError as e:
+            logger.error("❌ Failed to record upload stats: %s", e)
+
+    def stats(self):
+        with self.lock:
+            return {"bytes_sent": self.bytes_sent, "bytes_bypassed": self.bytes_bypassed, "throttled_seconds": round(self.throttled_seconds, 3)}
+
+
+def get_bandwidth_limiter():
+    """
+    Process-wide shared limiter
+    """
+    global _LIMITER
+    with _LIMITER_LOCK:
+        if _LIMITER is None:
+            _LIMITER = BandwidthLimiter()
+        return _LIMITER
+##################################################################################################
@@ -0,0 +1,158 @@
+"""
+This program compresses the rotated hourly CSV files with
+a pluggable codec (gzip by default, bz2 and lzma are also
+available from the standard library) and opens compressed
+files as streams, so they can be read without decompressing
+them to disk first.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import io
+import os
+import bz2
+import csv
+import gzip
+import lzma
+import time
+import shutil
+import logging
+import datetime
+import threading
+from settings import load_environment
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_environment()
+COMPRESSION_CODEC = (os.getenv("COMPRESSION_CODEC") or "gzip").strip().lower() # "none" disables it
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL") or 6)
+
+
+# ====== PATHS ======
+LOG_DIR = "./Logs/"
+COMPRESSION_STATS_FILE = os.path.join(LOG_DIR, "compression_stats.csv")
+STATS_HEADER = ["file", "codec", "original_bytes", "compressed_bytes", "ratio", "seconds", "compressed_at"]
+STATS_LOCK = threading.Lock()
+
+
+# ====== CODECS (name -> extension, opener) ======
+# An opener is called as opener(path, mode, level) and returns a file object
+CODECS = {
+    "gzip": (".gz", lambda path, mode, level: gzip.open(path, mode, compresslevel=level)),
+    "bz2": (".bz2", lambda path, mode, level: bz2.open(path, mode, compresslevel=max(1, level))),
+    "lzma": (".xz", lambda path, mode, level: lzma.open(path, mode, preset=level)),
+}
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+######################################## CODEC HANDLING ##########################################
+##################################################################################################
+def register_codec(name, extension, opener):
+    """
+    Add a codec: "opener(path, mode, level)" must return a binary file object
+    """
+    CODECS[name] = (extension, opener)
+
+
+def get_codec(file_path):
+    """
+    Name of the codec of a file from its extension, None if not compressed
+    """
+    for name, (extension, _) in CODECS.items():
+        if file_path.endswith(extension):
+            return name
+    return None
+
+
+def open_metrics_file(file_path, mode="rt", encoding="utf-8-sig", newline=""):
+    """
+    Open a CSV file, compressed or not, as a stream (text mode by default)
+    """
+    codec = get_codec(file_path)
+    if codec is None:
+        if "b" in mode:
+            return open(file_path, mode)
+        return open(file_path, mode.replace("t", ""), encoding=encoding, newline=newline)
+
+    _, opener = CODECS[codec]
+    binary = opener(file_path, mode.replace("t", "").replace("b", "") + "b", COMPRESSION_LEVEL)
+    if "b" in mode:
+        return binary
+    return io.TextIOWrapper(binary, encoding=encoding, newline=newline)
+##################################################################################################
+
+
+
+######################################### COMPRESSION ############################################
+##################################################################################################
+def compress_file(file_path, codec=None, level=None, remove_source=True):
+    """
+    Stream-compress a file next to it, record the ratio and time
+    and return the new path (the original path if not compressed)
+    """
+    codec = codec or COMPRESSION_CODEC
+    level = COMPRESSION_LEVEL if level is None else level
+
+    if codec == "none" or get_codec(file_path) is not None:
+        return file_path
+    if codec not in CODECS:
+        logger.error("❌ Unknown compression codec '%s', file kept as is.", codec)
+        return file_path
+
+    extension, opener = CODECS[codec]
+    destination = file_path + extension
+    tmp_path = destination + ".tmp"
+    start = time.monotonic()
+
+    try:
+        with open(file_path, "rb") as source, opener(tmp_path, "wb", level) as target:
+            shutil.copyfileobj(source, target, 65536)
+        os.replace(tmp_path, destination)
+    except OSError as e:
+        logger.error("❌ Failed to compress %s: %s", file_path, e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return file_path
+
+    seconds = time.monotonic() - start
+    original_bytes = os.path.getsize(file_path)
+    compressed_bytes = os.path.getsize(destination)
+    if remove_source:
+        os.remove(file_path)
+
+    ratio = original_bytes / compressed_bytes if compressed_bytes else 0
+    record_stats(destination, codec, original_bytes, compressed_bytes, ratio, seconds)
+    logger.info("🗜️ Compressed %s with %s: %d -> %d bytes (x%.1f) in %.2fs",
+                os.path.basename(file_path), codec, original_bytes, compressed_bytes, ratio, seconds)
+    return destination
+
+
+def record_stats(file_path, codec, original_bytes, compressed_bytes, ratio, seconds):
+    """
+    Append the compression result of a file to the stats CSV
+    """
+    try:
+        with STATS_LOCK:
+            new_file = not os.path.exists(COMPRESSION_STATS_FILE)
+            with open(COMPRESSION_STATS_FILE, "a", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                if new_file:
+                    writer.writerow(STATS_HEADER)
+                writer.writerow([
+                    os.path.basename(file_path), codec, original_bytes, compressed_bytes,
+                    round(ratio, 3), round(seconds, 4), datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                ])
+    except OSError as e:
+        logger.error("❌ Failed to record compression stats: %s", e)
+##################################################################################################
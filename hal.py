@@ -0,0 +1,431 @@
+"""
+This program is the hardware layer of the node: the sensor
+modules ask it for their pins and devices instead of importing
+the Raspberry Pi libraries. The "rpi" backend uses gpiozero,
+RPi.GPIO and dht11; the "simulated" backend replays a trace of
+rain tips, flood changes and temperature/humidity values (from
+a CSV file or generated from a seed, so runs are repeatable)
+on a clock that can run up to 1000 times faster, so the whole
+node can run and be benchmarked on any machine.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import csv
+import math
+import time
+import random
+import logging
+import threading
+from dotenv import load_dotenv
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_dotenv("./Env/.env.config")
+
+
+# ====== BACKEND SETTINGS ======
+SENSOR_BACKEND = (os.getenv("SENSOR_BACKEND") or "rpi").strip().lower() # rpi | simulated
+SIM_SPEED = float(os.getenv("SIM_SPEED") or 1) # Simulated seconds per real second (max 1000)
+SIM_TRACE = os.getenv("SIM_TRACE") or "" # CSV trace (seconds,kind,value,value2), empty = synthetic
+SIM_HOURS = float(os.getenv("SIM_HOURS") or 24) # Length of the synthetic trace
+SIM_SEED = int(os.getenv("SIM_SEED") or 1)
+MAX_SPEED = 1000.0
+
+
+# ====== TRACE EVENTS ======
+EVENT_TIP = "tip" # A rain gauge tip
+EVENT_FLOOD = "flood" # value = 1 water / 0 dry (the flood sensor pulls its pin LOW on water)
+EVENT_DHT = "dht" # value = temperature, value2 = humidity (empty = failed read)
+
+
+# ====== SHARED BACKEND ======
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+########################################## CLOCKS ################################################
+##################################################################################################
+class RealClock:
+    """
+    Wall and monotonic time of the machine (same API as the "time" module)
+    """
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def monotonic_ns(self):
+        return time.monotonic_ns()
+
+    def sleep(self, seconds):
+        time.sleep(max(0.0, seconds))
+
+    def wait(self, event, timeout):
+        """
+        Event.wait() with a timeout in clock seconds
+        """
+        return event.wait(timeout)
+
+
+class ScaledClock(RealClock):
+    """
+    Simulated time running "speed" times faster than the real one,
+    starting at the real time of its creation (or at "start")
+    """
+
+    def __init__(self, speed=1.0, start=None):
+        self.speed = min(max(speed, 1e-3), MAX_SPEED)
+        self.real_start = time.monotonic()
+        self.start = time.time() if start is None else start
+
+    def elapsed(self):
+        return (time.monotonic() - self.real_start) * self.speed
+
+    def time(self):
+        return self.start + self.elapsed()
+
+    def monotonic(self):
+        return self.elapsed()
+
+    def monotonic_ns(self):
+        return int(self.elapsed() * 1e9)
+
+    def sleep(self, seconds):
+        time.sleep(max(0.0, seconds) / self.speed)
+
+    def wait(self, event, timeout):
+        return event.wait(None if timeout is None else max(0.0, timeout) / self.speed)
+##################################################################################################
+
+
+
+###################################### RASPBERRY PI BACKEND ######################################
+##################################################################################################
+class Backend:
+    """
+    Keeps the devices handed out with the thread that created them,
+    so the devices of a sensor driver whose import failed can be
+    released before it is retried
+    """
+
+    def __init__(self):
+        self.devices = [] # (serial, thread ident, device)
+        self.created = 0
+        self.devices_lock = threading.Lock()
+
+    def track(self, device):
+        with self.devices_lock:
+            self.devices.append((self.created, threading.get_ident(), device))
+            self.created += 1
+        return device
+
+    def device_count(self):
+        """
+        Devices created so far (the mark to give to "release()")
+        """
+        with self.devices_lock:
+            return self.created
+
+    def release(self, since):
+        """
+        Close the devices created by this thread since the mark "since"
+        (e.g. by a failed driver import). Return how many were released.
+        """
+        owner = threading.get_ident()
+        with self.devices_lock:
+            released = [device for serial, ident, device in self.devices if serial >= since and ident == owner]
+            self.devices = [item for item in self.devices if item[0] < since or item[1] != owner]
+        for device in released:
+            self.close_device(device)
+        return len(released)
+
+    def close_device(self, device):
+        close = getattr(device, "close", None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception as e:
+            logger.warning("⚠️ Could not close %s: %s", type(device).__name__, e)
+
+
+class RPiBackend(Backend):
+    """
+    The real pins (the libraries are imported on first use)
+    """
+
+    name = "rpi"
+
+    def __init__(self):
+        super().__init__()
+        self.clock = RealClock()
+
+    def start(self):
+        """
+        Nothing to start, the pins are live
+        """
+
+    def digital_input(self, pin, active_state=True, bounce_time=None):
+        from gpiozero import DigitalInputDevice
+        return self.track(DigitalInputDevice(pin, pull_up=None, active_state=active_state, bounce_time=bounce_time))
+
+    def button(self, pin):
+        from gpiozero import Button
+        return self.track(Button(pin))
+
+    def dht11(self, pin):
+        import dht11
+        import RPi.GPIO as GPIO
+        GPIO.setmode(GPIO.BCM) # (BCM or BOARD)
+        return self.track(dht11.DHT11(pin=pin)) # Nothing to close, the pin is set at each read
+##################################################################################################
+
+
+
+######################################## TRACES ##################################################
+##################################################################################################
+def load_trace(path):
+    """
+    Events of a CSV trace: rows "seconds,kind,value,value2", sorted by time
+    """
+    events = []
+    with open(path, "r", newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            value = float(row["value"]) if row.get("value") not in (None, "") else None
+            value2 = float(row["value2"]) if row.get("value2") not in (None, "") else None
+            events.append((float(row["seconds"]), row["kind"].strip(), value, value2))
+    return sorted(events, key=lambda event: event[0])
+
+
+def synthetic_trace(hours=SIM_HOURS, seed=SIM_SEED):
+    """
+    Repeatable trace: dry spells and storms with random rain tips, a
+    flood while the last 30 minutes had more than 10 mm (0.2794 mm per
+    tip), a daily temperature cycle and 20 % of failed DHT11 reads
+    """
+    rng = random.Random(seed)
+    events = []
+    duration = hours * 3600
+
+    # Storms: (start, end, tips per minute)
+    storms = []
+    moment = rng.uniform(1, 6) * 3600
+    while moment < duration:
+        length = rng.uniform(0.5, 3) * 3600
+        storms.append((moment, moment + length, rng.uniform(0.5, 6)))
+        moment += length + rng.uniform(3, 18) * 3600
+
+    tips = []
+    for start, end, rate in storms:
+        moment = start + rng.expovariate(rate / 60)
+        while moment < min(end, duration):
+            tips.append(moment)
+            moment += rng.expovariate(rate / 60)
+    events += [(moment, EVENT_TIP, None, None) for moment in tips]
+
+    # Flood while the rain of the last 30 minutes is over 10 mm (36 tips)
+    flooded = False
+    first = 0
+    for index, moment in enumerate(tips):
+        while tips[first] < moment - 1800:
+            first += 1
+        if not flooded and index - first + 1 >= 36:
+            flooded = True
+            events.append((moment, EVENT_FLOOD, 1, None))
+        elif flooded and index - first + 1 < 18:
+            flooded = False
+            events.append((moment, EVENT_FLOOD, 0, None))
+    if flooded:
+        events.append((min(tips[-1] + 3600, duration), EVENT_FLOOD, 0, None))
+
+    # Temperature and humidity every 10 seconds
+    moment = 0.0
+    while moment < duration:
+        hour = moment / 3600 % 24
+        temperature = 20 + 6 * math.sin((hour - 9) / 24 * 2 * math.pi) + rng.gauss(0, 0.3)
+        humidity = 60 - 15 * math.sin((hour - 9) / 24 * 2 * math.pi) + rng.gauss(0, 1)
+        if rng.random() < 0.2:
+            events.append((moment, EVENT_DHT, None, None))
+        else:
+            events.append((moment, EVENT_DHT, round(temperature), round(min(max(humidity, 5), 95))))
+        moment += 10
+
+    return sorted(events, key=lambda event: event[0])
+##################################################################################################
+
+
+
+###################################### SIMULATED BACKEND #########################################
+##################################################################################################
+class SimulatedInput:
+    """
+    A digital input (gpiozero-like) driven by the trace. The pin level
+    is simulated and, as with gpiozero, the device is active while the
+    level equals "active_state" (False = active on LOW).
+    """
+
+    def __init__(self, active_state=True):
+        self.active_state = bool(active_state)
+        self.level = True # HIGH, as the flood sensor when dry
+        self.when_activated = None
+        self.when_deactivated = None
+
+    @property
+    def is_active(self):
+        return self.level == self.active_state
+
+    def set_level(self, level):
+        was_active = self.is_active
+        self.level = bool(level)
+        if self.is_active == was_active:
+            return
+        callback = self.when_activated if self.is_active else self.when_deactivated
+        if callback is not None:
+            callback()
+
+
+class SimulatedButton:
+    """
+    A button (gpiozero-like) pressed at each tip of the trace
+    """
+
+    def __init__(self):
+        self.when_pressed = None
+
+    def press(self):
+        if self.when_pressed is not None:
+            self.when_pressed()
+
+
+class SimulatedDHTResult:
+    def __init__(self, temperature, humidity):
+        self.temperature = temperature
+        self.humidity = humidity
+
+    def is_valid(self):
+        return self.temperature is not None
+
+
+class SimulatedDHT:
+    """
+    A DHT11 returning the last temperature and humidity of the trace
+    """
+
+    def __init__(self):
+        self.temperature = None
+        self.humidity = None
+
+    def read(self):
+        return SimulatedDHTResult(self.temperature, self.humidity)
+
+
+class SimulatedBackend(Backend):
+    """
+    Replays the trace events on a scaled clock. Every device of a
+    kind gets the same events (one rain gauge, flood sensor and DHT11).
+    The replay begins on "start()", once the sensor modules have
+    registered their devices, so no event is lost before it.
+    """
+
+    name = "simulated"
+
+    def __init__(self, events=None, speed=SIM_SPEED):
+        super().__init__()
+        self.clock = ScaledClock(speed)
+        self.events = events if events is not None else (load_trace(SIM_TRACE) if SIM_TRACE else synthetic_trace())
+        self.inputs = []
+        self.buttons = []
+        self.dhts = []
+        self.replayed = 0
+        self.stop_event = threading.Event()
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """
+        Start the replay (again does nothing), trace time 0 being now
+        """
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.replay, args=(self.clock.monotonic(),), name="sim-replay", daemon=True)
+            self.thread.start()
+        logger.info("🧪 Simulated sensors: %d events at %.0fx for %d inputs, %d buttons and %d DHT11.",
+                    len(self.events), self.clock.speed, len(self.inputs), len(self.buttons), len(self.dhts))
+
+    def digital_input(self, pin, active_state=True, bounce_time=None):
+        device = SimulatedInput(active_state)
+        self.inputs.append(device)
+        return self.track(device)
+
+    def button(self, pin):
+        device = SimulatedButton()
+        self.buttons.append(device)
+        return self.track(device)
+
+    def dht11(self, pin):
+        device = SimulatedDHT()
+        self.dhts.append(device)
+        return self.track(device)
+
+    def close_device(self, device):
+        # The replay stops driving it
+        for devices in (self.inputs, self.buttons, self.dhts):
+            if device in devices:
+                devices.remove(device)
+
+    def replay(self, origin):
+        for moment, kind, value, value2 in self.events:
+            delay = origin + moment - self.clock.monotonic()
+            if delay > 0 and self.clock.wait(self.stop_event, delay):
+                break
+            if kind == EVENT_TIP:
+                for device in self.buttons:
+                    device.press()
+            elif kind == EVENT_FLOOD:
+                for device in self.inputs:
+                    device.set_level(not value) # LOW on water
+            elif kind == EVENT_DHT:
+                for device in self.dhts:
+                    device.temperature, device.humidity = value, value2
+            self.replayed += 1
+        self.finished.set()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def get_backend():
+    """
+    Process-wide backend chosen by SENSOR_BACKEND
+    """
+    global _BACKEND
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            _BACKEND = SimulatedBackend() if SENSOR_BACKEND == "simulated" else RPiBackend()
+        return _BACKEND
+
+
+def get_clock():
+    """
+    Clock of the backend (simulated time when replaying a trace)
+    """
+    return get_backend().clock
+##################################################################################################
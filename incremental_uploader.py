@@ -0,0 +1,277 @@
+"""
+This program uploads the rows of the active hourly files every
+few minutes instead of once per hour. It tails each file from
+a byte offset saved on disk, uploads the new complete rows in
+small batches (with per-station checkpoints, so a restart or a
+retry never sends a row twice) and, once a rotated file is fully
+uploaded, compresses and archives it as the hourly upload does.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import io
+import os
+import csv
+import json
+import time
+import logging
+import threading
+from metrics_uploader import StationBuffer, upload_station_buffers, init_sensor_file, get_deferred_retry, is_flood_value
+from bandwidth_limiter import get_bandwidth_limiter
+from archive_manager import archive_file, partition_key, STATUS_UPLOADED
+from file_compressor import compress_file
+from upload_queue import backoff_delay
+from settings import load_environment
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_environment()
+
+
+# ====== INCREMENTAL UPLOAD SETTINGS ======
+LOG_DIR = "./Logs/"
+INCREMENTAL_STATE_FILE = os.path.join(LOG_DIR, "incremental_state.json")
+INCREMENTAL_BATCH_BYTES = int(os.getenv("INCREMENTAL_BATCH_BYTES") or 512 * 1024) # Max bytes of rows per batch
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+#################################### FILE TAILING HELPERS ########################################
+##################################################################################################
+def read_rows(file_path, start, end=None, max_bytes=INCREMENTAL_BATCH_BYTES):
+    """
+    Read the complete rows after byte "start" (the header is skipped),
+    up to "end" or "max_bytes". A last line without newline is still
+    being written and is left for the next read.
+    Return (header, rows, end offset).
+    """
+    with open(file_path, "rb") as file:
+        header_line = file.readline()
+        if not header_line.endswith(b"\n"):
+            return None, [], start
+        header = next(csv.reader([header_line.decode("utf-8-sig")]))
+
+        offset = max(start, file.tell())
+        file.seek(offset)
+        lines = []
+        while (end is None and offset - start < max_bytes) or (end is not None and offset < end):
+            line = file.readline()
+            if not line.endswith(b"\n"):
+                break
+            lines.append(line.decode("utf-8"))
+            offset += len(line)
+
+    return header, list(csv.reader(io.StringIO("".join(lines)))), offset
+
+
+def pending_flood(file_path, start):
+    """
+    True if a complete row after byte "start" (not uploaded yet) reports flooding
+    """
+    with open(file_path, "rb") as file:
+        header_line = file.readline()
+        header = next(csv.reader([header_line.decode("utf-8-sig")]), [])
+        if "Flooding" not in header:
+            return False
+        flood_column = header.index("Flooding")
+        file.seek(max(start, file.tell()))
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            row = next(csv.reader([line.decode("utf-8")]), [])
+            if len(row) > flood_column and is_flood_value(row[flood_column]):
+                return True
+    return False
+##################################################################################################
+
+
+
+##################################### INCREMENTAL UPLOADER #######################################
+##################################################################################################
+class IncrementalUploader:
+    """
+    Byte offsets and pending batches of the files being tailed.
+    State of a file: {"offset", "closed", "batch": None or
+    {"start", "end", "done", "attempts", "next_attempt"}}
+    """
+
+    def __init__(self, state_file=INCREMENTAL_STATE_FILE, batch_bytes=INCREMENTAL_BATCH_BYTES):
+        self.state_file = state_file
+        self.batch_bytes = batch_bytes
+        self.lock = threading.Lock() # Protects the state
+        self.upload_lock = threading.Lock() # One upload pass at a time
+        self.files = self.load()
+
+    def load(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as file:
+                return json.load(file).get("files", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error("❌ Incremental upload state unreadable, starting empty: %s", e)
+            return {}
+
+    def save(self):
+        """
+        Write the offsets atomically (must be called with the lock held)
+        """
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"files": self.files}, file, indent=2, sort_keys=True)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.state_file)
+
+    def track(self, file_path, closed=False):
+        with self.lock:
+            state = self.files.get(file_path)
+            if state is None:
+                state = {"offset": 0, "closed": False, "batch": None}
+                self.files[file_path] = state
+            if closed:
+                state["closed"] = True
+            self.save()
+
+    def resume(self, active_key):
+        """
+        After a restart, the tracked files of previous hours (not starting
+        with the key of the active hourly file) are closed and drained
+        """
+        with self.lock:
+            for file_path, state in self.files.items():
+                if not partition_key(file_path).startswith(active_key):
+                    state["closed"] = True
+            self.save()
+
+    def upload_pending(self, active_files=()):
+        """
+        Upload the new rows of the active files and drain the closed ones
+        """
+        for file_path in active_files:
+            if file_path not in self.files:
+                self.track(file_path)
+
+        with self.upload_lock:
+            init_sensor_file()
+            for file_path in list(self.files):
+                if not os.path.exists(file_path):
+                    logger.warning("⚠️ Tailed file %s no longer exists, stop tracking it.", file_path)
+                    self.forget(file_path)
+                    continue
+                try:
+                    drained = self.upload_new_rows(file_path)
+                except Exception as e:
+                    logger.error("❌ Incremental upload of %s failed: %s", file_path, e)
+                    continue
+                if drained and self.files[file_path]["closed"]:
+                    self.finalize(file_path)
+
+    def close_files(self, file_paths):
+        """
+        Rotated files: upload their last rows, then compress and archive them
+        (files that can't be drained now are retried on the next pass)
+        """
+        for file_path in file_paths:
+            self.track(file_path, closed=True)
+        self.upload_pending()
+
+    def upload_new_rows(self, file_path):
+        """
+        Upload the rows after the saved offset in batches.
+        Return True when every complete row of the file is uploaded.
+        Outside the upload windows, the flood bypass is decided on all
+        the rows still waiting in the file, not only on the batch: a
+        batch without flooding is not deferred while rows after it
+        report flooding, since they can't be sent before it.
+        """
+        with self.lock:
+            state = self.files[file_path]
+            first = state["offset"] if state["batch"] is None else state["batch"]["start"]
+        limiter = get_bandwidth_limiter()
+        urgent = limiter.flood_bypass and not limiter.upload_allowed() and pending_flood(file_path, first)
+
+        while True:
+            with self.lock:
+                state = self.files[file_path]
+                batch = state["batch"]
+                if batch is None:
+                    start, end, done = state["offset"], None, []
+                elif batch["next_attempt"] > time.time() and not (batch.get("deferred") and urgent):
+                    return False # Waiting for the backoff of a failed batch or for the upload window
+                else:
+                    start, end, done = batch["start"], batch["end"], batch["done"]
+
+            header, rows, end = read_rows(file_path, start, end, self.batch_bytes)
+            if not rows:
+                with self.lock:
+                    state["offset"] = end
+                    state["batch"] = None
+                    self.save()
+                return True
+
+            # Group the batch by station, without the stations already uploaded
+            station_column = header.index("Station_Id")
+            buffers = {}
+            for row in rows:
+                if len(row) <= station_column or not row[station_column] or row[station_column] in done:
+                    continue
+                station_id = row[station_column]
+                if station_id not in buffers:
+                    buffers[station_id] = StationBuffer(station_id, header)
+                buffers[station_id].write(row)
+            if urgent:
+                for station_buffer in buffers.values():
+                    station_buffer.flood = True
+
+            logger.info("⏫ Incremental upload of %d rows from %s (bytes %d-%d)", len(rows), os.path.basename(file_path), start, end)
+            try:
+                results = upload_station_buffers(buffers)
+            finally:
+                for station_buffer in buffers.values():
+                    station_buffer.close()
+
+            with self.lock:
+                done = sorted(set(done) | {station for station, error in results.items() if error is None})
+                failed = sorted(station for station, error in results.items() if error is not None)
+                if not failed:
+                    # Batch complete: move the offset past it
+                    state["offset"] = end
+                    state["batch"] = None
+                    self.save()
+                    continue
+
+                # Deferred stations wait for the upload window, other failures back off
+                retry_at = get_deferred_retry(results)
+                attempts = (batch or {}).get("attempts", 0) + (0 if retry_at else 1)
+                state["batch"] = {"start": start, "end": end, "done": done, "attempts": attempts, "deferred": bool(retry_at),
+                                  "next_attempt": retry_at or time.time() + backoff_delay(attempts)}
+                self.save()
+            logger.warning("❌ Incremental upload of %s failed for stations %s, retrying the batch later.", os.path.basename(file_path), ", ".join(failed))
+            return False
+
+    def finalize(self, file_path):
+        """
+        Compress and archive a rotated file whose rows are all uploaded
+        """
+        compressed_file = compress_file(file_path)
+        if archive_file(compressed_file, STATUS_UPLOADED):
+            logger.info("🧹 Archived incrementally uploaded file %s", compressed_file)
+        self.forget(file_path)
+
+    def forget(self, file_path):
+        with self.lock:
+            self.files.pop(file_path, None)
+            self.save()
+##################################################################################################
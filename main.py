@@ -15,17 +15,18 @@ from both sensors.
 import os
 import sys
 import time
-import json
 import socket
 import random
 import logging
+import datetime
 import threading
 from dotenv import load_dotenv
-
-# Import sensor functions
-from Sensors.rain_gauge import get_rain_data as rain_gauge_data
-from Sensors.flood_sensor import get_flood_data as flood_sensor_data
-from Sensors.temp_and_humid_sensor import get_temp_and_humid_data as temp_humid_data
+from hal import get_backend, get_clock
+from send_buffer import SendBuffer
+from sensor_registry import SensorRegistry # The sensor drivers are imported by the registry, in background
+from sensor_scheduler import SensorScheduler, SENSOR_PERIOD
+from sensor_aggregator import SensorAggregator, MODE_SUM, MODE_MAX, MODE_MEAN
+from adaptive_profile import ProfileController, Profile, PROFILE_QUIET, PROFILE_EVENT, QUIET_REPORT_INTERVAL, EVENT_REPORT_INTERVAL
 ##################################################################################################
 
 
@@ -43,13 +44,28 @@ load_dotenv("./Env/.env.public")
 RECEIVER_HOST = "127.0.0.1" if len(sys.argv) > 1 else os.getenv('RECEIVER_HOST')
 RECEIVER_PORT = int(os.getenv("RECEIVER_PORT", "4040"))
 NODE_ID = f"NODE_{os.getenv('STATION_NAME', 'default')}" # Must start with "NODE_"
+SEND_CHUNK_BYTES = int(os.getenv("SEND_CHUNK_BYTES") or 256 * 1024) # Max payload per exchange, a backlog takes several
+SIM_START_TIMEOUT = 60 # Seconds the simulated trace waits for the other drivers after the first one is loaded
+
+
+# ====== SAMPLING PERIODS (seconds) ======
+RAIN_GAUGE_PERIOD = float(os.getenv("RAIN_GAUGE_PERIOD") or SENSOR_PERIOD)
+FLOOD_SENSOR_PERIOD = float(os.getenv("FLOOD_SENSOR_PERIOD") or SENSOR_PERIOD)
+TEMP_HUMID_PERIOD = float(os.getenv("TEMP_HUMID_PERIOD") or SENSOR_PERIOD)
+
+# Event profile (ADAPTIVE_PROFILES), the periods above are the quiet profile
+EVENT_RAIN_GAUGE_PERIOD = float(os.getenv("EVENT_RAIN_GAUGE_PERIOD") or RAIN_GAUGE_PERIOD)
+EVENT_FLOOD_SENSOR_PERIOD = float(os.getenv("EVENT_FLOOD_SENSOR_PERIOD") or min(5.0, FLOOD_SENSOR_PERIOD))
+EVENT_TEMP_HUMID_PERIOD = float(os.getenv("EVENT_TEMP_HUMID_PERIOD") or TEMP_HUMID_PERIOD)
 
 
 # ====== GLOBAL VARIABLES ======
 CLIENT_READY = False
-SENSOR_DATA_BUFFER = []
-BUFFER_LOCK = threading.Lock()
+SENSOR_DATA_BUFFER = SendBuffer() # Readings until the server ACK (memory + disk spool)
 STOP_EVENT = threading.Event()
+SENSOR_LOCK = threading.Lock() # Drivers ready vs profile switches
+STALE_READS = {} # Sensor -> reads without a fresh value (e.g. DHT11 older than DHT_MAX_AGE)
+CLOCK = get_clock() # Sensor time (scaled when SENSOR_BACKEND = simulated)
 LATITUDE = float(os.getenv('GPS_LAT'))
 LONGITUDE = float(os.getenv('GPS_LON'))
 STATION_ID = int(os.getenv('STATION_ID'))
@@ -69,47 +85,110 @@ logger = logging.getLogger(__name__)
 
 
 
-################################### THREAD SENSOR FUNCTION #######################################
+###################################### SENSOR READINGS ###########################################
 ##################################################################################################
-def listener_job(sensor_name, func):
+def client_ready():
+    # CLIENT is READY when NODE_ID is received by the Sever
+    return CLIENT_READY
+
+
+def record_reading(sensor_name, data, due):
     """
-    Manages sensor data collection and 
-    append it to the BUFFER.
+    Add a sensor value to the aggregate of the interval
+    (called by the scheduler for each read).
     """
+    if data is None:
+        record_stale(sensor_name)
+    PROFILES.observe(sensor_name, data, due)
+    AGGREGATOR.add(sensor_name, data, due)
 
-    global CLIENT_READY
-    logger.info("%s started.", sensor_name)
 
-    # Receive the information from the Sensors
-    while not STOP_EVENT.is_set():
-        start_time = time.time()
-        try:
-            # CLIENT is READY when NODE_ID is received by the Sever
-            if CLIENT_READY:
-                # Get the sensor data
-                data = func()
-                # Packet Structure
-                with BUFFER_LOCK:
-                    SENSOR_DATA_BUFFER.append({
-                        'Sensor': sensor_name,
-                        'Value': data,
-                        'Station_Id': STATION_ID,
-                        'Lat_deg': LATITUDE,
-                        'Lon_deg': LONGITUDE
-                    })
-                    logger.debug("Buffered %s data: %.2f", sensor_name, data)
-
-                # Wait for 5 seconds (the collection interval)
-                elapsed = time.time() - start_time
-                sleep_time = max(0, 60.0 - elapsed)
-
-                if STOP_EVENT.wait(sleep_time):
-                    # if STOP_EVENT break
-                    break
+def record_stale(sensor_name):
+    """
+    Count a read that gave no fresh value, with the age of the last
+    valid one when the driver tells it (the interval gets no reading).
+    """
+    STALE_READS[sensor_name] = STALE_READS.get(sensor_name, 0) + 1
+    module = REGISTRY.module(sensor_name, load=False)
+    if module is None:
+        return # Driver not loaded (the registry logs its failures)
+    age = module.get_temp_and_humid_age() if hasattr(module, "get_temp_and_humid_age") else None
+    logger.warning("⚠️ No fresh %s value (last valid one: %s), %d reads without value.", sensor_name,
+                   f"{age:.0f} s old" if age is not None else "none", STALE_READS[sensor_name])
+
+
+def buffer_reading(sensor_name, data, stats, at):
+    """
+    Append the reading of an interval to the BUFFER
+    (called by the aggregator when the interval ends).
+    """
+    # Packet Structure
+    reading = {
+        'Sensor': sensor_name,
+        'Value': data,
+        'Station_Id': STATION_ID,
+        'Lat_deg': LATITUDE,
+        'Lon_deg': LONGITUDE,
+        'Time': datetime.datetime.fromtimestamp(at).strftime("%Y-%m-%d %H:%M:%S") # End of the interval, one server row per time
+    }
+    SENSOR_DATA_BUFFER.append(reading)
+    # The stats of the interval stay on the node (the server keeps one value per sensor and time)
+    logger.debug("Buffered %s data: %s (stats: %s)", sensor_name, data, stats)
+
+
+AGGREGATOR = SensorAggregator(buffer_reading) # One reading per sensor and interval
+AGGREGATOR.register("Rain Gauge", MODE_SUM)
+AGGREGATOR.register("Flood Sensor", MODE_MAX, transitions=True)
+AGGREGATOR.register("Temperature and Humidity", MODE_MEAN)
+
+
+def apply_profile(profile):
+    """
+    Sampling periods of the new profile (called on a switch)
+    """
+    with SENSOR_LOCK:
+        for sensor_name, period in profile.periods.items():
+            SCHEDULER.set_period(sensor_name, period)
+    SENSOR_DATA_BUFFER.set_report_interval(profile.report_interval)
+
+
+def add_sensor(driver):
+    """
+    Schedule a sensor at the period of the active profile (its
+    driver is imported by the first read)
+    """
+    with SENSOR_LOCK:
+        SCHEDULER.add(driver.name, REGISTRY.reader(driver.name), PROFILES.active.periods.get(driver.name, SENSOR_PERIOD))
+
 
-        except Exception as e:
-            logger.error("%s thread error: %s", sensor_name, str(e))
-            time.sleep(5)  # Wait before retrying
+def driver_loaded(driver):
+    """
+    Called by the registry once a driver is imported. The simulated
+    trace is replayed when every driver has its devices, or after
+    SIM_START_TIMEOUT seconds if one keeps failing, so no early
+    event is lost.
+    """
+    with SENSOR_LOCK:
+        if REGISTRY.wait_ready(0):
+            REPLAY_TIMER.cancel()
+            get_backend().start()
+        elif REPLAY_TIMER.ident is None:
+            REPLAY_TIMER.start()
+
+
+# One scheduler thread for every sensor, the blocking reads run in its workers
+SCHEDULER = SensorScheduler(record_reading, ready=client_ready, stop_event=STOP_EVENT)
+PROFILES = ProfileController(
+    Profile(PROFILE_QUIET, {"Rain Gauge": RAIN_GAUGE_PERIOD, "Flood Sensor": FLOOD_SENSOR_PERIOD,
+                            "Temperature and Humidity": TEMP_HUMID_PERIOD}, QUIET_REPORT_INTERVAL),
+    Profile(PROFILE_EVENT, {"Rain Gauge": EVENT_RAIN_GAUGE_PERIOD, "Flood Sensor": EVENT_FLOOD_SENSOR_PERIOD,
+                            "Temperature and Humidity": EVENT_TEMP_HUMID_PERIOD}, EVENT_REPORT_INTERVAL),
+    on_switch=apply_profile
+)
+SENSOR_DATA_BUFFER.set_report_interval(PROFILES.active.report_interval if PROFILES.enabled else 60.0) # Offered each minute without profiles
+REGISTRY = SensorRegistry(driver_loaded) # Sensors from SENSOR_DRIVERS and entry points
+REPLAY_TIMER = threading.Timer(SIM_START_TIMEOUT, lambda: get_backend().start())
+REPLAY_TIMER.daemon = True
 ##############################################################################################
 
 
@@ -125,6 +204,7 @@ def client():
     short_wait_time = 20
     long_wait_time = 180  # 3 minutes
     retry_count = 0
+    draining = False # Backlog left after the last chunk sent
 
     global CLIENT_READY
     while not STOP_EVENT.is_set():
@@ -149,6 +229,7 @@ def client():
 
                 # Restart counter if CONNECTED
                 retry_count = 0
+                draining = False
 
                 # 2. Send the NODE_ID to index in the Server
                 s.sendall(NODE_ID.encode('utf-8'))
@@ -196,29 +277,26 @@ def client():
                                 logger.debug("Error draining buffer after ID_RECEIVED: %s", e)
 
                             # 3. CODIFICATION AND PREPARATION OF LENGTH PROTOCOL
-                            with BUFFER_LOCK:
+                            # Pending readings, oldest first (spooled ones included), up to SEND_CHUNK_BYTES
+                            # (already a JSON list in bytes, serialized when each reading was appended)
+                            if draining or PROFILES.report_due():
+                                # A backlog is sent one chunk per exchange, even in the quiet profile
+                                payload_bytes, data_count, last_seq, more = SENSOR_DATA_BUFFER.pending_chunk(SEND_CHUNK_BYTES)
+                            else:
+                                # Quiet profile: the data waits for the next report
+                                payload_bytes, data_count, last_seq, more = b"", 0, None, False
+                                if len(SENSOR_DATA_BUFFER):
+                                    PROFILES.record_offer(held=True)
+                                    logger.info("🤫 Quiet profile: holding %d data points until the next report.", len(SENSOR_DATA_BUFFER))
+                            if not data_count:
                                 # If buffer is empty, send "NO_DATA"
-                                if not SENSOR_DATA_BUFFER:
-                                    data_to_send = []
-                                    logger.info("📝 Buffer empty. Sending 'NO_DATA'.")
-                                else:
-                                    # Just send the data if the BUFFER is not empty
-                                    # Copy the buffer
-                                    data_to_send = SENSOR_DATA_BUFFER.copy()
-                                    logger.info("📤 Sending %s data points.", len(data_to_send))
-                                    logger.info("DATA sent:\n %s", data_to_send)
-
-                            # PAYLOAD BUILDING
-                            if not data_to_send:
-                                payload_str = "NO_DATA"
+                                logger.info("📝 Buffer empty. Sending 'NO_DATA'.")
+                                payload_bytes = b"NO_DATA"
                             else:
-                                try:
-                                    payload_str = json.dumps(data_to_send)
-                                except TypeError as e:
-                                    logger.error("⚠️ Error serializing JSON. Check data format: %s. Data not sent.", e)
-                                    break
+                                # Just send the data if the BUFFER is not empty
+                                logger.info("📤 Sending %s data points (%d bytes).", data_count, len(payload_bytes))
+                                logger.debug("DATA sent:\n %s", payload_bytes)
 
-                            payload_bytes = payload_str.encode('utf-8')
                             payload_length_bytes = str(len(payload_bytes)).zfill(8).encode('utf-8')
 
                             try:
@@ -244,9 +322,15 @@ def client():
                                     # Success: Server confirmed reception
                                     logger.info("👍 Data successfully indexed by server. [%s]", ack)
 
-                                    # Clean BUFFER just if the delivery was successful
-                                    with BUFFER_LOCK:
-                                        SENSOR_DATA_BUFFER.clear()
+                                    # Remove the sent readings just if the delivery was successful
+                                    if data_count:
+                                        SENSOR_DATA_BUFFER.acknowledge(last_seq) # Persisted: a restart resumes after this chunk
+                                        PROFILES.record_offer(len(payload_bytes))
+                                    if more:
+                                        logger.info("📦 Backlog: %d data points left, next chunk on the next exchange.", len(SENSOR_DATA_BUFFER))
+                                    elif draining:
+                                        logger.info("📦 Backlog sent.")
+                                    draining = more
                                     # Go back to the start for the next READY_TO_INDEX signal
                                     continue
 
@@ -319,31 +403,41 @@ def client():
 ########################## THREAD INITIALIZATION AND STOP MANAGEMENT #############################
 ##################################################################################################
 if __name__ == "__main__":
+    started = time.perf_counter()
+
     # Start Client on thread to do not block main
     client_thread = threading.Thread(target=client)
     client_thread.start()
 
-    # Sensor Start
-    sensors = [
-        threading.Thread(target=listener_job, args=("Rain Gauge", rain_gauge_data)),
-        threading.Thread(target=listener_job, args=("Flood Sensor", flood_sensor_data)),
-        threading.Thread(target=listener_job, args=("Temperature and Humidity", temp_humid_data))
-    ]
-
-    for sensor in sensors:
-        sensor.start()
+    # Sensor Start: every sensor is scheduled now, its driver is imported by its first read (quiet profile periods)
+    REGISTRY.start()
+    for driver in REGISTRY.drivers.values():
+        add_sensor(driver)
+    SCHEDULER.start()
+    logger.info("🚀 Node started in %.0f ms, sensor drivers load on their first read.", (time.perf_counter() - started) * 1000)
 
     try:
         while True:
-            time.sleep(1) # Principal thread waits
+            # Principal thread waits and closes each aggregation interval
+            CLOCK.sleep(AGGREGATOR.next_flush() - CLOCK.time())
+            AGGREGATOR.flush(CLOCK.time())
     except KeyboardInterrupt:
         logger.info("🛑 Stopping all threads...")
         STOP_EVENT.set()
     finally:
-        for sensor in sensors:
-            sensor.join()
+        SCHEDULER.stop() # Logs the read and jitter stats of each sensor
+        PROFILES.log_stats()
+        REGISTRY.log_stats() # Attempts and load time of each driver
+        REPLAY_TIMER.cancel()
+        temp_and_humid = REGISTRY.module("Temperature and Humidity", load=False)
+        if temp_and_humid is not None:
+            logger.info("📈 Temperature and Humidity reader: %s", temp_and_humid.get_temp_and_humid_stats())
+        if STALE_READS:
+            logger.info("📈 Reads without a fresh value: %s", ", ".join(f"{name}={count}" for name, count in STALE_READS.items()))
+        AGGREGATOR.flush() # Readings of the interval in progress
 
         client_thread.join() # Wait until the client stop
+        SENSOR_DATA_BUFFER.close() # Keep the unsent readings on disk
         logger.info("👋 All threads stopped")
         sys.exit(0)
 ##################################################################################################
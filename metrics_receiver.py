@@ -13,13 +13,19 @@ import sys
 import csv
 import time
 import json
+import zlib
 import queue
 import socket
 import logging
 import datetime
 import threading
-from dotenv import load_dotenv
-from metrics_uploader import run_uploader
+from settings import get_settings
+from metrics_uploader import run_uploader, retry_pending_uploads, run_catchup
+from recent_store import RecentWindowStore, start_query_server
+from rollup_engine import RollupEngine
+from file_compressor import compress_file
+from incremental_uploader import IncrementalUploader
+from archive_manager import partition_key
 from utils import get_next_hourly_filename, job_submission_thread
 ##################################################################################################
 
@@ -28,9 +34,17 @@ from utils import get_next_hourly_filename, job_submission_thread
 ############################### GLOBAL VARIABLES INITIALIZATION ##################################
 ##################################################################################################
 # ====== ENVIRONMENT VARIABLES ======
-load_dotenv("./Env/.env.config")
+SETTINGS = get_settings() # .env files resolved once (see settings.py)
 HOST = "0.0.0.0" # All transmitters
-PORT = int(os.getenv("RECEIVER_PORT") or 4040)
+PORT = SETTINGS.receiver_port
+RECENT_API_HOST = SETTINGS.recent_api_host # Local only by default
+RECENT_API_PORT = SETTINGS.recent_api_port # 0 disables the query API
+RECENT_WINDOW_HOURS = SETTINGS.recent_window_hours
+WRITER_SHARDING = SETTINGS.writer_sharding # none | station | node
+WRITER_SHARDS = SETTINGS.writer_shards # Number of shards when sharding by node
+UPLOAD_RETRY_CHECK = SETTINGS.upload_retry_check # Seconds between checks of the upload queue
+CATCHUP_ON_START = SETTINGS.catchup_on_start # Merge the upload backlog on start
+INCREMENTAL_UPLOAD_MINUTES = SETTINGS.incremental_upload_minutes # 0 = upload once per hour
 
 
 # ====== GLOBAL VARIABLES AND LOCKS ======
@@ -39,11 +53,14 @@ CLIENT_SEND_EVENTS = {}
 CLIENT_SEND_READY_FLAGS = {}
 INDEX_LOCK = threading.Lock() # For the clients to start index
 STOP_EVENT = threading.Event()
-CSV_WRITE_QUEUE = queue.Queue() # Thread for the CSV writing while handling other data
+WRITER_SHARDS_INDEX = {} # Shard ID -> WriterShard (queue and thread for the CSV writing while handling other data)
 LAST_JOB_SUBMISSION_TIME = None
 ROTATION_LOCK = threading.Lock()
 CLIENT_FLAG_LOCK = threading.Lock()
 JOB_SUBMISSION_LOCK = threading.Lock()
+RECENT_STORE = RecentWindowStore(window_seconds=int(RECENT_WINDOW_HOURS * 3600)) # Last hours in memory
+ROLLUP_ENGINE = RollupEngine() # Hourly and daily aggregates per station
+INCREMENTAL_UPLOADER = IncrementalUploader() if INCREMENTAL_UPLOAD_MINUTES > 0 else None # Sub-hourly uploads
 
 
 # ====== SAVE FILES PATH ======
@@ -186,49 +203,140 @@ def extract_and_flatten_data(node_id, timestamp, data_list):
     return complete_row
 
 
-def csv_writer_job():
+def extract_rows(node_id, timestamp, data_list):
     """
-    Thread dedicated to consuming tasks from the
-    CSV_WRITE_QUEUE and writing them to the file.
+    Rows of a payload: readings with a "Time" (taken on the node, e.g.
+    a backlog sent after an outage) give one row per time, oldest first.
+    Readings without it give a single row at the reception time.
     """
+    groups = {}
+    for data_item in data_list:
+        moment = data_item.get("Time") if isinstance(data_item, dict) else None
+        if moment is not None:
+            try:
+                datetime.datetime.strptime(moment, "%Y-%m-%d %H:%M:%S")
+            except (TypeError, ValueError):
+                logger.warning("⚠️ Invalid reading time %s, using the reception time.", moment)
+                moment = None
+        groups.setdefault(moment or timestamp, []).append(data_item)
 
-    last_upload = time.time()
-    upload_interval = 3600 # 1 hour
-    # upload_interval = 600 # 10 minutes to debbug
-    global CSV_FILE
+    rows = []
+    for moment in sorted(groups):
+        row = extract_and_flatten_data(node_id, moment, groups[moment])
+        if row:
+            rows.append(row)
+    return rows
+
+
+class WriterShard:
+    """
+    Queue, writer thread and active file of an output shard
+    (a station, a hash of the node ID, or everything)
+    """
+
+    def __init__(self, shard_id):
+        self.shard_id = shard_id
+        self.queue = queue.Queue()
+        self.write_lock = threading.Lock() # Held while a row is being appended
+        self.csv_file = None
+        self.thread = None
 
-    logger.info("📝 CSV Writer thread started.")
+
+def get_shard_id(data_list, node_id):
+    """
+    Shard of a payload based on WRITER_SHARDING (None = single file)
+    """
+    if WRITER_SHARDING == "station":
+        for data_item in data_list:
+            if isinstance(data_item, dict) and data_item.get("Station_Id") is not None:
+                return f"S{data_item['Station_Id']}"
+        return "S0"
+
+    if WRITER_SHARDING == "node":
+        # Without the port suffix, a node keeps its shard after reconnecting
+        node_name = node_id.rsplit("-", 1)[0]
+        return f"N{zlib.crc32(node_name.encode('utf-8')) % WRITER_SHARDS}"
+
+    return None
+
+
+def get_shard_file(base_file, shard_id):
+    """
+    File of a shard for the active hourly file
+    """
+    if shard_id is None:
+        return base_file
+    root, extension = os.path.splitext(base_file)
+    return f"{root}_{shard_id}{extension}"
+
+
+def get_writer_shard(data_list, node_id):
+    """
+    Return the shard of a payload, creating and starting its writer if needed
+    """
+    shard_id = get_shard_id(data_list, node_id)
+    with ROTATION_LOCK:
+        shard = WRITER_SHARDS_INDEX.get(shard_id)
+        if shard is None:
+            shard = WriterShard(shard_id)
+            shard.thread = threading.Thread(target=csv_writer_job, args=(shard,), name=f"CSV-Writer-{shard_id or 'main'}")
+            WRITER_SHARDS_INDEX[shard_id] = shard
+            shard.thread.start()
+    return shard
+
+
+def csv_writer_job(shard):
+    """
+    Thread dedicated to consuming tasks from the
+    queue of a shard and writing them to its file.
+    """
+
+    logger.info("📝 CSV Writer thread started for shard %s.", shard.shard_id or "main")
     while not STOP_EVENT.is_set():
         try:
-            item = CSV_WRITE_QUEUE.get(timeout=1)
+            item = shard.queue.get(timeout=1)
             data_list, node_id = item # data_list contains the dictionary to plain
 
             # 1. Process and writing
             now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            complete_row = []
+            rows = []
 
             # Call the function to take the data clean and formatted
             try:
-                complete_row = extract_and_flatten_data(node_id, now, data_list)
+                rows = extract_rows(node_id, now, data_list)
             except Exception as e:
                 logger.error("❌ Error during data plain: %s for item: %s", e, data_list)
 
             try:
                 # Write in file just if there are valid rows
-                if complete_row:
-                    with ROTATION_LOCK:
-                        current_csv_file = CSV_FILE
-
-                    with open(current_csv_file, mode='a', newline='', encoding='utf-8-sig') as file:
-                        csv.writer(file).writerow(complete_row)
-                    logger.info("💾 Saved %d ítems in final format from %s to %s", len(complete_row), os.path.basename(current_csv_file), node_id)
+                if rows:
+                    with shard.write_lock:
+                        with ROTATION_LOCK:
+                            current_csv_file = get_shard_file(CSV_FILE, shard.shard_id)
+
+                        # First row of the shard in this hour
+                        if shard.csv_file != current_csv_file:
+                            setup_csv(current_csv_file)
+                            shard.csv_file = current_csv_file
+
+                        with open(current_csv_file, mode='a', newline='', encoding='utf-8-sig') as file:
+                            csv.writer(file).writerows(rows)
+                    logger.info("💾 Saved %d rows in final format from %s to %s", len(rows), node_id, os.path.basename(current_csv_file))
+
+                    # Keep the rows in the in-memory recent window and the rollups
+                    try:
+                        for complete_row in rows:
+                            RECENT_STORE.add_row(complete_row)
+                            ROLLUP_ENGINE.add_row(complete_row)
+                    except Exception as e:
+                        logger.error("❌ Failed to add row to the recent store or rollups: %s", e)
                 else:
                     logger.warning("⚠️ Valid rows were not generated to write. Data discard for %s.", node_id)
-                CSV_WRITE_QUEUE.task_done()
+                shard.queue.task_done()
 
             except OSError as e:
                 logger.error("❌ OS/File Error [%d]: %s. Data RE-QUEUED for safety.", e.errno, e.strerror)
-                CSV_WRITE_QUEUE.put(item)
+                shard.queue.put(item)
                 if not STOP_EVENT.wait(10):
                     continue
                 else:
@@ -236,80 +344,173 @@ def csv_writer_job():
 
             except Exception as e:
                 logger.error("❌ General I/O Error: %s", e)
-                CSV_WRITE_QUEUE.task_done()
+                shard.queue.task_done()
 
-        # UPLOAD SECTION
         except queue.Empty:
-            # 2. Rotate and upload
-            if time.time() - last_upload >= upload_interval:
-                with ROTATION_LOCK:
-                    file_to_upload = CSV_FILE
-                logger.info("🔄 Rotation hour: Trying to start uploading of %s", os.path.basename(file_to_upload))
-
-                try:
-                    # Call to uploader
-                    uploader_metrics(file_to_upload) # <-- Here
-                    last_upload = time.time()
-
-                except Exception as e:
-                    logger.error("❌ Thread start failed: %s", str(e))
             continue
 
         except Exception as e:
             logger.error("❌ Error processing CSV queue task: %s", e)
 
-            # Clean and continue as default
-            if 'item_data' in locals():
-                CSV_WRITE_QUEUE.task_done()
+    logger.info("📝 CSV Writer thread terminated for shard %s.", shard.shard_id or "main")
 
-    logger.info("📝 CSV Writer thread terminated.")
 
+def rotation_job():
+    """
+    Thread that rotates the files of all the shards together
+    every hour and starts their upload. It also expires the
+    recent data and closes finished rollups.
+    """
+
+    last_upload = time.time()
+    upload_interval = 3600 # 1 hour
+    # upload_interval = 600 # 10 minutes to debbug
+
+    logger.info("🔄 Rotation thread started.")
+    while not STOP_EVENT.wait(1):
+        # Drop the recent data out of the window and close finished rollups
+        RECENT_STORE.expire()
+        ROLLUP_ENGINE.flush()
+
+        # UPLOAD SECTION: Rotate and upload
+        if time.time() - last_upload >= upload_interval:
+            try:
+                files_to_upload = rotate_csv_files()
+                if files_to_upload:
+                    logger.info("🔄 Rotation hour: Trying to start uploading of %s", ", ".join(os.path.basename(f) for f in files_to_upload))
+                    # Call to uploader
+                    uploader_metrics(files_to_upload) # <-- Here
+                last_upload = time.time()
+
+            except Exception as e:
+                logger.error("❌ Thread start failed: %s", str(e))
 
-def handle_upload_and_rotation(file_to_upload):
+    # Keep the open rollups for the next start
+    ROLLUP_ENGINE.save_state()
+    logger.info("🔄 Rotation thread terminated.")
+
+
+def rotate_csv_files():
     """
-    Function executed in a separate thread.
-    It calls the uploader to process the file and, if successful, 
-    rotates the global variable.
+    Switch every shard to the new hourly file at once and
+    return the rotated files, ready to be compressed
     """
 
     global CSV_FILE
 
-    # 1. Execute upload and clean
-    upload_success = run_uploader(file_to_upload)
+    # 1. Rotation: Generate the new file name for all shards
+    new_csv_file_path = os.path.join(CSV_DIR, get_next_hourly_filename())
+    with ROTATION_LOCK:
+        old_csv_file = CSV_FILE
+        if new_csv_file_path == old_csv_file:
+            return []
+        # 2. Update global variable of secure way
+        CSV_FILE = new_csv_file_path
+        shards = list(WRITER_SHARDS_INDEX.values())
 
-    # 2. Rotation: Generate and create new file
-    try:
-        new_filename_base = get_next_hourly_filename()
-        new_csv_file_path = os.path.join(os.path.dirname(file_to_upload), new_filename_base)
+    # 3. Wait for the rows being appended to the old files (the writers must leave them before compression)
+    for shard in shards:
+        with shard.write_lock:
+            pass
 
-        if setup_csv(new_csv_file_path):
-            # 3. Update global variable of secure way
-            with ROTATION_LOCK:
-                CSV_FILE = new_csv_file_path
-            logger.info("✅ Rotation successful. New active file.: %s", os.path.basename(CSV_FILE))
+    # 4. Create the new files with headers
+    if WRITER_SHARDING == "none" and not setup_csv(CSV_FILE):
+        logger.error("❌ Failure to create new CSV file during rotation.")
+    logger.info("✅ Rotation successful. New active file.: %s", os.path.basename(CSV_FILE))
 
-            if not upload_success:
-                # If fails, the file persist for a new try
-                logger.warning("⚠️ Upload failed, but rotation successful. Data is now being written to the new file: %s", os.path.basename(CSV_FILE))
-                logger.warning("Failed file keept to re-try: %s", os.path.basename(file_to_upload))
+    rotated_files = [get_shard_file(old_csv_file, shard.shard_id) for shard in shards]
+    if WRITER_SHARDING == "none" and old_csv_file not in rotated_files:
+        rotated_files.append(old_csv_file)
+    return [file_path for file_path in rotated_files if os.path.exists(file_path)]
 
-            return True
-        logger.error("❌ Failure to create new CSV file during rotation.")
-        return False
 
-    except Exception as e:
-        logger.error("❌ Error during file rotation: %s", str(e))
-        return False
+def handle_upload_and_rotation(files_to_upload):
+    """
+    Function executed in a separate thread.
+    It compresses and uploads the rotated files.
+    """
+
+    # Sub-hourly mode: only the rows after the last offset are left to upload
+    if INCREMENTAL_UPLOADER is not None:
+        INCREMENTAL_UPLOADER.close_files(files_to_upload)
+        return True
+
+    for file_to_upload in files_to_upload:
+        # 1. Compress the rotated file (streamed, the uploader reads it compressed)
+        file_to_upload = compress_file(file_to_upload)
+
+        # 2. Execute upload and archive
+        upload_success = run_uploader(file_to_upload)
+        if not upload_success:
+            # If fails, the file persist for a new try
+            logger.warning("⚠️ Upload failed, but rotation successful. Data is now being written to the new file: %s", os.path.basename(CSV_FILE))
+            logger.warning("Failed file keept to re-try: %s", os.path.basename(file_to_upload))
+
+    return True
+
+
+def upload_retry_job():
+    """
+    Thread that retries the queued uploads once their backoff expires
+    (including the ones left pending by a previous run)
+    """
 
+    logger.info("🔁 Upload retry thread started.")
+    if CATCHUP_ON_START:
+        # Upload the backlog left by a previous run in a few merged batches
+        try:
+            run_catchup()
+        except Exception as e:
+            logger.error("❌ Error in the backlog catch-up: %s", e)
+
+    while not STOP_EVENT.is_set():
+        try:
+            retry_pending_uploads()
+        except Exception as e:
+            logger.error("❌ Error retrying queued uploads: %s", e)
+        STOP_EVENT.wait(UPLOAD_RETRY_CHECK)
+    logger.info("🔁 Upload retry thread terminated.")
 
-def uploader_metrics(file_to_upload):
+
+def get_active_files():
+    """
+    Hourly files being written now (one per shard)
+    """
+    with ROTATION_LOCK:
+        active_files = [get_shard_file(CSV_FILE, shard_id) for shard_id in WRITER_SHARDS_INDEX]
+        if WRITER_SHARDING == "none":
+            active_files.append(CSV_FILE)
+    return [file_path for file_path in dict.fromkeys(active_files) if os.path.exists(file_path)]
+
+
+def incremental_upload_job():
     """
-    Start new thread for the upload and rotation (non blocking)
+    Thread that uploads the new rows of the active files
+    every INCREMENTAL_UPLOAD_MINUTES (sub-hourly mode)
     """
-    upload_thread = threading.Thread(target=lambda: handle_upload_and_rotation(file_to_upload), name=f"RotationThread-{os.path.basename(file_to_upload)}")
+
+    logger.info("⏫ Incremental upload thread started (every %s minutes).", INCREMENTAL_UPLOAD_MINUTES)
+    with ROTATION_LOCK:
+        active_key = partition_key(CSV_FILE)
+    INCREMENTAL_UPLOADER.resume(active_key)
+
+    while not STOP_EVENT.is_set():
+        try:
+            INCREMENTAL_UPLOADER.upload_pending(get_active_files())
+        except Exception as e:
+            logger.error("❌ Error in incremental upload: %s", e)
+        STOP_EVENT.wait(INCREMENTAL_UPLOAD_MINUTES * 60)
+    logger.info("⏫ Incremental upload thread terminated.")
+
+
+def uploader_metrics(files_to_upload):
+    """
+    Start new thread for the upload of the rotated files (non blocking)
+    """
+    upload_thread = threading.Thread(target=lambda: handle_upload_and_rotation(files_to_upload), name=f"RotationThread-{os.path.basename(files_to_upload[0])}")
     upload_thread.start()
 
-    logger.info("⬆️ Upload thread started for: %s . Writer continues monitoring.", os.path.basename(file_to_upload))
+    logger.info("⬆️ Upload thread started for %d files. Writers continue monitoring.", len(files_to_upload))
     return True
 ##################################################################################################
 
@@ -417,8 +618,8 @@ def handle_client(conn, addr):
                     conn.sendall(b"PROTOCOL_ERROR")
                     return
 
-                # Receive the data in chunks
-                data_bytes = b''
+                # Receive the data in chunks (a bytearray grows in place, bytes would be copied on each chunk)
+                data_bytes = bytearray()
                 bytes_received = 0
 
                 while bytes_received < data_length:
@@ -444,7 +645,7 @@ def handle_client(conn, addr):
                     else:
                         try:
                             data_list = json.loads(payload)
-                            CSV_WRITE_QUEUE.put((data_list, node_id))
+                            get_writer_shard(data_list, node_id).queue.put((data_list, node_id))
                             logger.info("[%s] 📥 Received %d chunks from %s. Enqueuing.", thread_name, len(data_list), node_id)
                         except json.JSONDecodeError:
                             logger.error("[%s] ❌ JSON Error from %s. Data discarded.", thread_name, node_id)
@@ -518,11 +719,31 @@ def main_server():
     """
 
     # 1. Set up the CSV files
-    setup_csv(CSV_FILE)
-
-    # Start data saver thread
-    csv_writer = threading.Thread(target=csv_writer_job, name="CSV-Writer")
-    csv_writer.start()
+    if WRITER_SHARDING == "none":
+        setup_csv(CSV_FILE)
+    logger.info("📝 Writer sharding: %s", WRITER_SHARDING)
+
+    # Start rotation thread (data saver threads start with the first data of their shard)
+    rotation_thread = threading.Thread(target=rotation_job, name="CSV-Rotation")
+    rotation_thread.start()
+
+    # Start the retry thread of the upload queue
+    retry_thread = threading.Thread(target=upload_retry_job, name="Upload-Retry")
+    retry_thread.start()
+
+    # Start the sub-hourly uploads of the active files
+    incremental_thread = None
+    if INCREMENTAL_UPLOADER is not None:
+        incremental_thread = threading.Thread(target=incremental_upload_job, name="Incremental-Upload")
+        incremental_thread.start()
+
+    # Start the recent data query API
+    recent_api = None
+    if RECENT_API_PORT:
+        try:
+            recent_api = start_query_server(RECENT_STORE, RECENT_API_HOST, RECENT_API_PORT, ROLLUP_ENGINE)
+        except OSError as e:
+            logger.error("❌ Recent data API could not start on port %d: %s", RECENT_API_PORT, e)
 
     # 2. Starting the socket server
     try:
@@ -553,7 +774,16 @@ def main_server():
     finally:
         logger.info("🛑 Stopped, waiting to ending...")
         STOP_EVENT.set()
-        csv_writer.join()
+        with ROTATION_LOCK:
+            shards = list(WRITER_SHARDS_INDEX.values())
+        for shard in shards:
+            shard.thread.join()
+        rotation_thread.join()
+        retry_thread.join()
+        if incremental_thread:
+            incremental_thread.join()
+        if recent_api:
+            recent_api.shutdown()
 
         # Close all active connection
         with INDEX_LOCK:
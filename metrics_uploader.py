@@ -7,52 +7,64 @@ from the Client-Server application to Upstream-dso
 
 ################################ IMPORT MODULES AND LIBRARIES ####################################
 ##################################################################################################
+import io
 import os
+import re
 import sys
 import csv
+import time
+import shutil
 import logging
 import tempfile
-import pandas as pd
-from dotenv import load_dotenv
-from upstream.client import UpstreamClient
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from settings import get_settings
+from upstream_session import get_upstream_session
+from file_compressor import open_metrics_file, get_codec
+from archive_manager import archive_file, STATUS_UPLOADED
+from upload_queue import get_upload_queue, STATION_UPLOADED
+from bandwidth_limiter import get_bandwidth_limiter
 ##################################################################################################
 
 
 
 ############################### GLOBAL VARIABLES INITIALIZATION ##################################
 ##################################################################################################
-# === ENVIRONMENT  VARIABLES ===
-load_dotenv("./Env/.env")         # Tapis credentials
-load_dotenv("./Env/.env.public")  # Public env variables
-load_dotenv("./Env/.env.config")  # Public env variables
-
-
 # === CONFIGURATION ===
+# (resolved once by settings.py, STATION_ID and CAMPAIGN_ID are only required to upload)
+SETTINGS = get_settings()
 LOG_DIR = "./Logs/"
-os.makedirs(LOG_DIR, exist_ok=True)
-
-
-USERNAME = os.getenv("userid")
-PASSWORD = os.getenv("password")
-BASE_URL = os.getenv('BASE_URL')
-CKAN_URL = os.getenv('CKAN_URL')
-CKAN_ORG = os.getenv('CKAN_ORG')
-STATION_ID = int(os.getenv('STATION_ID'))
-CAMPAIGN_ID = int(os.getenv('CAMPAIGN_ID'))
 CSV_DIR = os.path.join(LOG_DIR,"Water_data/")
 SENSOR_FILE = os.path.join(CSV_DIR, "metrics_template.csv")
+SHARD_STATION_PATTERN = re.compile(r"_S([^_.]+)\.csv") # Station shards from metrics_receiver.py
+UPLOAD_SPILL_THRESHOLD = SETTINGS.upload_spill_threshold # Bytes per station in memory
+UPLOAD_MAX_MEMORY = SETTINGS.upload_max_memory # Bytes for all the stations
+UPLOAD_WORKERS = SETTINGS.upload_workers # Stations uploaded in parallel
+UPLOAD_HOST_CONCURRENCY = SETTINGS.upload_host_concurrency # Concurrent requests per host
+CATCHUP_BATCH_BYTES = SETTINGS.catchup_batch_bytes # Max bytes per station upload in catch-up
+UPLOAD_DEFERRED = "deferred: outside the upload windows" # Result of a station waiting for its window
+HOST_SEMAPHORES = {}
+HOST_SEMAPHORES_LOCK = threading.Lock()
 
 
 # ====== LOGGING SETUP ======
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, 'metrics_receiver.log'), encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
+
+
+def setup_logging():
+    """
+    Log configuration when run as a program (metrics_receiver.py has its own)
+    """
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(LOG_DIR, 'metrics_receiver.log'), encoding='utf-8'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
 ##################################################################################################
 
 
@@ -87,77 +99,593 @@ def init_sensor_file():
 
 
 
-######################### CREATE UPSTREAM SESION AND UPLOAD THE DATA #############################
+##################################### UPSTREAM UPLOAD HELPERS ####################################
 ##################################################################################################
-def submit_file_to_upstream(file_path):
+def create_upstream_session():
     """
-    It connects to Upstream and attempts to upload 
-    the sensor data, dividing it by Station_Id
+    Session initialization: the shared session of upstream_session.py,
+    already authenticated (no login round-trip while the token is valid)
     """
-    logger.info("🚀 Processing %s for multiple stations...", file_path)
+    session = get_upstream_session()
+    session.get_client()
+    return session
+
+
+def get_shard_station(file_path):
+    """
+    Station of a per-station shard file, None for regular files
+    """
+    match = SHARD_STATION_PATTERN.search(os.path.basename(file_path))
+    if not match:
+        return None
+    station_id = match.group(1)
+    return int(station_id) if station_id.isdigit() else station_id
+
 
+def is_flood_value(value):
+    """
+    True if a Flooding value of the CSV reports water
+    """
     try:
-        # Read the CSV file
-        df = pd.read_csv(file_path)
+        return float(value) > 0
+    except (TypeError, ValueError):
+        return str(value).strip().lower() == "true"
 
-        if 'Station_Id' not in df.columns:
-            logger.error("❌ Column 'Station_Id' not found in %s", file_path)
-            return False
 
-        # Group by Station_Id
-        grouped = df.groupby('Station_Id')
+def file_has_flood(file_path):
+    """
+    True if any row of the file reports flooding
+    """
+    with open_metrics_file(file_path) as file:
+        return any(is_flood_value(row.get("Flooding")) for row in csv.DictReader(file))
+
 
-        # Client initialization
-        client = UpstreamClient(
-            username=USERNAME,
-            password=PASSWORD,
-            base_url=BASE_URL,
-            ckan_url=CKAN_URL,
-            ckan_organization=CKAN_ORG
+def upload_station_payload(session, station_id, payload, sensors_file=SENSOR_FILE, urgent=False):
+    """
+    Upload the measurements of a single station. "payload" is the path
+    of an uncompressed CSV file or a (filename, bytes or binary stream)
+    tuple, written to a temporary file (the SDK validates a file path)
+    so both take the same validated upload. A stream is copied in
+    blocks, never whole in memory.
+    The body is paced by the bandwidth limiter while it is sent
+    ("urgent" = flood data).
+    """
+    campaign_id = SETTINGS.require("campaign_id")
+    limiter = get_bandwidth_limiter()
+    temp_dir = None
+    if isinstance(payload, tuple):
+        # Same file name in a private directory (the name is sent with the upload)
+        temp_dir = tempfile.mkdtemp(prefix="upload_")
+        filename, data = payload
+        payload = os.path.join(temp_dir, os.path.basename(filename))
+        with open(payload, "wb") as file:
+            if isinstance(data, bytes):
+                file.write(data)
+            else:
+                shutil.copyfileobj(data, file)
+
+    try:
+        size = os.path.getsize(payload)
+        bodies = []
+
+        def throttle(body):
+            reader = limiter.reader(body, urgent)
+            bodies.append(reader)
+            return reader
+
+        started = time.time()
+        # Validated by the SDK, posted through the keep-alive pool of the session
+        session.upload_csv_data(
+            measurements_file=payload,
+            sensors_file=sensors_file,
+            campaign_id=campaign_id,
+            station_id=station_id,
+            throttle=throttle
         )
+        throttled = sum(body.throttled for body in bodies)
+        limiter.record(station_id, size, throttled, time.time() - started - throttled, urgent)
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
 
-        success_count = 0
-        total_stations = len(grouped)
 
-        for station_id, group in grouped:
-            try:
-                # Create a temp file for each station and iterate it
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as tmp_file:
-                    group.to_csv(tmp_file.name, index=False)
-                    logger.info("📤 Uploading %s records for station %s...", len(group), station_id)
-
-                    client.upload_csv_data(
-                        measurements_file=tmp_file.name,
-                        sensors_file=SENSOR_FILE,
-                        campaign_id=CAMPAIGN_ID,
-                        station_id=station_id
-                    )
-                    success_count += 1
-                    logger.info("✅ Successfully uploaded data for station %s", station_id)
+def upload_station_file(session, station_id, file_path, sensors_file=SENSOR_FILE, urgent=False):
+    """
+    Upload a file that holds a single station without regrouping it.
+    Compressed files are stream-decompressed block by block into the
+    temporary file of the upload.
+    """
+    try:
+        if get_codec(file_path) is None:
+            upload_station_payload(session, station_id, file_path, sensors_file, urgent)
+        else:
+            with open_metrics_file(file_path, "rb") as file:
+                payload = (os.path.basename(file_path).split(".")[0] + ".csv", file)
+                upload_station_payload(session, station_id, payload, sensors_file, urgent)
+        logger.info("✅ Successfully uploaded shard %s for station %s", os.path.basename(file_path), station_id)
+        return True
 
-            except Exception as e:
-                logger.error("❌ Failed to upload data for station %s: %s", station_id, e)
-            finally:
-                # Delete a temp file if exists
-                if os.path.exists(tmp_file.name):
-                    os.unlink(tmp_file.name)
+    except Exception as e:
+        logger.error("❌ Failed to upload shard %s for station %s: %s", os.path.basename(file_path), station_id, e)
+        return False
+##################################################################################################
+
+
+
+################################ STREAMING STATION SPLITTER ######################################
+##################################################################################################
+class StationBuffer:
+    """
+    CSV rows of one station, kept in memory and spilled to
+    a temporary file once they grow over the spill threshold
+    """
+
+    def __init__(self, station_id, header):
+        self.station_id = station_id
+        self.rows = 0
+        self.flood = False # Any row with flooding (may bypass the bandwidth limits)
+        self.flood_column = header.index("Flooding") if "Flooding" in header else None
+        self.buffer = io.StringIO()
+        self.spill_path = None
+        self.spill_file = None
+        self.writer = csv.writer(self.buffer)
+        self.writer.writerow(header)
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.rows += 1
+        if not self.flood and self.flood_column is not None and len(row) > self.flood_column:
+            self.flood = is_flood_value(row[self.flood_column])
+
+    def extend(self, other):
+        """
+        Append the rows of another buffer of the station (its header is skipped)
+        """
+        target = self.buffer if self.spill_file is None else self.spill_file
+        if other.spill_file is None:
+            text = other.buffer.getvalue()
+            target.write(text[text.index("\n") + 1:])
+        else:
+            other.spill_file.flush()
+            with open(other.spill_path, "r", newline="", encoding="utf-8") as file:
+                file.readline()
+                shutil.copyfileobj(file, target)
+        self.rows += other.rows
+        self.flood = self.flood or other.flood
+
+    def memory_bytes(self):
+        return self.buffer.tell() if self.spill_file is None else 0
+
+    def size_bytes(self):
+        return self.buffer.tell() if self.spill_file is None else self.spill_file.tell()
+
+    def spill(self):
+        """
+        Move the buffered rows to a temporary file and keep writing there
+        """
+        if self.spill_file is not None:
+            return
+        self.spill_file = tempfile.NamedTemporaryFile(mode="w", suffix=".csv", newline="", encoding="utf-8", delete=False)
+        self.spill_path = self.spill_file.name
+        self.spill_file.write(self.buffer.getvalue())
+        self.buffer = None
+        self.writer = csv.writer(self.spill_file)
+
+    def payload(self):
+        """
+        Path of the spilled file or (filename, bytes) of the in-memory rows
+        """
+        if self.spill_file is not None:
+            self.spill_file.close()
+            return self.spill_path
+        return (f"station_{self.station_id}.csv", self.buffer.getvalue().encode("utf-8"))
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            if os.path.exists(self.spill_path):
+                os.unlink(self.spill_path)
+        self.buffer = None
+
+
+def split_by_station(file_path, spill_threshold=None, max_memory=None, skip_stations=()):
+    """
+    Read the CSV once and route its rows into per-station buffers.
+    A buffer spills to disk over "spill_threshold" bytes, and the largest
+    one spills when all together exceed "max_memory", so peak memory is
+    bounded regardless of the file size. Rows of "skip_stations" (already
+    uploaded) are dropped. Return {station_id: StationBuffer}.
+    """
+    spill_threshold = spill_threshold or UPLOAD_SPILL_THRESHOLD
+    max_memory = max_memory or UPLOAD_MAX_MEMORY
+    buffers = {}
+    memory = 0
+    skipped = 0
+
+    with open_metrics_file(file_path) as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if not header or "Station_Id" not in header:
+            raise KeyError("Station_Id")
+        station_column = header.index("Station_Id")
+
+        for row in reader:
+            if len(row) <= station_column or not row[station_column]:
+                skipped += 1
+                continue
+
+            station_id = row[station_column]
+            if station_id in skip_stations:
+                continue
+            station_buffer = buffers.get(station_id)
+            if station_buffer is None:
+                station_buffer = StationBuffer(station_id, header)
+                buffers[station_id] = station_buffer
+
+            before = station_buffer.memory_bytes()
+            station_buffer.write(row)
+            memory += station_buffer.memory_bytes() - before
+
+            if station_buffer.memory_bytes() > spill_threshold:
+                memory -= station_buffer.memory_bytes()
+                station_buffer.spill()
+
+            while memory > max_memory:
+                largest = max(buffers.values(), key=lambda item: item.memory_bytes())
+                memory -= largest.memory_bytes()
+                largest.spill()
+
+    if skipped:
+        logger.warning("⚠️ %d rows without Station_Id skipped in %s", skipped, file_path)
+    return buffers
+##################################################################################################
+
+
+
+######################### CREATE UPSTREAM SESION AND UPLOAD THE DATA #############################
+##################################################################################################
+def get_host_semaphore():
+    """
+    Semaphore that limits the concurrent uploads to the Upstream host
+    """
+    host = urlparse(SETTINGS.upstream_base_url or "").netloc or "upstream"
+    with HOST_SEMAPHORES_LOCK:
+        if host not in HOST_SEMAPHORES:
+            HOST_SEMAPHORES[host] = threading.BoundedSemaphore(UPLOAD_HOST_CONCURRENCY)
+        return HOST_SEMAPHORES[host]
+
+
+def upload_station_buffers(buffers, sensors_file=SENSOR_FILE, max_workers=None):
+    """
+    Upload the station buffers on a bounded thread pool.
+    Return {station_id: None if uploaded, or the error message}.
+    """
+    if not buffers:
+        return {}
+
+    # Session initialization (shared by all the workers)
+    session = create_upstream_session()
+    semaphore = get_host_semaphore()
+    limiter = get_bandwidth_limiter()
+    max_workers = max_workers or UPLOAD_WORKERS
+
+    def upload_job(station_id, station_buffer):
+        try:
+            # Outside the upload windows only flood data is sent
+            if not limiter.upload_allowed(station_buffer.flood):
+                logger.info("⏸️ Upload of station %s deferred to the next upload window", station_id)
+                return UPLOAD_DEFERRED
+
+            # Hand the buffer (in memory or spilled) directly to the upload
+            with semaphore:
+                logger.info("📤 Uploading %s records for station %s...", station_buffer.rows, station_id)
+                upload_station_payload(session, int(station_id) if station_id.isdigit() else station_id, station_buffer.payload(), sensors_file, station_buffer.flood)
+            logger.info("✅ Successfully uploaded data for station %s", station_id)
+            return None
+
+        except Exception as e:
+            logger.error("❌ Failed to upload data for station %s: %s", station_id, e)
+            return str(e) or type(e).__name__
+        finally:
+            # Release the buffer and delete its spill file if exists
+            station_buffer.close()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(buffers)), thread_name_prefix="Upload") as executor:
+        futures = {executor.submit(upload_job, station_id, station_buffer): station_id for station_id, station_buffer in buffers.items()}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
+def get_deferred_retry(results):
+    """
+    Next window opening if the only failures are deferred stations
+    (they are retried then, without counting as a failed attempt)
+    """
+    errors = [error for error in results.values() if error is not None]
+    if errors and all(error == UPLOAD_DEFERRED for error in errors):
+        return get_bandwidth_limiter().next_window()
+    return None
+
+
+def upload_file_stations(file_path, sensors_file=SENSOR_FILE, done_stations=()):
+    """
+    Upload the stations of a file that are not in "done_stations".
+    Return {station_id: None if uploaded, or the error message}.
+    Errors of the whole file (unreadable, no Station_Id) are raised.
+    """
+
+    # Station shards already hold a single station: upload them directly
+    shard_station = get_shard_station(file_path)
+    if shard_station is not None:
+        if str(shard_station) in done_stations:
+            return {}
+        limiter = get_bandwidth_limiter()
+        urgent = limiter.flood_bypass and file_has_flood(file_path)
+        if not limiter.upload_allowed(urgent):
+            logger.info("⏸️ Upload of shard %s deferred to the next upload window", os.path.basename(file_path))
+            return {str(shard_station): UPLOAD_DEFERRED}
+        logger.info("🚀 Processing station shard %s...", file_path)
+        uploaded = upload_station_file(create_upstream_session(), shard_station, file_path, sensors_file, urgent)
+        return {str(shard_station): None if uploaded else "shard upload failed"}
 
-        logger.info("📊 Successfully uploaded %s of %s stations", success_count, total_stations)
-        return success_count == total_stations
+    logger.info("🚀 Processing %s for multiple stations...", file_path)
+    if done_stations:
+        logger.info("⏭️ Skipping stations already uploaded: %s", ", ".join(sorted(done_stations)))
 
+    buffers = {}
+    try:
+        # Split the CSV file by Station_Id in a single streaming pass
+        try:
+            buffers = split_by_station(file_path, skip_stations=done_stations)
+        except KeyError:
+            raise ValueError(f"Column 'Station_Id' not found in {file_path}")
+
+        # Upload the stations concurrently
+        return upload_station_buffers(buffers, sensors_file)
+
+    finally:
+        for station_buffer in buffers.values():
+            station_buffer.close()
+
+
+def submit_file_to_upstream(file_path, sensors_file=SENSOR_FILE):
+    """
+    It connects to Upstream and attempts to upload 
+    the sensor data, dividing it by Station_Id
+    (rollup series use their own sensors file)
+    """
+    try:
+        results = upload_file_stations(file_path, sensors_file)
     except Exception as e:
         logger.error("❌ Critical error processing %s: %s", file_path, e)
         return False
+
+    success_count = sum(1 for error in results.values() if error is None)
+    logger.info("📊 Successfully uploaded %s of %s stations", success_count, len(results))
+    return success_count == len(results)
+##################################################################################################
+
+
+
+##################################### BACKLOG CATCH-UP ###########################################
+##################################################################################################
+def run_catchup(batch_bytes=None):
+    """
+    Upload all the queued files at once: their rows are merged per
+    station in time order into batches of up to "batch_bytes", so an
+    outage of many hours costs a few uploads per station instead of
+    one per file and station. Batches end at file boundaries, so the
+    checkpoints of the upload queue stay per file. Return the number
+    of files completed.
+    """
+    batch_bytes = batch_bytes or CATCHUP_BATCH_BYTES
+    upload_queue = get_upload_queue()
+    limiter = get_bandwidth_limiter()
+
+    # Reserve the queued metrics files (oldest first, the keys hold the hour)
+    keys = [entry["key"] for entry in upload_queue.pending() if entry["sensors_file"] in (None, SENSOR_FILE)]
+    keys = [key for key in keys if upload_queue.claim(key)]
+    if not keys:
+        logger.info("✅ Catch-up: upload queue is empty.")
+        return 0
+
+    init_sensor_file()
+    logger.info("⏩ Catch-up of %d queued files...", len(keys))
+    started = time.time()
+    totals = {"files": 0, "rows": 0, "bytes": 0, "uploads": 0}
+    results = {} # key -> station -> None or error, for the files read
+    files = {}
+    expected = {} # key -> stations of the file to upload
+    batches = {} # station -> (StationBuffer, [keys])
+
+    def upload_batches(stations):
+        ready = {station: batches.pop(station) for station in stations}
+        if not ready:
+            return
+        size = sum(station_buffer.size_bytes() for station_buffer, _ in ready.values())
+        batch_results = upload_station_buffers({station: station_buffer for station, (station_buffer, _) in ready.items()})
+
+        for station, (station_buffer, batch_keys) in ready.items():
+            error = batch_results.get(station, "not uploaded")
+            for key in batch_keys:
+                results[key][station] = error
+            if error is None:
+                totals["rows"] += station_buffer.rows
+        totals["uploads"] += len(ready)
+        totals["bytes"] += size
+
+        elapsed = max(time.time() - started, 1e-6)
+        logger.info("⏩ Catch-up progress: %d/%d files read, %d uploads, %d rows, %.2f MB in %.1fs (%.0f rows/s, %.2f MB/s)",
+                    totals["files"], len(keys), totals["uploads"], totals["rows"], totals["bytes"] / 1e6,
+                    elapsed, totals["rows"] / elapsed, totals["bytes"] / 1e6 / elapsed)
+
+    try:
+        for key in keys:
+            entry = upload_queue.get(key)
+            file_path = entry["file"]
+            if not os.path.exists(file_path):
+                logger.error("❌ Queued file %s no longer exists, removed from the upload queue.", file_path)
+                upload_queue.remove(key)
+                continue
+            files[key] = file_path
+            results[key] = {}
+            done_stations = upload_queue.done_stations(key)
+
+            # Read the pending stations of the file apart: a file that fails
+            # part-way adds no rows to the batches (it is fully retried later)
+            staged = {}
+            try:
+                with open_metrics_file(file_path) as file:
+                    reader = csv.reader(file)
+                    header = next(reader, None)
+                    station_column = header.index("Station_Id")
+                    for row in reader:
+                        if len(row) <= station_column or not row[station_column] or row[station_column] in done_stations:
+                            continue
+                        station_id = row[station_column]
+                        if station_id not in staged:
+                            staged[station_id] = StationBuffer(station_id, header)
+                        staged[station_id].write(row)
+                        if staged[station_id].memory_bytes() > UPLOAD_SPILL_THRESHOLD:
+                            staged[station_id].spill()
+            except Exception as e:
+                logger.error("❌ Catch-up could not read %s: %s", file_path, e)
+                results[key]["*"] = str(e) or type(e).__name__
+                for station_buffer in staged.values():
+                    station_buffer.close()
+                staged = {}
+            expected[key] = set(staged)
+            totals["files"] += 1
+
+            # Append the complete file to the open batches of its stations
+            for station_id, file_buffer in staged.items():
+                if station_id not in batches:
+                    batches[station_id] = (StationBuffer(station_id, header), [])
+                station_buffer, batch_keys = batches[station_id]
+                station_buffer.extend(file_buffer)
+                file_buffer.close()
+                batch_keys.append(key)
+                if station_buffer.memory_bytes() > UPLOAD_SPILL_THRESHOLD:
+                    station_buffer.spill()
+
+            # Send the batches that reached the size cap. Outside the upload
+            # windows a batch without flooding keeps growing (spilled to disk):
+            # the flood bypass is decided on all the pending rows of the station
+            upload_batches([station for station, (station_buffer, _) in batches.items()
+                            if station_buffer.size_bytes() >= batch_bytes and limiter.upload_allowed(station_buffer.flood)])
+
+        # Send the rest
+        upload_batches(list(batches))
+
+    finally:
+        for station_buffer, _ in batches.values():
+            station_buffer.close()
+
+        # Checkpoint every file read once and archive the complete ones.
+        # The files not read, or whose stations were never sent (the
+        # catch-up was interrupted), are released as they were queued.
+        completed = 0
+        for key, file_results in results.items():
+            if key not in files:
+                continue
+            error = file_results.pop("*", None)
+            if error is not None:
+                # Partly read file: no station checkpoint, it is fully retried later
+                file_results = {}
+            elif expected[key] and not file_results:
+                continue
+            else:
+                for station in expected[key] - set(file_results):
+                    file_results[station] = "catch-up interrupted"
+            empty = error is None and not expected[key] # Read, nothing left to upload
+            if upload_queue.record_results(key, file_results, error, None if error else get_deferred_retry(file_results), empty):
+                complete_queued_upload(key, files[key])
+                completed += 1
+        for key in keys:
+            upload_queue.release(key)
+
+    elapsed = max(time.time() - started, 1e-6)
+    logger.info("📊 Catch-up finished: %d of %d files completed, %d rows in %d uploads, %.2f MB in %.1fs (%.0f rows/s)",
+                completed, len(keys), totals["rows"], totals["uploads"], totals["bytes"] / 1e6, elapsed, totals["rows"] / elapsed)
+    return completed
 ##################################################################################################
 
 
 
 #################################### PROGRAM EXECUTION ###########################################
 ##################################################################################################
+def complete_queued_upload(key, file_path):
+    """
+    Move a fully uploaded file to the archive and drop it from the queue
+    """
+    get_upload_queue().remove(key)
+    if archive_file(file_path, STATUS_UPLOADED):
+        logger.info("🧹 Archived uploaded file %s", file_path)
+    else:
+        logger.error("❌ Failed to archive uploaded file: %s", file_path)
+
+
+def process_queued_upload(key):
+    """
+    Upload the stations of a queued file that are still pending and
+    checkpoint the results. The file is archived and leaves the queue
+    only once every station has been uploaded.
+    """
+    upload_queue = get_upload_queue()
+    if not upload_queue.claim(key):
+        return False
+
+    try:
+        entry = upload_queue.get(key)
+        file_path = entry["file"]
+        if not os.path.exists(file_path):
+            logger.error("❌ Queued file %s no longer exists, removed from the upload queue.", file_path)
+            upload_queue.remove(key)
+            return False
+
+        results, error = {}, None
+        try:
+            results = upload_file_stations(file_path, entry["sensors_file"] or SENSOR_FILE, upload_queue.done_stations(key))
+        except Exception as e:
+            logger.error("❌ Critical error processing %s: %s", file_path, e)
+            error = str(e) or type(e).__name__
+
+        empty = error is None and not results # Read, nothing left to upload
+        if upload_queue.record_results(key, results, error, None if error else get_deferred_retry(results), empty):
+            complete_queued_upload(key, file_path)
+            return True
+
+        entry = upload_queue.get(key)
+        done = sum(1 for state in entry["stations"].values() if state["status"] == STATION_UPLOADED)
+        logger.warning("❌ Upload incomplete for %s (%d/%d stations, attempt %d). RAW file preserved, retry at %s.",
+                       file_path, done, len(entry["stations"]), entry["attempts"],
+                       time.strftime("%H:%M:%S", time.localtime(entry["next_attempt"])))
+        return False
+
+    finally:
+        upload_queue.release(key)
+
+
+def retry_pending_uploads():
+    """
+    Retry the queued files whose backoff has expired.
+    Return the number of files completed.
+    """
+    due = get_upload_queue().due()
+    if not due:
+        return 0
+
+    init_sensor_file()
+    logger.info("🔁 Retrying %d queued uploads...", len(due))
+    return sum(1 for key in due if process_queued_upload(key))
+
+
 def run_uploader(file_to_upload):
     """
     Principal function, called by metrics_receiver.py
-    Process, upload and delete the RAW file if the upload is sucessful
+    Queue, upload and archive the RAW file once all its stations are uploaded
     """
 
     logger.info("📡 Starting Metrics uploader...")
@@ -169,24 +697,45 @@ def run_uploader(file_to_upload):
             logger.warning("⚠️ No data file to upload for previous hour: %s", file_to_upload)
             return False
 
-        success = submit_file_to_upstream(file_to_upload)
-        if success:
-            try:
-                os.remove(file_to_upload) # File DELETE
-                logger.info("🧹 Removed uploaded file %s", file_to_upload)
-            except Exception as e:
-                logger.error("❌ Failed to remove uploaded file: %s", e)
-        else:
-            logger.warning("❌ Upload failed for %s. RAW file preserved.", file_to_upload)
+        # The queue keeps the file and its checkpoints until every station is uploaded
+        key = get_upload_queue().add(file_to_upload)
+        process_queued_upload(key)
 
+        stats = get_bandwidth_limiter().stats()
+        logger.info("📶 Upload bandwidth: %d bytes sent (%d flood bypass), %.1fs throttled in total",
+                    stats["bytes_sent"], stats["bytes_bypassed"], stats["throttled_seconds"])
         return True
 
     logger.warning("❌ Error creating template file")
     return False
 
 
+def run_rollup_uploader(file_to_upload):
+    """
+    Upload a closed rollup series file (see rollup_engine.py) as its own series
+    """
+    from rollup_engine import ROLLUP_SENSOR_FILE
+
+    if not os.path.exists(file_to_upload) or not os.path.exists(ROLLUP_SENSOR_FILE):
+        logger.warning("⚠️ Rollup file or template not found: %s", file_to_upload)
+        return False
+
+    logger.info("📈 Uploading rollup series %s...", file_to_upload)
+    return submit_file_to_upstream(file_to_upload, sensors_file=ROLLUP_SENSOR_FILE)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    setup_logging()
+    if len(sys.argv) > 1 and sys.argv[1] == "--catchup":
+        print("Catching up the upload backlog")
+        run_catchup()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--retry":
+        print("Retrying the queued uploads")
+        retry_pending_uploads()
+    elif len(sys.argv) > 2 and sys.argv[1] == "--rollups":
+        print(f"Executing manual rollup upload with: {sys.argv[2]}")
+        run_rollup_uploader(sys.argv[2])
+    elif len(sys.argv) > 1:
         print(f"Executing manual upload with: {sys.argv[1]}")
         run_uploader(sys.argv[1])
     else:
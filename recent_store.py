@@ -0,0 +1,484 @@
+"""
+This program keeps in memory the last hours of data received
+by "metrics_receiver.py" for every station and sensor, using
+compressed time series (delta-of-delta timestamps and XOR
+encoded values), and exposes them through a small local
+HTTP/JSON API (range, latest value and aggregates).
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import json
+import time
+import struct
+import logging
+import datetime
+import threading
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from rollup_engine import read_rollups, PERIODS
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# Columns of the receiver CSV row stored as series
+SERIES_COLUMNS = {"Precipitation": 0, "Temperature": 1, "Humidity": 2, "Flooding": 3}
+STATION_COLUMN = 5
+TIME_COLUMN = 6
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+####################################### ENCODING HELPERS #########################################
+##################################################################################################
+def _write_varint(buffer, number):
+    """
+    Append a zigzag encoded signed integer as a varint
+    """
+    number = (number << 1) ^ (number >> 63)
+    while number > 0x7F:
+        buffer.append((number & 0x7F) | 0x80)
+        number >>= 7
+    buffer.append(number)
+
+
+def _read_varint(buffer, position):
+    """
+    Read a zigzag varint, return (value, next position)
+    """
+    shift = 0
+    number = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        number |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return (number >> 1) ^ -(number & 1), position
+
+
+def _float_bits(value):
+    return struct.unpack(">Q", struct.pack(">d", value))[0]
+
+
+def _bits_float(bits):
+    return struct.unpack(">d", struct.pack(">Q", bits))[0]
+##################################################################################################
+
+
+
+##################################### COMPRESSED SERIES ##########################################
+##################################################################################################
+class SeriesBlock:
+    """
+    Append-only compressed block of (timestamp, value) points.
+    Timestamps are stored as zigzag varints of the delta-of-delta,
+    values as the XOR with the previous value: one header byte with
+    the leading and trailing zero bytes, then the meaningful bytes.
+    """
+
+    __slots__ = ("start", "end", "count", "data", "_last_ts", "_last_delta", "_last_bits",
+                 "minimum", "maximum", "total")
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.count = 0
+        self.data = bytearray()
+        self._last_ts = 0
+        self._last_delta = 0
+        self._last_bits = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+
+    def append(self, timestamp, value):
+        """
+        Add a point (timestamp in integer seconds, float value)
+        """
+        delta = timestamp - self._last_ts if self.count else timestamp
+        _write_varint(self.data, delta - self._last_delta if self.count else delta)
+        self._last_delta = delta if self.count else 0
+        self._last_ts = timestamp
+
+        bits = _float_bits(value)
+        xor = bits ^ self._last_bits
+        if xor == 0:
+            self.data.append(0x80)
+        else:
+            raw = xor.to_bytes(8, "big")
+            leading = len(raw) - len(raw.lstrip(b"\x00"))
+            trailing = len(raw) - len(raw.rstrip(b"\x00"))
+            self.data.append((leading << 4) | trailing)
+            self.data += raw[leading:8 - trailing]
+        self._last_bits = bits
+
+        if self.start is None:
+            self.start = timestamp
+        self.end = timestamp
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def __iter__(self):
+        position = 0
+        timestamp = 0
+        delta = 0
+        bits = 0
+        for index in range(self.count):
+            encoded, position = _read_varint(self.data, position)
+            if index == 0:
+                timestamp = encoded
+            else:
+                delta += encoded
+                timestamp += delta
+
+            header = self.data[position]
+            position += 1
+            if header != 0x80:
+                leading, trailing = header >> 4, header & 0x0F
+                size = 8 - leading - trailing
+                xor = int.from_bytes(self.data[position:position + size], "big") << (8 * trailing)
+                position += size
+                bits ^= xor
+            yield timestamp, _bits_float(bits)
+
+    def memory_bytes(self):
+        return len(self.data) + 96
+
+
+class CompressedSeries:
+    """
+    Rolling window of a single station/sensor series split in
+    compressed blocks. Whole blocks older than the window are
+    dropped, so memory is bounded by the window length.
+    """
+
+    def __init__(self, window_seconds, block_seconds, max_points):
+        self.window_seconds = window_seconds
+        self.block_seconds = block_seconds
+        self.max_points = max_points
+        self.blocks = deque()
+        self.count = 0
+        self.latest = None
+
+    def append(self, timestamp, value):
+        """
+        Add a point, points older than the latest one are ignored
+        """
+        if self.latest is not None and timestamp < self.latest[0]:
+            return False
+
+        block = self.blocks[-1] if self.blocks else None
+        if block is None or timestamp - block.start >= self.block_seconds:
+            block = SeriesBlock()
+            self.blocks.append(block)
+        block.append(timestamp, value)
+        self.count += 1
+        self.latest = (timestamp, value)
+        self.evict(timestamp)
+        return True
+
+    def evict(self, now):
+        """
+        Drop the blocks that are completely out of the window (or over the points cap)
+        """
+        limit = now - self.window_seconds
+        while len(self.blocks) > 1 and (self.blocks[0].end < limit or self.count > self.max_points):
+            self.count -= self.blocks.popleft().count
+
+    def points(self, start=None, end=None):
+        """
+        Generator of the (timestamp, value) points in [start, end]
+        """
+        for block in self.blocks:
+            if end is not None and block.start > end:
+                break
+            if start is not None and block.end < start:
+                continue
+            for timestamp, value in block:
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp > end:
+                    break
+                yield timestamp, value
+
+    def aggregate(self, start=None, end=None):
+        """
+        Count, min, max, mean, sum, first and last values in [start, end].
+        Blocks completely inside the range use their precomputed totals.
+        """
+        count = 0
+        total = 0.0
+        minimum = maximum = first = last = None
+
+        for block in self.blocks:
+            if end is not None and block.start > end:
+                break
+            if start is not None and block.end < start:
+                continue
+
+            if (start is None or block.start >= start) and (end is None or block.end <= end):
+                count += block.count
+                total += block.total
+                minimum = block.minimum if minimum is None else min(minimum, block.minimum)
+                maximum = block.maximum if maximum is None else max(maximum, block.maximum)
+                if first is None:
+                    first = next(iter(block))
+                if block is self.blocks[-1]:
+                    last = self.latest
+                else:
+                    for last in block:
+                        pass
+                continue
+
+            for point in self.points_in_block(block, start, end):
+                count += 1
+                total += point[1]
+                minimum = point[1] if minimum is None else min(minimum, point[1])
+                maximum = point[1] if maximum is None else max(maximum, point[1])
+                if first is None:
+                    first = point
+                last = point
+
+        return {
+            "count": count,
+            "min": minimum,
+            "max": maximum,
+            "sum": total if count else None,
+            "mean": total / count if count else None,
+            "first": list(first) if first else None,
+            "last": list(last) if last else None,
+        }
+
+    @staticmethod
+    def points_in_block(block, start, end):
+        for timestamp, value in block:
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp > end:
+                break
+            yield timestamp, value
+
+    def memory_bytes(self):
+        return sum(block.memory_bytes() for block in self.blocks)
+##################################################################################################
+
+
+
+###################################### RECENT WINDOW STORE #######################################
+##################################################################################################
+class RecentWindowStore:
+    """
+    Thread-safe per station, per sensor rolling window of compressed series
+    """
+
+    def __init__(self, window_seconds=86400, block_seconds=3600, max_points=10080):
+        self.window_seconds = window_seconds
+        self.block_seconds = block_seconds
+        self.max_points = max_points
+        self.series = {}
+        self.dropped = 0 # Points older than the latest one of their series (not stored)
+        self.lock = threading.Lock()
+
+    def add(self, station_id, sensor, timestamp, value):
+        """
+        Add a single point: True if stored, False if older than the latest
+        point of its series (counted as dropped), None if not numeric
+        """
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+
+        key = (str(station_id), sensor)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = CompressedSeries(self.window_seconds, self.block_seconds, self.max_points)
+                self.series[key] = series
+            if series.append(int(timestamp), value):
+                return True
+            self.dropped += 1
+            return False
+
+    def add_row(self, row):
+        """
+        Add a row in the receiver CSV format (see metrics_receiver.py).
+        The series are append-only: the values of a late row (older than
+        the latest point of their series) are counted and not stored.
+        """
+        timestamp = parse_time(row[TIME_COLUMN])
+        late = [sensor for sensor, column in SERIES_COLUMNS.items()
+                if row[column] is not None and self.add(row[STATION_COLUMN], sensor, timestamp, row[column]) is False]
+        if late:
+            logger.warning("⚠️ Late row of station %s at %s not kept in the recent window (%d points dropped in total).",
+                           row[STATION_COLUMN], row[TIME_COLUMN], self.dropped)
+
+    def expire(self, now=None):
+        """
+        Drop the blocks out of the window and the empty series
+        """
+        now = int(now if now is not None else time.time())
+        with self.lock:
+            for key in list(self.series):
+                series = self.series[key]
+                series.evict(now)
+                if series.latest and series.latest[0] < now - self.window_seconds:
+                    del self.series[key]
+
+    def stations(self):
+        with self.lock:
+            result = {}
+            for station_id, sensor in self.series:
+                result.setdefault(station_id, []).append(sensor)
+            return result
+
+    def latest(self, station_id, sensor):
+        with self.lock:
+            series = self.series.get((str(station_id), sensor))
+            return list(series.latest) if series and series.latest else None
+
+    def range(self, station_id, sensor, start=None, end=None):
+        with self.lock:
+            series = self.series.get((str(station_id), sensor))
+            return [list(point) for point in series.points(start, end)] if series else []
+
+    def aggregate(self, station_id, sensor, start=None, end=None):
+        with self.lock:
+            series = self.series.get((str(station_id), sensor))
+            return series.aggregate(start, end) if series else None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "series": len(self.series),
+                "points": sum(series.count for series in self.series.values()),
+                "memory_bytes": sum(series.memory_bytes() for series in self.series.values()),
+                "dropped_points": self.dropped,
+                "window_seconds": self.window_seconds,
+            }
+
+
+def parse_time(value):
+    """
+    Epoch seconds from a number or a "%Y-%m-%d %H:%M:%S" string
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return int(datetime.datetime.strptime(value, TIME_FORMAT).timestamp())
+
+
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime(TIME_FORMAT)
+##################################################################################################
+
+
+
+######################################## HTTP QUERY API ##########################################
+##################################################################################################
+class RecentQueryHandler(BaseHTTPRequestHandler):
+    """
+    GET /stations
+    GET /stats
+    GET /latest?station=<id>&sensor=<name>
+    GET /range?station=<id>&sensor=<name>[&start=<t>][&end=<t>]
+    GET /aggregate?station=<id>&sensor=<name>[&start=<t>][&end=<t>]
+    GET /rollups?period=<hourly|daily>[&station=<id>][&start=<t>][&end=<t>]
+    Times are epoch seconds or "%Y-%m-%d %H:%M:%S".
+    """
+
+    store = None
+    rollups = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        try:
+            if url.path == "/stations":
+                return self.send_json(200, self.store.stations())
+            if url.path == "/stats":
+                return self.send_json(200, self.store.stats())
+            if url.path == "/rollups":
+                return self.send_rollups(params)
+
+            station = params.get("station")
+            sensor = params.get("sensor")
+            if url.path not in ("/latest", "/range", "/aggregate"):
+                return self.send_json(404, {"error": "Unknown endpoint"})
+            if not station or not sensor:
+                return self.send_json(400, {"error": "Parameters 'station' and 'sensor' are required"})
+
+            if url.path == "/latest":
+                return self.send_json(200, {"station": station, "sensor": sensor, "latest": self.store.latest(station, sensor)})
+
+            start = parse_time(params.get("start"))
+            end = parse_time(params.get("end"))
+            if url.path == "/range":
+                points = self.store.range(station, sensor, start, end)
+                return self.send_json(200, {"station": station, "sensor": sensor, "points": points})
+            return self.send_json(200, {"station": station, "sensor": sensor, "aggregate": self.store.aggregate(station, sensor, start, end)})
+
+        except ValueError as e:
+            return self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            logger.error("❌ Recent store query failed: %s", e)
+            return self.send_json(500, {"error": "Internal error"})
+
+    def send_rollups(self, params):
+        """
+        Closed rollups from disk plus the still open ones
+        """
+        period = params.get("period", "hourly")
+        if self.rollups is None or period not in PERIODS:
+            return self.send_json(400, {"error": "Rollups not available for this period"})
+
+        start, end = params.get("start"), params.get("end")
+        start = format_time(parse_time(start)) if start else None
+        end = format_time(parse_time(end)) if end else None
+        station = params.get("station")
+
+        closed = list(read_rollups(period, station, start, end, self.rollups.rollup_dir))
+        current = [row for row in self.rollups.current(period, station)
+                   if (start is None or row["collectiontime"] >= start) and (end is None or row["collectiontime"] <= end)]
+        return self.send_json(200, {"period": period, "closed": closed, "current": current})
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug("Recent API: " + format, *args)
+
+
+def start_query_server(store, host="127.0.0.1", port=4041, rollups=None):
+    """
+    Start the HTTP/JSON query API on a daemon thread, return the server
+    """
+    handler = type("BoundRecentQueryHandler", (RecentQueryHandler,), {"store": store, "rollups": rollups})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="Recent-API", daemon=True).start()
+    logger.info("🔎 Recent data API listening on http://%s:%d", host, port)
+    return server
+##################################################################################################
@@ -0,0 +1,426 @@
+"""
+This program maintains hourly and daily aggregates (rollups)
+of the data received by "metrics_receiver.py": rainfall total,
+max rain intensity, temperature min/max/mean, mean humidity
+and flood duration. They are updated in O(1) per row with
+per-station accumulators and written to their own CSV series
+when each hour/day closes. Rows that arrive late (e.g. a backlog
+sent after newer rows) are merged into the hour or day they
+belong to, and the rollup row of a closed period is revised.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import csv
+import json
+import logging
+import datetime
+import threading
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ROLLUP PATHS ======
+LOG_DIR = "./Logs/"
+ROLLUP_DIR = os.path.join(LOG_DIR, "Rollups/")
+ROLLUP_STATE_FILE = os.path.join(ROLLUP_DIR, "rollup_state.json")
+ROLLUP_SENSOR_FILE = os.path.join(ROLLUP_DIR, "rollup_template.csv")
+
+
+# ====== ROLLUP SETTINGS ======
+PERIODS = ("hourly", "daily")
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_INTERVAL = 60 # Seconds between rows of a station (used for the first row)
+MAX_GAP_SECONDS = 300 # Longer gaps are not counted as flood duration
+ROLLUP_KEEP_CLOSED = 48 # Closed periods kept per station and period to merge late rows
+
+ROLLUP_HEADER = [
+    "Precipitation_Total", "Precipitation_Max_Intensity", "Temperature_Min", "Temperature_Max",
+    "Temperature_Mean", "Humidity_Mean", "Flooding_Duration", "Samples", "Station_Id",
+    "collectiontime", "period_end", "Lat_deg", "Lon_deg"
+]
+
+# Row columns in the receiver CSV format (see metrics_receiver.py)
+PRECIPITATION, TEMPERATURE, HUMIDITY, FLOODING, NODE_ID, STATION_ID, COLLECTION_TIME, LAT_DEG, LON_DEG = range(9)
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+####################################### ACCUMULATORS #############################################
+##################################################################################################
+class RollupAccumulator:
+    """
+    Running aggregates of one station for one hour or day
+    """
+
+    __slots__ = ("start", "end", "samples", "rain_total", "max_intensity", "temp_min", "temp_max",
+                 "temp_sum", "temp_count", "humid_sum", "humid_count", "flood_seconds", "lat", "lon")
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.samples = 0
+        self.rain_total = 0.0
+        self.max_intensity = None
+        self.temp_min = None
+        self.temp_max = None
+        self.temp_sum = 0.0
+        self.temp_count = 0
+        self.humid_sum = 0.0
+        self.humid_count = 0
+        self.flood_seconds = 0.0
+        self.lat = None
+        self.lon = None
+
+    def update(self, precipitation, temperature, humidity, flooding, elapsed, lat, lon):
+        """
+        Add one row, "elapsed" are the seconds since the previous row of the station
+        """
+        self.samples += 1
+        self.lat, self.lon = lat, lon
+
+        if precipitation is not None:
+            self.rain_total += precipitation
+            intensity = precipitation * 3600.0 / elapsed # mm/h
+            if self.max_intensity is None or intensity > self.max_intensity:
+                self.max_intensity = intensity
+
+        if temperature is not None:
+            self.temp_sum += temperature
+            self.temp_count += 1
+            if self.temp_min is None or temperature < self.temp_min:
+                self.temp_min = temperature
+            if self.temp_max is None or temperature > self.temp_max:
+                self.temp_max = temperature
+
+        if humidity is not None:
+            self.humid_sum += humidity
+            self.humid_count += 1
+
+        if flooding and elapsed <= MAX_GAP_SECONDS:
+            self.flood_seconds += elapsed
+
+    def to_row(self, station_id):
+        """
+        CSV row of the rollup (ROLLUP_HEADER order)
+        """
+        return [
+            round(self.rain_total, 4),
+            round(self.max_intensity, 4) if self.max_intensity is not None else None,
+            self.temp_min,
+            self.temp_max,
+            round(self.temp_sum / self.temp_count, 2) if self.temp_count else None,
+            round(self.humid_sum / self.humid_count, 2) if self.humid_count else None,
+            int(self.flood_seconds),
+            self.samples,
+            station_id,
+            self.start,
+            self.end,
+            self.lat,
+            self.lon,
+        ]
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        accumulator = cls(data["start"], data["end"])
+        for slot in cls.__slots__:
+            setattr(accumulator, slot, data.get(slot))
+        return accumulator
+
+
+def _to_float(value):
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def period_bounds(period, moment):
+    """
+    Start and end (strings) of the hour or day that contains "moment"
+    """
+    if period == "hourly":
+        start = moment.replace(minute=0, second=0, microsecond=0)
+        end = start + datetime.timedelta(hours=1)
+    else:
+        start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + datetime.timedelta(days=1)
+    return start.strftime(TIME_FORMAT), end.strftime(TIME_FORMAT)
+##################################################################################################
+
+
+
+####################################### ROLLUP ENGINE ############################################
+##################################################################################################
+class RollupEngine:
+    """
+    Keeps the open hourly/daily accumulators per station and writes
+    each one to its CSV series once its period is over
+    """
+
+    def __init__(self, rollup_dir=ROLLUP_DIR):
+        self.rollup_dir = rollup_dir
+        self.state_file = os.path.join(rollup_dir, os.path.basename(ROLLUP_STATE_FILE))
+        self.open = {period: {} for period in PERIODS}  # period -> station -> accumulator
+        self.closed = {period: {} for period in PERIODS}  # period -> station -> start -> written accumulator
+        self.revised = set()  # (period, station, start) of closed periods changed by late rows
+        self.last_seen = {}  # station -> epoch seconds of its newest row (never goes back)
+        self.late_seen = {}  # station -> epoch seconds of its previous late row
+        self.dropped = 0  # Late rows older than the closed periods kept
+        self.lock = threading.Lock()
+        os.makedirs(self.rollup_dir, exist_ok=True)
+        self.init_sensor_file()
+        self.load_state()
+
+    def init_sensor_file(self):
+        """
+        Template with the rollup variables for Upstream
+        """
+        sensor_file = os.path.join(self.rollup_dir, os.path.basename(ROLLUP_SENSOR_FILE))
+        if os.path.exists(sensor_file):
+            return
+        with open(sensor_file, "w", newline="") as file:
+            writer = csv.writer(file, delimiter="\t")
+            writer.writerow(["alias,variablename,postprocess,units,datatype"])
+            writer.writerow(["Precipitation_Total,Precipitation_Total,False,mm,float"])
+            writer.writerow(["Precipitation_Max_Intensity,Precipitation_Max_Intensity,False,mm/h,float"])
+            writer.writerow(["Temperature_Min,Temperature_Min,False,Celsius,float"])
+            writer.writerow(["Temperature_Max,Temperature_Max,False,Celsius,float"])
+            writer.writerow(["Temperature_Mean,Temperature_Mean,False,Celsius,float"])
+            writer.writerow(["Humidity_Mean,Humidity_Mean,False,Percentage,float"])
+            writer.writerow(["Flooding_Duration,Flooding_Duration,False,Seconds,integer"])
+            writer.writerow(["Samples,Samples,False,Count,integer"])
+
+    def add_row(self, row):
+        """
+        Update the accumulators of the row station in O(1)
+        """
+        station_id = str(row[STATION_ID])
+        moment = datetime.datetime.strptime(row[COLLECTION_TIME], TIME_FORMAT)
+        timestamp = moment.timestamp()
+        values = (
+            _to_float(row[PRECIPITATION]),
+            _to_float(row[TEMPERATURE]),
+            _to_float(row[HUMIDITY]),
+            _to_float(row[FLOODING]),
+        )
+
+        with self.lock:
+            previous = self.last_seen.get(station_id)
+            if previous is None or timestamp > previous:
+                elapsed = timestamp - previous if previous is not None else DEFAULT_INTERVAL
+                self.last_seen[station_id] = timestamp
+            else:
+                # Late row: the time since the newest row means nothing, use the
+                # previous late row of the station (a backlog comes oldest first)
+                before = self.late_seen.get(station_id)
+                elapsed = timestamp - before if before is not None and 0 < timestamp - before <= MAX_GAP_SECONDS else DEFAULT_INTERVAL
+                self.late_seen[station_id] = timestamp
+
+            for period in PERIODS:
+                start, end = period_bounds(period, moment)
+                accumulator = self.get_accumulator(period, station_id, start, end)
+                if accumulator is None:
+                    self.dropped += 1
+                    logger.warning("⚠️ Late row of station %s at %s is older than the %s rollups kept, not counted (%d dropped).",
+                                   station_id, row[COLLECTION_TIME], period, self.dropped)
+                    continue
+                accumulator.update(*values, elapsed, row[LAT_DEG], row[LON_DEG])
+
+    def get_accumulator(self, period, station_id, start, end):
+        """
+        Accumulator of the period starting at "start": the open one, a new
+        one (closing the open one), or a closed one reopened for a late row.
+        None if the period is too old (must be called with the lock held).
+        """
+        accumulator = self.open[period].get(station_id)
+        if accumulator is not None and accumulator.start == start:
+            return accumulator
+
+        closed = self.closed[period].setdefault(station_id, {})
+        if start in closed:
+            # Late row of a written period: its row is revised on the next flush
+            self.revised.add((period, station_id, start))
+            return closed[start]
+
+        if (accumulator is None or start > accumulator.start) and start > max(closed, default=""):
+            if accumulator is not None:
+                self.close_rollup(period, station_id, accumulator)
+            accumulator = RollupAccumulator(start, end)
+            self.open[period][station_id] = accumulator
+            return accumulator
+
+        if len(closed) >= ROLLUP_KEEP_CLOSED and start < min(closed):
+            return None
+
+        # Late row of a period without any row yet: written as a revision
+        accumulator = RollupAccumulator(start, end)
+        closed[start] = accumulator
+        self.revised.add((period, station_id, start))
+        return accumulator
+
+    def close_rollup(self, period, station_id, accumulator):
+        """
+        Write a finished period and keep it for the late rows (must be called with the lock held)
+        """
+        self.write_rollup(period, station_id, accumulator)
+        closed = self.closed[period].setdefault(station_id, {})
+        closed[accumulator.start] = accumulator
+        while len(closed) > ROLLUP_KEEP_CLOSED:
+            del closed[min(closed)]
+
+    def flush(self, now=None):
+        """
+        Write the accumulators whose period is already over
+        (stations that stopped sending data)
+        """
+        now = (now or datetime.datetime.now()).strftime(TIME_FORMAT)
+        with self.lock:
+            for period in PERIODS:
+                for station_id, accumulator in list(self.open[period].items()):
+                    if accumulator.end <= now:
+                        self.close_rollup(period, station_id, accumulator)
+                        del self.open[period][station_id]
+            self.write_revisions()
+
+    def write_revisions(self):
+        """
+        Rewrite the rows of the closed periods changed by late rows (must be called with the lock held)
+        """
+        for period, station_id, start in sorted(self.revised):
+            accumulator = self.closed[period].get(station_id, {}).get(start)
+            if accumulator is not None:
+                self.rewrite_rollup(period, station_id, accumulator)
+        self.revised.clear()
+
+    def get_series_file(self, period, start):
+        """
+        CSV file of a period series, one file per day (hourly) or month (daily)
+        """
+        stamp = start[:10].replace("-", "") if period == "hourly" else start[:7].replace("-", "")
+        return os.path.join(self.rollup_dir, f"rollups_{period}_{stamp}.csv")
+
+    def write_rollup(self, period, station_id, accumulator):
+        file_path = self.get_series_file(period, accumulator.start)
+        try:
+            new_file = not os.path.exists(file_path)
+            with open(file_path, mode="a", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                if new_file:
+                    writer.writerow(ROLLUP_HEADER)
+                writer.writerow(accumulator.to_row(station_id))
+            logger.info("📈 %s rollup of station %s for %s written to %s", period.capitalize(), station_id, accumulator.start, os.path.basename(file_path))
+        except OSError as e:
+            logger.error("❌ Failed to write %s rollup for station %s: %s", period, station_id, e)
+
+    def rewrite_rollup(self, period, station_id, accumulator):
+        """
+        Replace the row of a revised period in its series file (added if missing)
+        """
+        file_path = self.get_series_file(period, accumulator.start)
+        station_column, start_column = ROLLUP_HEADER.index("Station_Id"), ROLLUP_HEADER.index("collectiontime")
+        new_row = ["" if value is None else str(value) for value in accumulator.to_row(station_id)]
+        try:
+            rows = []
+            if os.path.exists(file_path):
+                with open(file_path, "r", newline="", encoding="utf-8") as file:
+                    rows = list(csv.reader(file))[1:]
+            for index, row in enumerate(rows):
+                if row[station_column] == str(station_id) and row[start_column] == accumulator.start:
+                    rows[index] = new_row
+                    break
+            else:
+                rows.append(new_row)
+
+            tmp_path = file_path + ".tmp"
+            with open(tmp_path, mode="w", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                writer.writerow(ROLLUP_HEADER)
+                writer.writerows(rows)
+            os.replace(tmp_path, file_path)
+            logger.info("📈 %s rollup of station %s for %s revised with late rows in %s", period.capitalize(), station_id, accumulator.start, os.path.basename(file_path))
+        except OSError as e:
+            logger.error("❌ Failed to revise %s rollup for station %s: %s", period, station_id, e)
+
+    def current(self, period, station_id=None):
+        """
+        Rows of the still open accumulators (partial period)
+        """
+        with self.lock:
+            return [
+                dict(zip(ROLLUP_HEADER, accumulator.to_row(station)))
+                for station, accumulator in sorted(self.open[period].items())
+                if station_id is None or station == str(station_id)
+            ]
+
+    def save_state(self):
+        """
+        Persist the open accumulators, to continue them after a restart
+        """
+        with self.lock:
+            self.write_revisions()
+            state = {
+                "open": {period: {station: acc.to_dict() for station, acc in stations.items()} for period, stations in self.open.items()},
+                "closed": {period: {station: [acc.to_dict() for acc in closed.values()] for station, closed in stations.items()}
+                           for period, stations in self.closed.items()},
+                "last_seen": self.last_seen,
+            }
+        tmp_path = self.state_file + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(state, file)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            logger.error("❌ Failed to save rollup state: %s", e)
+
+    def load_state(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error("❌ Rollup state unreadable, starting empty: %s", e)
+            return
+
+        for period in PERIODS:
+            for station, data in state.get("open", {}).get(period, {}).items():
+                self.open[period][station] = RollupAccumulator.from_dict(data)
+            for station, closed in state.get("closed", {}).get(period, {}).items():
+                self.closed[period][station] = {data["start"]: RollupAccumulator.from_dict(data) for data in closed}
+        self.last_seen = state.get("last_seen", {})
+        logger.info("📈 Rollup state restored for %d stations.", len(self.last_seen))
+
+
+def read_rollups(period, station_id=None, start=None, end=None, rollup_dir=ROLLUP_DIR):
+    """
+    Generator of persisted rollup rows (dicts) of a period, filtered by
+    station and by period start in [start, end]
+    """
+    if not os.path.isdir(rollup_dir):
+        return
+    for name in sorted(os.listdir(rollup_dir)):
+        if not name.startswith(f"rollups_{period}_"):
+            continue
+        with open(os.path.join(rollup_dir, name), "r", newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                if station_id is not None and row["Station_Id"] != str(station_id):
+                    continue
+                if start is not None and row["collectiontime"] < start:
+                    continue
+                if end is not None and row["collectiontime"] > end:
+                    continue
+                yield row
+##################################################################################################
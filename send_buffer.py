@@ -0,0 +1,465 @@
+"""
+This program keeps the readings of "main.py" until the server
+confirms them. Recent readings stay in a bounded buffer in
+memory, older ones are spilled to an append-only spool of
+segment files on disk (one checksummed JSON line per reading),
+so an outage of days neither exhausts the memory of the node
+nor loses the data on a reboot or power loss. Readings are
+sent oldest first, and the disk use is capped with an
+explicit drop policy. Readings are serialized to JSON once,
+when appended, and kept as bytes in a single array, so the
+payload to send is a slice instead of a rebuild. A backlog can
+be taken in size-capped chunks, oldest first.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import json
+import zlib
+import logging
+import threading
+from array import array
+from bisect import bisect_right
+from dotenv import load_dotenv
+from hal import get_clock
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_dotenv("./Env/.env.config")
+
+
+# ====== SPOOL SETTINGS ======
+SPOOL_DIR = os.getenv("SPOOL_DIR") or "./Logs/Spool/"
+SPOOL_MEMORY_READINGS = int(os.getenv("SPOOL_MEMORY_READINGS") or 180) # Readings kept in memory before spilling
+SPOOL_MAX_MEMORY_AGE = float(os.getenv("SPOOL_MAX_MEMORY_AGE") or 0) # Seconds a reading may wait in memory (0 = report interval + margin)
+SPOOL_MEMORY_AGE_MARGIN = 60.0 # Seconds after the report interval before the readings in memory are spilled
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES") or 50 * 1024 * 1024) # Disk cap of the spool
+SPOOL_DROP_POLICY = (os.getenv("SPOOL_DROP_POLICY") or "oldest").strip().lower() # oldest | newest
+
+
+# ====== SPOOL FILES ======
+SEGMENT_PREFIX = "segment_"
+SEGMENT_SUFFIX = ".log"
+ACK_FILE = "acknowledged"
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+###################################### SEGMENT FILES #############################################
+##################################################################################################
+def serialize_reading(reading):
+    """
+    Compact JSON bytes of a reading (done once, when it is appended)
+    """
+    return json.dumps(reading, separators=(",", ":")).encode("utf-8")
+
+
+def encode_record(seq, record):
+    """
+    Spool line: "<crc32> <seq> <json>" (the checksum covers seq and json)
+    """
+    body = b"%d %s" % (seq, record)
+    return b"%08x %s\n" % (zlib.crc32(body), body)
+
+
+def read_segment(path):
+    """
+    Yield the (seq, JSON bytes) of a segment, skipping the lines whose
+    checksum doesn't match (e.g. torn by a power loss while writing)
+    """
+    with open(path, "rb") as file:
+        for number, line in enumerate(file, 1):
+            try:
+                checksum, body = line.rstrip(b"\n").split(b" ", 1)
+                if int(checksum, 16) != zlib.crc32(body):
+                    raise ValueError("checksum mismatch")
+                seq, record = body.split(b" ", 1)
+                yield int(seq), record
+            except ValueError as e:
+                logger.warning("⚠️ Corrupted record %s:%d skipped: %s", os.path.basename(path), number, e)
+##################################################################################################
+
+
+
+####################################### SEND BUFFER ##############################################
+##################################################################################################
+class MemoryChunk:
+    """
+    Readings in memory: the JSON bytes of each one followed by a comma
+    in one bytearray, plus their end offsets in a typed array. The JSON
+    list sent to the server is "[" + the bytearray without the last
+    comma + "]". Once sealed for a send, a chunk is never modified.
+    """
+
+    __slots__ = ("first_seq", "data", "ends")
+
+    def __init__(self, first_seq, data=None, ends=None):
+        self.first_seq = first_seq
+        self.data = data if data is not None else bytearray()
+        self.ends = ends if ends is not None else array("Q")
+
+    def __len__(self):
+        return len(self.ends)
+
+    @property
+    def last_seq(self):
+        return self.first_seq + len(self.ends) - 1
+
+    def append(self, record):
+        self.data += record
+        self.data += b","
+        self.ends.append(len(self.data))
+
+    def records(self):
+        """
+        Yield the (seq, JSON bytes) of the readings
+        """
+        with memoryview(self.data) as view:
+            start = 0
+            for index, end in enumerate(self.ends):
+                yield self.first_seq + index, bytes(view[start:end - 1])
+                start = end
+
+    def payload(self):
+        """
+        The readings as the items of a JSON list (without the brackets)
+        """
+        with memoryview(self.data) as view:
+            return bytes(view[:-1])
+
+    def head(self, max_bytes):
+        """
+        (items, count) of the first readings whose items fit in "max_bytes"
+        """
+        count = bisect_right(self.ends, max_bytes + 1) # Item length = end offset - the comma
+        if not count:
+            return b"", 0
+        with memoryview(self.data) as view:
+            return bytes(view[:self.ends[count - 1] - 1]), count
+
+    def after(self, last_seq):
+        """
+        New chunk with the readings after "last_seq"
+        """
+        count = last_seq - self.first_seq + 1
+        cut = self.ends[count - 1]
+        return MemoryChunk(last_seq + 1, self.data[cut:], array("Q", (end - cut for end in self.ends[count:])))
+
+
+class SendBuffer:
+    """
+    Readings waiting for the server ACK: memory first, spilled to disk
+    segments when the memory buffer is full or too old. Every reading
+    gets a sequence number, and an ACK removes up to the last sent one.
+    To send, the memory chunk being filled is sealed and a new one is
+    started (a swap under the lock), so readings appended while the
+    sender waits for the ACK go to the new chunk and are never lost.
+    """
+
+    def __init__(self, spool_dir=SPOOL_DIR, memory_readings=SPOOL_MEMORY_READINGS, max_memory_age=SPOOL_MAX_MEMORY_AGE,
+                 max_bytes=SPOOL_MAX_BYTES, drop_policy=SPOOL_DROP_POLICY, report_interval=60.0, clock=None):
+        self.spool_dir = spool_dir
+        self.memory_readings = memory_readings
+        self.fixed_memory_age = max_memory_age # 0 = follows the report interval
+        self.max_memory_age = None
+        self.max_bytes = max_bytes
+        self.drop_policy = drop_policy
+        self.clock = clock or get_clock() # Simulated time with the simulated sensors
+        self.lock = threading.Lock()
+        self.spill_lock = threading.Lock() # One segment written at a time (outside the lock)
+        self.memory = MemoryChunk(1) # Chunk being filled
+        self.sealed = [] # Chunks handed to the sender, not yet confirmed, oldest first
+        self.memory_count = 0 # Readings in memory (sealed chunks included)
+        self.memory_since = None # Monotonic time of the oldest reading in memory
+        self.segments = [] # (path, first_seq, last_seq, size), oldest first, replaced on change
+        self.acknowledged = 0 # Last seq confirmed by the server
+        self.next_seq = 1
+        self.dropped = 0
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.set_report_interval(report_interval)
+        self.load()
+
+    def set_report_interval(self, seconds):
+        """
+        Seconds between the offers of the data to the server (of the active
+        profile): the readings wait in memory up to the next offer plus a
+        margin, so a quiet profile doesn't spill each reading before its send
+        """
+        self.max_memory_age = self.fixed_memory_age or seconds + SPOOL_MEMORY_AGE_MARGIN
+
+    def load(self):
+        """
+        Recover the segments left by a previous run
+        """
+        try:
+            with open(os.path.join(self.spool_dir, ACK_FILE), "r", encoding="utf-8") as file:
+                self.acknowledged = int(file.read().strip() or 0)
+        except (OSError, ValueError):
+            self.acknowledged = 0
+
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            seqs = [seq for seq, _ in read_segment(path)]
+            if not seqs or max(seqs) <= self.acknowledged:
+                os.remove(path)
+                continue
+            self.segments.append((path, min(seqs), max(seqs), os.path.getsize(path)))
+
+        self.next_seq = max([self.acknowledged] + [segment[2] for segment in self.segments]) + 1
+        self.memory = MemoryChunk(self.next_seq)
+        if self.segments:
+            logger.info("💽 Spool recovered: %d readings in %d segments.", self.pending_count(), len(self.segments))
+
+    def append(self, reading):
+        # Serialized outside the lock, only the copy into the buffer is shared
+        record = serialize_reading(reading)
+        with self.lock:
+            self.memory.append(record)
+            self.memory_count += 1
+            self.next_seq += 1
+            now = self.clock.monotonic()
+            if self.memory_since is None:
+                self.memory_since = now
+
+            # Spill when the memory buffer is full or its oldest reading too old
+            full = self.memory_count >= self.memory_readings or now - self.memory_since >= self.max_memory_age
+        if full:
+            self.spill(wait=False) # Unless another thread is already spilling
+
+    def spill(self, wait=True):
+        """
+        Write the readings in memory as a new segment. The lock is only held
+        to hand over the chunks and to commit the segment: the write and its
+        fsync run without it, so appends and sends don't wait for the disk.
+        """
+        if not self.spill_lock.acquire(blocking=wait):
+            return
+        try:
+            self.write_segment()
+        finally:
+            self.spill_lock.release()
+
+    def write_segment(self):
+        """
+        Spill the chunks in memory (must be called with the spill lock held)
+        """
+        with self.lock:
+            chunks = self.start_spill()
+        if not chunks:
+            return
+
+        first_seq, last_seq = chunks[0].first_seq, chunks[-1].last_seq
+        data = b"".join(encode_record(seq, record) for chunk in chunks for seq, record in chunk.records())
+        path = os.path.join(self.spool_dir, f"{SEGMENT_PREFIX}{first_seq:012d}{SEGMENT_SUFFIX}")
+        try:
+            with open(path, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+        except OSError as e:
+            # Disk error: keep the readings in memory for the next try
+            logger.error("❌ Failed to spill readings to the spool: %s", e)
+            return
+
+        with self.lock:
+            if last_seq <= self.acknowledged:
+                os.remove(path) # Confirmed by the server during the write
+            else:
+                self.segments = self.segments + [(path, first_seq, last_seq, len(data))]
+                self.save_acknowledged() # An ACK during the write may not be on disk yet
+            spilled = [chunk for chunk in self.sealed if chunk.last_seq <= last_seq]
+            self.sealed = self.sealed[len(spilled):]
+            count = sum(len(chunk) for chunk in spilled)
+            self.memory_count -= count
+            # Readings appended during the write stay in memory
+            self.memory_since = self.clock.monotonic() if self.memory_count else None
+            self.enforce_disk_cap()
+        logger.info("💽 Spilled %d readings to %s", count, os.path.basename(path))
+
+    def start_spill(self):
+        """
+        Seal the chunk being filled and return the chunks to write, or None
+        if there is nothing to spill (must be called with the lock held)
+        """
+        if not self.memory_count:
+            return None
+
+        # Segment size: the JSON and comma of each reading plus its checksum, seq and separators
+        size = sum(len(chunk.data) for chunk in self.sealed + [self.memory]) + self.memory_count * (10 + len(str(self.next_seq)))
+        if self.drop_policy == "newest" and self.disk_bytes() + size > self.max_bytes:
+            # Spool full: keep the old data and the sealed chunks (being sent,
+            # confirmed or sent again by the sender), drop the new readings
+            count = len(self.memory)
+            self.dropped += count
+            self.memory = MemoryChunk(self.next_seq)
+            self.memory_count -= count
+            if not self.memory_count:
+                self.memory_since = None
+            logger.warning("🗑️ Spool full (%d bytes): %d new readings dropped.", self.max_bytes, count)
+            return None
+
+        if len(self.memory):
+            self.sealed.append(self.memory)
+            self.memory = MemoryChunk(self.next_seq)
+        return list(self.sealed)
+
+    def enforce_disk_cap(self):
+        """
+        Drop the oldest segments while the spool is over its cap (policy "oldest")
+        """
+        while len(self.segments) > 1 and self.disk_bytes() > self.max_bytes:
+            path, first_seq, last_seq, _ = self.segments[0]
+            self.segments = self.segments[1:]
+            dropped = last_seq - max(first_seq - 1, self.acknowledged)
+            self.dropped += max(dropped, 0)
+            self.acknowledged = max(self.acknowledged, last_seq)
+            os.remove(path)
+            self.save_acknowledged()
+            logger.warning("🗑️ Spool over %d bytes: oldest segment %s dropped (%d readings).", self.max_bytes, os.path.basename(path), dropped)
+
+    def disk_bytes(self):
+        return sum(segment[3] for segment in self.segments)
+
+    def pending(self):
+        """
+        JSON list of the readings not yet confirmed (oldest first), as bytes
+        ready to send, with the number of readings and the seq of the last
+        one (to acknowledge after the server ACK)
+        """
+        payload, count, last_seq, _ = self.pending_chunk()
+        return payload, count, last_seq
+
+    def pending_chunk(self, max_bytes=None):
+        """
+        Like pending(), limited to the oldest readings that fit in a payload
+        of "max_bytes" (at least one reading), plus True if more readings
+        are waiting, so a backlog is sent in chunks, one per exchange. Under
+        the lock the chunk being filled is only sealed and references are
+        taken; the records are read and joined after releasing it.
+        """
+        with self.lock:
+            if len(self.memory):
+                self.sealed.append(self.memory)
+                self.memory = MemoryChunk(self.next_seq)
+            segments = self.segments
+            chunks = list(self.sealed) # Few chunks: one per send since the last ACK or spill
+            acknowledged = self.acknowledged
+
+        records = []
+        size = 1 # "[" + each item and its comma (or "]")
+        count = 0
+        last_seq = acknowledged
+        more = False
+        for path, _, segment_last, _ in segments:
+            if more or segment_last <= acknowledged:
+                continue
+            try:
+                for seq, record in read_segment(path):
+                    if seq <= acknowledged:
+                        continue
+                    if max_bytes is not None and count and size + len(record) + 1 > max_bytes:
+                        more = True
+                        break
+                    records.append(record)
+                    size += len(record) + 1
+                    count += 1
+                    last_seq = max(last_seq, seq)
+            except OSError as e:
+                logger.error("❌ Failed to read spool segment %s: %s", path, e)
+        for chunk in chunks:
+            if more or chunk.last_seq <= acknowledged:
+                continue
+            if chunk.first_seq <= acknowledged:
+                chunk = chunk.after(acknowledged)
+            if max_bytes is None:
+                items, taken = chunk.payload(), len(chunk)
+            else:
+                items, taken = chunk.head(max_bytes - size - 1)
+                if not taken and not count:
+                    items, taken = chunk.head(chunk.ends[0] - 1) # A reading larger than the cap goes alone
+                more = taken < len(chunk)
+            if not taken:
+                continue
+            records.append(items)
+            size += len(items) + 1
+            count += taken
+            last_seq = chunk.first_seq + taken - 1
+
+        if not count:
+            return b"", 0, last_seq, False
+        return b"[" + b",".join(records) + b"]", count, last_seq, more
+
+    def acknowledge(self, last_seq):
+        """
+        Remove every reading up to "last_seq" (confirmed by the server).
+        The readings appended after the send are kept.
+        """
+        with self.lock:
+            if last_seq <= self.acknowledged:
+                return
+            self.acknowledged = last_seq
+            if self.segments and self.segments[0][2] <= last_seq:
+                done = [segment for segment in self.segments if segment[2] <= last_seq]
+                self.segments = self.segments[len(done):]
+                for path, _, _, _ in done:
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        logger.error("❌ Failed to remove spool segment %s: %s", path, e)
+            while self.sealed and self.sealed[0].last_seq <= last_seq:
+                self.memory_count -= len(self.sealed.pop(0))
+            if self.sealed and self.sealed[0].first_seq <= last_seq:
+                # Only when a spill and a send overlapped: keep the unconfirmed tail
+                chunk = self.sealed[0].after(last_seq)
+                self.memory_count -= len(self.sealed[0]) - len(chunk)
+                self.sealed[0] = chunk
+            if not self.memory_count:
+                self.memory_since = None
+            self.save_acknowledged()
+
+    def save_acknowledged(self):
+        """
+        Persist the last confirmed seq (must be called with the lock held)
+        """
+        if not self.segments:
+            # Nothing on disk to skip
+            return
+        tmp_path = os.path.join(self.spool_dir, ACK_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(str(self.acknowledged))
+        os.replace(tmp_path, os.path.join(self.spool_dir, ACK_FILE))
+
+    def pending_count(self):
+        return sum(last - max(first - 1, self.acknowledged) for _, first, last, _ in self.segments) + self.memory_count
+
+    def memory_bytes(self):
+        """
+        Bytes held by the readings in memory (JSON plus offsets)
+        """
+        with self.lock:
+            chunks = self.sealed + [self.memory]
+            return sum(len(chunk.data) + chunk.ends.itemsize * len(chunk) for chunk in chunks)
+
+    def __len__(self):
+        with self.lock:
+            return self.pending_count()
+
+    def close(self):
+        """
+        Keep the readings still in memory on disk for the next start
+        """
+        self.spill()
+##################################################################################################
@@ -0,0 +1,230 @@
+"""
+This program aggregates the sensor values of "main.py" over
+each reporting interval, so a sensor can be sampled every
+second while the node still sends one reading per sensor and
+interval. Each sensor keeps a constant size summary (count,
+min, max, mean and last value, plus the time of the first
+change of a flag like the flood sensor) that is turned into
+a reading when the interval ends.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import logging
+import datetime
+import threading
+from dotenv import load_dotenv
+from hal import get_clock
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_dotenv("./Env/.env.config")
+
+
+# ====== AGGREGATION SETTINGS ======
+AGGREGATION_INTERVAL = float(os.getenv("AGGREGATION_INTERVAL") or 60) # Seconds per reading sent, 0 = no aggregation
+FLUSH_DELAY = 1.0 # Seconds after the end of an interval for its last reads to finish
+
+
+# ====== VALUE SENT PER INTERVAL ======
+MODE_SUM = "sum" # e.g. rain: mm since the last read, the interval total is the sum
+MODE_MAX = "max" # e.g. flood: 1 if there was water at any moment
+MODE_MEAN = "mean" # e.g. temperature
+MODE_LAST = "last"
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+##################################### STREAMING SUMMARY ##########################################
+##################################################################################################
+class StreamingSummary:
+    """
+    Count, sum, min, max and last of one numeric series in O(1) memory,
+    with the time of the first change of value (against the last value
+    of the previous interval) when "transitions" is enabled
+    """
+
+    __slots__ = ("count", "total", "minimum", "maximum", "last", "previous", "transition_at", "transitions")
+
+    def __init__(self, transitions=False, previous=None):
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.last = None
+        self.previous = previous # Last value before the interval
+        self.transition_at = None
+        self.transitions = transitions
+
+    def add(self, value, at):
+        if self.count == 0:
+            self.minimum = self.maximum = value
+        else:
+            self.minimum = min(self.minimum, value)
+            self.maximum = max(self.maximum, value)
+        self.count += 1
+        self.total += value
+
+        reference = self.last if self.last is not None else self.previous
+        if self.transitions and self.transition_at is None and reference is not None and value != reference:
+            self.transition_at = at
+        self.last = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def value(self, mode):
+        if mode == MODE_SUM:
+            return round(self.total, 4) if isinstance(self.total, float) else self.total
+        if mode == MODE_MAX:
+            return self.maximum
+        if mode == MODE_LAST:
+            return self.last
+        return round(self.mean, 2)
+
+
+class SensorAggregate:
+    """
+    Summary of a sensor in the current interval: one StreamingSummary
+    per component of the value (e.g. [temperature, humidity])
+    """
+
+    __slots__ = ("mode", "transitions", "summaries")
+
+    def __init__(self, mode, transitions=False):
+        self.mode = mode
+        self.transitions = transitions
+        self.summaries = None
+
+    def add(self, value, at):
+        values = value if isinstance(value, (list, tuple)) else (value,)
+        if self.summaries is None or len(self.summaries) != len(values):
+            self.summaries = [StreamingSummary(self.transitions) for _ in values]
+        for summary, component in zip(self.summaries, values):
+            summary.add(component, at)
+
+    @property
+    def count(self):
+        return self.summaries[0].count if self.summaries else 0
+
+    def reading(self, composite):
+        """
+        (Value, Stats) of the interval, a list for a composite value
+        """
+        def pick(values):
+            return list(values) if composite else values[0]
+
+        summaries = self.summaries
+        stats = {
+            "count": self.count,
+            "min": pick([summary.minimum for summary in summaries]),
+            "max": pick([summary.maximum for summary in summaries]),
+            "mean": pick([round(summary.mean, 2) for summary in summaries]),
+            "last": pick([summary.last for summary in summaries]),
+        }
+        if self.transitions:
+            moment = summaries[0].transition_at
+            stats["first_transition"] = datetime.datetime.fromtimestamp(moment).strftime("%Y-%m-%d %H:%M:%S") if moment else None
+        return pick([summary.value(self.mode) for summary in summaries]), stats
+
+    def reset(self):
+        """
+        Start the next interval, keeping the last value to detect a change at its start
+        """
+        if self.summaries:
+            self.summaries = [StreamingSummary(self.transitions, summary.last) for summary in self.summaries]
+##################################################################################################
+
+
+
+##################################### SENSOR AGGREGATOR ##########################################
+##################################################################################################
+class SensorAggregator:
+    """
+    Aggregates the values of each sensor by interval (aligned to the
+    clock, from the time the value was scheduled) and gives
+    "on_reading(name, value, stats, at)" one reading per sensor with
+    values, "at" being the end of the interval. "stats" is None when a
+    single value was taken, so the readings are the same as without
+    aggregation.
+    """
+
+    def __init__(self, on_reading, interval=AGGREGATION_INTERVAL, clock=None):
+        self.on_reading = on_reading
+        self.clock = clock or get_clock() # Simulated time with the simulated sensors
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.sensors = {} # name -> [SensorAggregate, composite, interval start]
+        self.modes = {}
+
+    def register(self, name, mode=MODE_MEAN, transitions=False):
+        self.modes[name] = (mode, transitions)
+
+    def add(self, name, value, at=None):
+        """
+        Add a value (called for each read)
+        """
+        if value is None:
+            return
+        at = at or self.clock.time()
+        if self.interval <= 0:
+            self.on_reading(name, value, None, at)
+            return
+        start = at // self.interval * self.interval
+        mode, transitions = self.modes.get(name, (MODE_MEAN, False))
+        readings = []
+        with self.lock:
+            if name not in self.sensors:
+                self.sensors[name] = [SensorAggregate(mode, transitions), isinstance(value, (list, tuple)), start]
+            sensor = self.sensors[name]
+            if start > sensor[2]:
+                # First value of a new interval, the previous one is over
+                self.close(name, sensor, readings)
+                sensor[2] = start
+            # A late value of a closed interval counts in the current one
+            sensor[0].add(value, at)
+        self.emit(readings)
+
+    def next_flush(self, now=None):
+        now = self.clock.time() if now is None else now
+        interval = self.interval if self.interval > 0 else 1.0
+        return (now // interval + 1) * interval + FLUSH_DELAY
+
+    def flush(self, now=None):
+        """
+        Send the intervals ended before "now" (all of them when stopping)
+        """
+        readings = []
+        with self.lock:
+            for name, sensor in self.sensors.items():
+                if now is None or sensor[2] + self.interval <= now:
+                    self.close(name, sensor, readings)
+        self.emit(readings)
+        return len(readings)
+
+    def close(self, name, sensor, readings):
+        """
+        Reading of a finished interval (must be called with the lock held)
+        """
+        aggregate, composite, start = sensor
+        if aggregate.count:
+            value, stats = aggregate.reading(composite)
+            readings.append((name, value, stats if stats["count"] > 1 else None, start + self.interval))
+        aggregate.reset()
+
+    def emit(self, readings):
+        for name, value, stats, at in readings:
+            self.on_reading(name, value, stats, at)
+##################################################################################################
@@ -0,0 +1,259 @@
+"""
+This program finds and starts the sensor drivers of "main.py".
+The drivers come from the SENSOR_DRIVERS setting and from the
+"flood_sensor.sensors" entry points of the installed packages,
+as "name = module:function". Nothing is imported at startup:
+each driver is imported by its first read (in the worker of
+the scheduler running it), so the hardware setup of a slow
+driver doesn't delay the others, and a driver that fails
+(missing pin, library or device) gets its devices released
+and is retried with a growing delay while the rest of the
+node keeps collecting. The time each driver took to be ready
+is recorded.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import sys
+import time
+import logging
+import importlib
+import threading
+from importlib import metadata
+from dotenv import load_dotenv
+from hal import get_backend
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_dotenv("./Env/.env.config")
+
+
+# ====== DRIVER SETTINGS ======
+DEFAULT_SENSOR_DRIVERS = (
+    "Rain Gauge = Sensors.rain_gauge:get_rain_data, "
+    "Flood Sensor = Sensors.flood_sensor:get_flood_data, "
+    "Temperature and Humidity = Sensors.temp_and_humid_sensor:get_temp_and_humid_data"
+)
+SENSOR_DRIVERS = os.getenv("SENSOR_DRIVERS") or DEFAULT_SENSOR_DRIVERS # "name = module:function, ..."
+SENSOR_ENTRY_POINTS = (os.getenv("SENSOR_ENTRY_POINTS") or "true").strip().lower() in ("1", "true", "yes")
+SENSOR_INIT_RETRY = float(os.getenv("SENSOR_INIT_RETRY") or 30) # Seconds before the first retry of a failed driver
+SENSOR_INIT_RETRY_MAX = float(os.getenv("SENSOR_INIT_RETRY_MAX") or 600) # Longest wait between retries
+ENTRY_POINT_GROUP = "flood_sensor.sensors"
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+###################################### DRIVER DISCOVERY ##########################################
+##################################################################################################
+class SensorDriver:
+    """
+    A sensor read function, imported on first use
+    """
+
+    __slots__ = ("name", "target", "source", "func", "module", "attempts", "error", "load_seconds", "ready_after",
+                 "next_attempt", "lock")
+
+    def __init__(self, name, target, source):
+        self.name = name
+        self.target = target # "module:function"
+        self.source = source # config | entry point
+        self.func = None
+        self.module = None
+        self.attempts = 0
+        self.error = None
+        self.load_seconds = None # Import time of the successful attempt
+        self.ready_after = None # Seconds from the start of the registry
+        self.next_attempt = 0.0 # Monotonic time of the next import after a failure
+        self.lock = threading.Lock() # One import at a time
+
+    def load(self):
+        """
+        Import the module (its hardware setup runs here) and get the function
+        """
+        module_name, _, func_name = self.target.partition(":")
+        module = importlib.import_module(module_name.strip())
+        func = getattr(module, func_name.strip())
+        if not callable(func):
+            raise TypeError(f"{self.target} is not a function")
+        self.module = module
+        self.func = func
+        return func
+
+    def unload(self):
+        """
+        Forget a failed import, so the retry runs the module again
+        """
+        self.func = self.module = None
+        sys.modules.pop(self.target.partition(":")[0].strip(), None)
+
+
+def parse_drivers(text):
+    """
+    {name: "module:function"} of a "name = module:function, ..." setting
+    """
+    drivers = {}
+    for item in text.split(","):
+        name, separator, target = item.partition("=")
+        if not item.strip():
+            continue
+        if not separator or ":" not in target:
+            logger.error("❌ Invalid sensor driver '%s' (expected 'name = module:function').", item.strip())
+            continue
+        drivers[name.strip()] = target.strip()
+    return drivers
+
+
+def entry_point_drivers(group=ENTRY_POINT_GROUP):
+    """
+    {name: "module:function"} of the entry points of the installed packages
+    """
+    try:
+        points = metadata.entry_points(group=group)
+    except TypeError:
+        points = metadata.entry_points().get(group, []) # Python < 3.10
+    return {point.name: point.value for point in points}
+
+
+def discover_drivers(config=SENSOR_DRIVERS, entry_points=SENSOR_ENTRY_POINTS):
+    """
+    Drivers of the setting plus those of the entry points (an entry
+    point with the name of a configured sensor replaces it)
+    """
+    drivers = {name: SensorDriver(name, target, "config") for name, target in parse_drivers(config).items()}
+    if entry_points:
+        try:
+            for name, target in entry_point_drivers().items():
+                drivers[name] = SensorDriver(name, target, "entry point")
+        except Exception as e:
+            logger.error("❌ Could not read the sensor entry points: %s", e)
+    return drivers
+##################################################################################################
+
+
+
+###################################### SENSOR REGISTRY ###########################################
+##################################################################################################
+class SensorRegistry:
+    """
+    Imports each driver on the first "module(name)" call and then
+    calls "on_ready(driver)". A failed import releases the devices it
+    created and is retried after "retry" seconds, doubling up to
+    "retry_max".
+    """
+
+    def __init__(self, on_ready, drivers=None, retry=SENSOR_INIT_RETRY, retry_max=SENSOR_INIT_RETRY_MAX):
+        self.on_ready = on_ready
+        self.drivers = drivers if drivers is not None else discover_drivers()
+        self.retry = retry
+        self.retry_max = retry_max
+        self.lock = threading.Lock()
+        self.all_ready = threading.Event()
+        self.started = None
+        self.ready_count = 0
+
+    def start(self):
+        """
+        Start the clock of the startup stats (the drivers load on their first read)
+        """
+        self.started = time.perf_counter()
+        logger.info("🔎 %d sensor drivers: %s", len(self.drivers),
+                    ", ".join(f"{name} ({driver.source})" for name, driver in self.drivers.items()))
+        if not self.drivers:
+            self.all_ready.set()
+
+    def load(self, driver):
+        """
+        Import a driver (with its lock held). On a failure the devices
+        created by the import are released before the next attempt.
+        """
+        backend = get_backend()
+        mark = backend.device_count()
+        driver.attempts += 1
+        started = time.perf_counter()
+        try:
+            driver.load()
+        except Exception as e:
+            released = backend.release(mark)
+            driver.unload()
+            driver.error = f"{type(e).__name__}: {e}"
+            delay = min(self.retry * 2 ** (driver.attempts - 1), self.retry_max)
+            driver.next_attempt = time.monotonic() + delay
+            logger.error("❌ %s driver failed (attempt %d): %s. %d devices released, retrying in %.0f s.",
+                         driver.name, driver.attempts, driver.error, released, delay)
+            return False
+
+        with self.lock:
+            driver.load_seconds = time.perf_counter() - started
+            driver.ready_after = time.perf_counter() - (self.started or started)
+            driver.error = None
+            self.ready_count += 1
+            everything = self.ready_count == len(self.drivers)
+        logger.info("🔌 %s driver ready in %.2f s (%.2f s after start, attempt %d).",
+                    driver.name, driver.load_seconds, driver.ready_after, driver.attempts)
+        if everything:
+            logger.info("🚀 All %d sensor drivers ready %.2f s after start.", self.ready_count, driver.ready_after)
+            self.all_ready.set()
+        self.on_ready(driver)
+        return True
+
+    def wait_ready(self, timeout=None):
+        return self.all_ready.wait(timeout)
+
+    def module(self, name, load=True):
+        """
+        Module of a driver, imported by the first call. None if it isn't
+        ready: unknown, being imported by another thread, failed and
+        waiting for its retry, or not loaded yet with "load" False.
+        """
+        driver = self.drivers.get(name)
+        if driver is None:
+            return None
+        if driver.func is None and load and time.monotonic() >= driver.next_attempt:
+            if driver.lock.acquire(blocking=False):
+                try:
+                    if driver.func is None:
+                        self.load(driver)
+                finally:
+                    driver.lock.release()
+        return driver.module if driver.func is not None else None
+
+    def reader(self, name):
+        """
+        Read function of a driver for the scheduler: the first read
+        imports it and the reads give None while it isn't ready
+        """
+        def read():
+            if self.module(name) is None:
+                return None
+            return self.drivers[name].func()
+        return read
+
+    def stats(self):
+        with self.lock:
+            return {
+                name: {
+                    "source": driver.source,
+                    "ready": driver.func is not None,
+                    "attempts": driver.attempts,
+                    "load_ms": round(driver.load_seconds * 1000, 1) if driver.load_seconds is not None else None,
+                    "ready_after_s": round(driver.ready_after, 2) if driver.ready_after is not None else None,
+                    "error": driver.error,
+                }
+                for name, driver in self.drivers.items()
+            }
+
+    def log_stats(self):
+        for name, stats in self.stats().items():
+            logger.info("📈 %s driver: %s", name, ", ".join(f"{key}={value}" for key, value in stats.items()))
+##################################################################################################
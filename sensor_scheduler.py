@@ -0,0 +1,283 @@
+"""
+This program schedules the sensor reads of "main.py" from a
+single thread: a heap of due times runs each sensor at its own
+period, aligned to the wall clock so the schedule never drifts,
+while the blocking drivers run in a small pool of workers with
+a timeout per read. The delay between the due time and the
+start of each read (jitter) is recorded per sensor.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import heapq
+import logging
+import threading
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from hal import get_clock
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_dotenv("./Env/.env.config")
+
+
+# ====== SCHEDULER SETTINGS ======
+SENSOR_PERIOD = float(os.getenv("SENSOR_PERIOD") or 60) # Default seconds between reads of a sensor
+SENSOR_READ_TIMEOUT = float(os.getenv("SENSOR_READ_TIMEOUT") or 30) # Seconds before a read is given up
+SENSOR_WORKERS = int(os.getenv("SENSOR_WORKERS") or 3) # Threads running the blocking drivers
+
+
+# ====== HEAP EVENTS ======
+EVENT_READ = 0
+EVENT_TIMEOUT = 1
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+##################################### SENSOR STATISTICS ##########################################
+##################################################################################################
+class SensorStats:
+    """
+    Counters of a sensor, constant size
+    """
+
+    __slots__ = ("reads", "errors", "timeouts", "skipped", "jitter_total", "jitter_max", "read_total")
+
+    def __init__(self):
+        self.reads = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.skipped = 0 # Due reads not started (previous read still running or schedule missed)
+        self.jitter_total = 0.0
+        self.jitter_max = 0.0
+        self.read_total = 0.0
+
+    def as_dict(self):
+        started = self.reads + self.errors + self.timeouts
+        return {
+            "reads": self.reads,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+            "jitter_mean_ms": round(self.jitter_total / started * 1000, 2) if started else 0.0,
+            "jitter_max_ms": round(self.jitter_max * 1000, 2),
+            "read_mean_ms": round(self.read_total / self.reads * 1000, 2) if self.reads else 0.0,
+        }
+
+
+class SensorTask:
+    """
+    A sensor with its period, read timeout and the read in progress
+    """
+
+    __slots__ = ("name", "func", "period", "timeout", "stats", "future", "due", "abandoned", "next_due")
+
+    def __init__(self, name, func, period, timeout):
+        self.name = name
+        self.func = func
+        self.period = period
+        self.timeout = timeout
+        self.stats = SensorStats()
+        self.future = None # Read in progress
+        self.due = None # Due time of the read in progress
+        self.abandoned = None # Due time of a read given up after its timeout
+        self.next_due = None # Due time of the next read (older heap entries are stale)
+
+    @property
+    def read_timeout(self):
+        return min(self.timeout, self.period)
+##################################################################################################
+
+
+
+###################################### SENSOR SCHEDULER ##########################################
+##################################################################################################
+class SensorScheduler:
+    """
+    Runs every sensor at its period from one thread. "on_reading(name,
+    value, due)" gets each value; "ready()" tells if readings are wanted
+    now (while it is False the due reads are not taken).
+    """
+
+    def __init__(self, on_reading, ready=None, workers=SENSOR_WORKERS, stop_event=None, clock=None):
+        self.on_reading = on_reading
+        self.clock = clock or get_clock() # Simulated time with the simulated sensors
+        self.ready = ready or (lambda: True)
+        self.stop_event = stop_event or threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sensor")
+        self.lock = threading.Lock() # Protects the stats (updated by the workers)
+        self.wakeup = threading.Event()
+        self.tasks = {}
+        self.heap = [] # (time, order, event, task, due of the read)
+        self.order = 0
+        self.thread = None
+
+    def add(self, name, func, period=SENSOR_PERIOD, timeout=SENSOR_READ_TIMEOUT):
+        """
+        Schedule "func" every "period" seconds, on the multiples of the
+        period in wall clock time (e.g. 60 -> at each minute)
+        """
+        task = SensorTask(name, func, period, timeout)
+        with self.lock: # A driver may be added while running
+            self.tasks[name] = task
+        self.schedule(task, self.next_due(period, self.clock.time()))
+        logger.info("⏱️ %s scheduled every %.1f s (timeout %.1f s).", name, period, task.read_timeout)
+        return task
+
+    def set_period(self, name, period):
+        """
+        Change the period of a sensor, from its next aligned slot
+        """
+        task = self.tasks.get(name)
+        if task is None or task.period == period:
+            return
+        task.period = period
+        self.schedule(task, self.next_due(period, self.clock.time()))
+        logger.info("⏱️ %s now every %.1f s.", name, period)
+
+    def schedule(self, task, due):
+        task.next_due = due
+        self.push(due, EVENT_READ, task)
+
+    @staticmethod
+    def next_due(period, now):
+        return (now // period + 1) * period
+
+    def push(self, when, event, task, due=None):
+        with self.lock:
+            heapq.heappush(self.heap, (when, self.order, event, task, when if due is None else due))
+            self.order += 1
+        self.wakeup.set()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="sensor-scheduler")
+        self.thread.start()
+        return self.thread
+
+    def run(self):
+        while not self.stop_event.is_set():
+            # Cleared before looking at the heap, so an event pushed meanwhile ends the wait
+            self.wakeup.clear()
+            with self.lock:
+                when, _, event, task, due = self.heap[0] if self.heap else (None, None, None, None, None)
+            if when is None:
+                self.wait(1.0)
+                continue
+
+            if event == EVENT_READ and due != task.next_due:
+                # Replaced by a new period
+                with self.lock:
+                    heapq.heappop(self.heap)
+                continue
+
+            delay = when - self.clock.time()
+            if event == EVENT_READ and delay > task.period:
+                # The clock went back: realign the sensor to the new time
+                with self.lock:
+                    heapq.heappop(self.heap)
+                self.schedule(task, self.next_due(task.period, self.clock.time()))
+                continue
+            if delay > 0:
+                self.wait(delay)
+                continue
+
+            with self.lock:
+                heapq.heappop(self.heap)
+            if event == EVENT_READ:
+                self.start_read(task, due)
+            else:
+                self.check_timeout(task, due)
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def wait(self, delay):
+        # Woken up early by the stop or by a new event
+        self.clock.wait(self.wakeup, delay)
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.log_stats()
+
+    def start_read(self, task, due):
+        """
+        Submit the read due at "due" and schedule the next one
+        """
+        # Next due time from the schedule, not from now: no drift
+        next_due = due + task.period
+        now = self.clock.time()
+        if next_due <= now:
+            # Far behind (e.g. clock change or a suspended node): skip to the next slot
+            missed = int((now - next_due) // task.period) + 1
+            with self.lock:
+                task.stats.skipped += missed
+            next_due += missed * task.period
+        self.schedule(task, next_due)
+
+        if not self.ready():
+            return
+        if task.future is not None and not task.future.done():
+            with self.lock:
+                task.stats.skipped += 1
+            logger.warning("⚠️ %s read skipped: the previous read is still running.", task.name)
+            return
+
+        task.due = due
+        task.future = self.executor.submit(self.read, task, due)
+        self.push(due + task.read_timeout, EVENT_TIMEOUT, task, due)
+
+    def read(self, task, due):
+        """
+        Run the blocking driver (in a worker)
+        """
+        started = self.clock.time()
+        with self.lock:
+            jitter = max(0.0, started - due)
+            task.stats.jitter_total += jitter
+            task.stats.jitter_max = max(task.stats.jitter_max, jitter)
+        try:
+            value = task.func()
+        except Exception as e:
+            with self.lock:
+                task.stats.errors += 1
+            logger.error("%s read error: %s", task.name, e)
+            return
+
+        with self.lock:
+            if task.abandoned == due:
+                # Too late, its timeout was already counted
+                logger.info("⌛ Late %s value discarded (%.1f s).", task.name, self.clock.time() - started)
+                return
+            task.stats.reads += 1
+            task.stats.read_total += self.clock.time() - started
+        self.on_reading(task.name, value, due)
+
+    def check_timeout(self, task, due):
+        with self.lock:
+            if task.due != due or task.future is None or task.future.done():
+                return
+            task.abandoned = due
+            task.stats.timeouts += 1
+        logger.warning("⌛ %s read timed out after %.1f s.", task.name, task.read_timeout)
+
+    def stats(self):
+        with self.lock:
+            return {name: task.stats.as_dict() for name, task in self.tasks.items()}
+
+    def log_stats(self):
+        for name, stats in self.stats().items():
+            logger.info("📈 %s: %s", name, ", ".join(f"{key}={value}" for key, value in stats.items()))
+##################################################################################################
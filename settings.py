@@ -0,0 +1,149 @@
+"""
+This program resolves the configuration of the server side
+("metrics_receiver.py" and "metrics_uploader.py") once: the
+.env files are loaded a single time and the variables are
+parsed into a typed, read-only Settings object. Importing
+it has no other side effects.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import threading
+from typing import Optional
+from dataclasses import dataclass
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT FILES ======
+ENV_FILES = ("./Env/.env", "./Env/.env.public", "./Env/.env.config") # Credentials, public and config
+
+
+# ====== SHARED SETTINGS ======
+_SETTINGS = None
+_ENVIRONMENT_LOADED = False
+_SETTINGS_LOCK = threading.Lock()
+##################################################################################################
+
+
+
+######################################## SETTINGS ################################################
+##################################################################################################
+def load_environment():
+    """
+    Load the .env files into os.environ (only the first call does it)
+    """
+    global _ENVIRONMENT_LOADED
+    with _SETTINGS_LOCK:
+        if _ENVIRONMENT_LOADED:
+            return
+        from dotenv import load_dotenv
+        for env_file in ENV_FILES:
+            load_dotenv(env_file)
+        _ENVIRONMENT_LOADED = True
+
+
+def _get_int(name, default=None):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _get_float(name, default=None):
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _get_bool(name, default):
+    value = os.getenv(name)
+    return default if value in (None, "") else value.strip().lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Typed configuration of the server and the uploader
+    """
+
+    # Identity in Upstream (needed only by the upload path)
+    station_id: Optional[int]
+    campaign_id: Optional[int]
+
+    # Receiver
+    receiver_port: int
+    recent_api_host: str
+    recent_api_port: int
+    recent_window_hours: float
+    writer_sharding: str
+    writer_shards: int
+
+    # Upload scheduling
+    upload_retry_check: int
+    catchup_on_start: bool
+    incremental_upload_minutes: float
+
+    # Uploader
+    upstream_base_url: Optional[str]
+    upstream_refresh_margin: int
+    upstream_pool_size: int
+    upload_spill_threshold: int
+    upload_max_memory: int
+    upload_workers: int
+    upload_host_concurrency: int
+    catchup_batch_bytes: int
+
+    # MINT job submission
+    mint_url: Optional[str]
+
+    @classmethod
+    def from_environment(cls):
+        load_environment()
+        return cls(
+            station_id=_get_int("STATION_ID"),
+            campaign_id=_get_int("CAMPAIGN_ID"),
+            receiver_port=_get_int("RECEIVER_PORT", 4040),
+            recent_api_host=os.getenv("RECENT_API_HOST") or "127.0.0.1", # Local only by default
+            recent_api_port=_get_int("RECENT_API_PORT", 4041), # 0 disables the query API
+            recent_window_hours=_get_float("RECENT_WINDOW_HOURS", 24.0),
+            writer_sharding=(os.getenv("WRITER_SHARDING") or "none").strip().lower(), # none | station | node
+            writer_shards=_get_int("WRITER_SHARDS", 4),
+            upload_retry_check=_get_int("UPLOAD_RETRY_CHECK", 30),
+            catchup_on_start=_get_bool("CATCHUP_ON_START", True),
+            incremental_upload_minutes=_get_float("INCREMENTAL_UPLOAD_MINUTES", 0.0), # 0 = upload once per hour
+            upstream_base_url=os.getenv("BASE_URL"),
+            upstream_refresh_margin=_get_int("UPSTREAM_REFRESH_MARGIN", 600), # Seconds before the token expiry to refresh
+            upstream_pool_size=_get_int("UPSTREAM_POOL_SIZE", max(8, _get_int("UPLOAD_HOST_CONCURRENCY", 4))), # Keep-alive connections
+            upload_spill_threshold=_get_int("UPLOAD_SPILL_THRESHOLD", 4 * 1024 * 1024),
+            upload_max_memory=_get_int("UPLOAD_MAX_MEMORY", 16 * 1024 * 1024),
+            upload_workers=_get_int("UPLOAD_WORKERS", 4),
+            upload_host_concurrency=_get_int("UPLOAD_HOST_CONCURRENCY", 4),
+            catchup_batch_bytes=_get_int("CATCHUP_BATCH_BYTES", 8 * 1024 * 1024),
+            mint_url=os.getenv("MINT_URL"),
+        )
+
+    def require(self, name):
+        """
+        Value of a setting that must be defined (e.g. campaign_id to upload)
+        """
+        value = getattr(self, name)
+        if value is None:
+            raise ValueError(f"Missing setting {name.upper()} in the .env files")
+        return value
+
+
+def get_settings():
+    """
+    Process-wide settings, resolved on the first call
+    """
+    global _SETTINGS
+    if _SETTINGS is None:
+        settings = Settings.from_environment()
+        with _SETTINGS_LOCK:
+            if _SETTINGS is None:
+                _SETTINGS = settings
+    return _SETTINGS
+##################################################################################################
@@ -0,0 +1,250 @@
+"""
+This program keeps a durable queue of the files waiting to
+be uploaded by "metrics_uploader.py". Each file records the
+stations already uploaded (checkpoints), so a retry only sends
+the stations that failed, and failed files are retried with
+exponential backoff and jitter. The queue is saved to disk
+after every change and survives restarts.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import sys
+import json
+import time
+import random
+import logging
+import datetime
+import threading
+from settings import load_environment
+from archive_manager import partition_key
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== ENVIRONMENT VARIABLES ======
+load_environment()
+
+
+# ====== QUEUE PATHS ======
+LOG_DIR = "./Logs/"
+UPLOAD_QUEUE_FILE = os.getenv("UPLOAD_QUEUE_FILE") or os.path.join(LOG_DIR, "upload_queue.json")
+
+
+# ====== RETRY SETTINGS ======
+RETRY_BASE_DELAY = float(os.getenv("UPLOAD_RETRY_BASE") or 60) # Seconds before the first retry
+RETRY_MAX_DELAY = float(os.getenv("UPLOAD_RETRY_MAX") or 3600) # Upper bound of the backoff
+
+
+# ====== STATION STATUS VALUES ======
+STATION_UPLOADED = "uploaded"
+STATION_FAILED = "failed"
+
+
+# ====== SHARED QUEUE ======
+_QUEUE = None
+_QUEUE_LOCK = threading.Lock()
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+###################################### BACKOFF POLICY ############################################
+##################################################################################################
+def backoff_delay(attempts, base=RETRY_BASE_DELAY, maximum=RETRY_MAX_DELAY):
+    """
+    Seconds to wait after "attempts" failed attempts: exponential
+    backoff capped at "maximum", with jitter in [delay/2, delay]
+    so files that failed together don't retry together
+    """
+    delay = min(maximum, base * (2 ** max(attempts - 1, 0)))
+    return random.uniform(delay / 2, delay)
+##################################################################################################
+
+
+
+####################################### UPLOAD QUEUE #############################################
+##################################################################################################
+class UploadQueue:
+    """
+    Files pending upload with their per-station checkpoints
+    """
+
+    def __init__(self, queue_file=UPLOAD_QUEUE_FILE):
+        self.queue_file = queue_file
+        self.lock = threading.Lock()
+        self.in_flight = set() # Keys being uploaded now (not persisted)
+        self.entries = self.load()
+
+    def load(self):
+        try:
+            with open(self.queue_file, "r", encoding="utf-8") as file:
+                return json.load(file).get("files", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error("❌ Upload queue %s unreadable, starting empty: %s", self.queue_file, e)
+            return {}
+
+    def save(self):
+        """
+        Write the queue atomically (must be called with the lock held)
+        """
+        os.makedirs(os.path.dirname(self.queue_file) or ".", exist_ok=True)
+        tmp_path = self.queue_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"files": self.entries}, file, indent=2, sort_keys=True)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.queue_file)
+
+    def add(self, file_path, sensors_file=None):
+        """
+        Queue a file for upload, its checkpoints are kept if it is already queued
+        """
+        key = partition_key(file_path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = {
+                    "file": file_path,
+                    "sensors_file": sensors_file,
+                    "added_at": datetime.datetime.now().strftime(TIME_FORMAT),
+                    "attempts": 0,
+                    "next_attempt": 0,
+                    "last_error": None,
+                    "stations": {},
+                }
+                self.entries[key] = entry
+            else:
+                entry["file"] = file_path
+            self.save()
+        return key
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            return json.loads(json.dumps(entry)) if entry is not None else None
+
+    def claim(self, key):
+        """
+        Reserve a file for one uploader, False if it is already being uploaded
+        """
+        with self.lock:
+            if key not in self.entries or key in self.in_flight:
+                return False
+            self.in_flight.add(key)
+            return True
+
+    def release(self, key):
+        with self.lock:
+            self.in_flight.discard(key)
+
+    def done_stations(self, key):
+        """
+        Stations of the file that were already uploaded
+        """
+        with self.lock:
+            entry = self.entries.get(key, {})
+            return {station for station, state in entry.get("stations", {}).items() if state["status"] == STATION_UPLOADED}
+
+    def record_results(self, key, results, error=None, retry_at=None, empty=False):
+        """
+        Checkpoint the result of an attempt. "results" maps each station
+        to None (uploaded) or its error, "error" is a failure of the whole
+        file. With "retry_at" (epoch) the file waits until then instead of
+        backing off. Return True when every station of the file is uploaded:
+        a file without any station checkpoint is only complete if "empty"
+        (it was read and has no rows to upload).
+        """
+        now = datetime.datetime.now().strftime(TIME_FORMAT)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False
+
+            for station, station_error in results.items():
+                state = entry["stations"].setdefault(str(station), {"status": STATION_FAILED, "attempts": 0})
+                state["attempts"] += 1
+                state["error"] = station_error
+                state["status"] = STATION_UPLOADED if station_error is None else STATION_FAILED
+                if station_error is None:
+                    state["uploaded_at"] = now
+
+            failed = sorted(station for station, state in entry["stations"].items() if state["status"] != STATION_UPLOADED)
+            complete = error is None and not failed and (bool(entry["stations"]) or empty)
+            if not complete and retry_at is not None:
+                entry["next_attempt"] = retry_at
+                entry["last_error"] = f"stations {', '.join(failed)} deferred"
+            elif not complete:
+                entry["attempts"] += 1
+                entry["next_attempt"] = time.time() + backoff_delay(entry["attempts"])
+                entry["last_error"] = error or (f"stations {', '.join(failed)} failed" if failed else "no station uploaded")
+            self.save()
+            return complete
+
+    def remove(self, key):
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.save()
+
+    def due(self, now=None):
+        """
+        Keys of the files whose next attempt time has passed, oldest first
+        """
+        now = now or time.time()
+        with self.lock:
+            return [
+                key for key, entry in sorted(self.entries.items(), key=lambda item: item[1]["next_attempt"])
+                if entry["next_attempt"] <= now and key not in self.in_flight
+            ]
+
+    def pending(self):
+        with self.lock:
+            return [dict(entry, key=key) for key, entry in sorted(self.entries.items())]
+
+
+def get_upload_queue():
+    """
+    Process-wide shared upload queue
+    """
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = UploadQueue()
+        return _QUEUE
+
+
+def print_status():
+    """
+    Show the queued files, their checkpoints and next attempt
+    """
+    entries = get_upload_queue().pending()
+    print(f"📬 Upload queue: {UPLOAD_QUEUE_FILE}")
+    print(f"   Files: {len(entries)}")
+    for entry in entries:
+        uploaded = sum(1 for state in entry["stations"].values() if state["status"] == STATION_UPLOADED)
+        next_attempt = datetime.datetime.fromtimestamp(entry["next_attempt"]).strftime(TIME_FORMAT)
+        print(f"   - {entry['key']} attempts={entry['attempts']} stations={uploaded}/{len(entry['stations'])} uploaded next={next_attempt} error={entry['last_error']}")
+##################################################################################################
+
+
+
+#################################### PROGRAM EXECUTION ###########################################
+##################################################################################################
+if __name__ == "__main__":
+    # Usage: python upload_queue.py status
+    if len(sys.argv) <= 1 or sys.argv[1] == "status":
+        print_status()
+    else:
+        print("Usage: python upload_queue.py status")
+##################################################################################################
@@ -0,0 +1,266 @@
+"""
+This program keeps a single authenticated Upstream client
+shared by "metrics_uploader.py" and "campaign_manager.py".
+The token is cached until shortly before it expires and is
+refreshed in the background, and the CSV uploads (validated
+with the SDK) are posted through one keep-alive connection
+pool owned by the session, their files streamed in blocks.
+"""
+
+
+
+################################ IMPORT MODULES AND LIBRARIES ####################################
+##################################################################################################
+import os
+import uuid
+import logging
+import datetime
+import threading
+from settings import get_settings, load_environment
+# "requests" and the Upstream SDK are imported on the first use (slow to load on a Pi)
+##################################################################################################
+
+
+
+############################### GLOBAL VARIABLES INITIALIZATION ##################################
+##################################################################################################
+# ====== SESSION SETTINGS ======
+# (UPSTREAM_REFRESH_MARGIN and UPSTREAM_POOL_SIZE are read by settings.py on the first session)
+RETRY_INTERVAL = 60 # Seconds between refresh attempts after a failure
+UPLOAD_PATH = "/api/v1/uploadfile_csv/campaign/{campaign_id}/station/{station_id}/sensor" # SDK CSV upload endpoint
+
+
+# ====== SHARED SESSION ======
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+# ====== LOGGING SETUP ======
+logger = logging.getLogger(__name__)
+##################################################################################################
+
+
+
+################################### KEEP-ALIVE HTTP POOL #########################################
+##################################################################################################
+def create_http_session(pool_size):
+    """
+    requests.Session with a keep-alive pool for HTTP and HTTPS
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class MultipartBody:
+    """
+    multipart/form-data body of files ({field: path}), read in blocks
+    from the files as it is sent, never whole in memory, with its
+    length known for the Content-Length header
+    """
+
+    def __init__(self, files):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.parts = [] # bytes or file paths, in order
+        for field, path in files.items():
+            self.parts.append((f'--{self.boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+                               f'filename="{os.path.basename(path)}"\r\n\r\n').encode())
+            self.parts.append(path)
+            self.parts.append(b"\r\n")
+        self.parts.append(f"--{self.boundary}--\r\n".encode())
+        self.length = sum(len(part) if isinstance(part, bytes) else os.path.getsize(part) for part in self.parts)
+        self.index = 0
+        self.file = None
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        size = self.length if size is None or size < 0 else size
+        data = b""
+        while len(data) < size and self.index < len(self.parts):
+            part = self.parts[self.index]
+            if isinstance(part, bytes):
+                data += part
+                self.index += 1
+                continue
+            if self.file is None:
+                self.file = open(part, "rb")
+            block = self.file.read(size - len(data))
+            if block:
+                data += block
+            else:
+                self.file.close()
+                self.file = None
+                self.index += 1
+        return data
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+##################################################################################################
+
+
+
+###################################### UPSTREAM SESSION ##########################################
+##################################################################################################
+class UpstreamSession:
+    """
+    One authenticated UpstreamClient, refreshed before its token expires
+    """
+
+    def __init__(self, username=None, password=None, base_url=None, ckan_url=None, ckan_organization=None):
+        load_environment() # Credentials from the .env files
+        settings = get_settings()
+        self.refresh_margin = settings.upstream_refresh_margin
+        self.pool_size = settings.upstream_pool_size
+        self.credentials = {
+            "username": username or os.getenv("userid"),
+            "password": password or os.getenv("password"),
+            "base_url": base_url or settings.upstream_base_url,
+            "ckan_url": ckan_url or os.getenv("CKAN_URL"),
+            "ckan_organization": ckan_organization or os.getenv("CKAN_ORG"),
+        }
+        self.client = None
+        self.http_session = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.refresh_event = threading.Event() # Wakes up the refresher after a login
+        self.refresher = None
+        self.logins = 0
+
+    def get_client(self):
+        """
+        Return the shared client, authenticated with a valid token
+        """
+        with self.lock:
+            if self.client is None:
+                from upstream.client import UpstreamClient
+                self.http_session = create_http_session(self.pool_size)
+                self.client = UpstreamClient(**self.credentials)
+
+            if not self.token_valid():
+                self.login()
+
+            if self.refresher is None:
+                self.refresher = threading.Thread(target=self.refresh_job, name="Upstream-Token-Refresh", daemon=True)
+                self.refresher.start()
+            return self.client
+
+    def login(self):
+        """
+        Authenticate the client (must be called with the lock held)
+        """
+        if not self.client.authenticate():
+            raise RuntimeError("Upstream authentication failed")
+        self.logins += 1
+        self.refresh_event.set()
+        logger.info("🔑 Upstream token obtained, valid until %s", self.expires_at())
+
+    def expires_at(self):
+        return getattr(self.client.auth_manager, "token_expires_at", None) if self.client else None
+
+    def token_valid(self, margin=0):
+        """
+        True if the cached token is still valid for "margin" seconds
+        """
+        expires_at = self.expires_at()
+        if not expires_at or not getattr(self.client.auth_manager, "access_token", None):
+            return False
+        return datetime.datetime.now() + datetime.timedelta(seconds=margin) < expires_at
+
+    def refresh_job(self):
+        """
+        Background thread: log in again UPSTREAM_REFRESH_MARGIN seconds before expiry
+        """
+        while not self.stop_event.is_set():
+            self.refresh_event.clear()
+            expires_at = self.expires_at()
+            if expires_at is None:
+                wait_time = RETRY_INTERVAL
+            else:
+                wait_time = (expires_at - datetime.timedelta(seconds=self.refresh_margin) - datetime.datetime.now()).total_seconds()
+
+            if wait_time > 0:
+                # Sleep until the refresh time (or until a new login moves it)
+                self.refresh_event.wait(wait_time)
+                continue
+
+            with self.lock:
+                if self.token_valid(self.refresh_margin):
+                    continue
+                try:
+                    self.login()
+                    logger.info("🔄 Upstream token refreshed in background.")
+                except Exception as e:
+                    logger.error("❌ Background token refresh failed: %s", e)
+            if self.stop_event.wait(0 if self.token_valid(self.refresh_margin) else RETRY_INTERVAL):
+                break
+
+    def upload_csv_data(self, campaign_id, station_id, sensors_file, measurements_file, throttle=None):
+        """
+        Upload a sensors and a measurements CSV file of a station: the
+        files are validated by the SDK, as its upload_csv_data() does,
+        and posted through the keep-alive pool of the session. The body
+        is streamed from the files, through "throttle(body)" if given
+        (e.g. the reader of the bandwidth limiter).
+        """
+        from upstream.exceptions import APIError, ValidationError
+
+        client = self.get_client() # Valid token
+        client.data.validator.validate_csv_file(sensors_file, "sensors")
+        client.data.validator.validate_csv_file(measurements_file, "measurements")
+
+        auth = client.auth_manager
+        headers = auth.get_headers(include_tapis_token=bool(auth.get_tapis_token())) # X-TAPIS-TOKEN as the SDK sends it
+        body = MultipartBody({"upload_file_sensors": sensors_file, "upload_file_measurements": measurements_file})
+        headers["Content-Type"] = body.content_type
+        try:
+            response = self.http_session.post(
+                auth.build_url(UPLOAD_PATH.format(campaign_id=campaign_id, station_id=station_id)),
+                headers=headers,
+                data=throttle(body) if throttle is not None else body,
+                timeout=auth.config.timeout,
+                verify=auth.config.request_verify,
+            )
+        finally:
+            body.close()
+
+        if response.status_code == 422:
+            raise ValidationError(f"Data validation failed: {response.text}")
+        if response.status_code >= 400:
+            raise APIError(message=f"Failed to upload data: {response.status_code}", status_code=response.status_code,
+                           response_data={"raw_body": response.text})
+        return response
+
+    def close(self):
+        self.stop_event.set()
+        self.refresh_event.set()
+        if self.http_session is not None:
+            self.http_session.close()
+
+
+def get_upstream_session():
+    """
+    Process-wide shared session
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = UpstreamSession()
+        return _SESSION
+
+
+def get_upstream_client():
+    """
+    Shared authenticated UpstreamClient
+    """
+    return get_upstream_session().get_client()
+##################################################################################################
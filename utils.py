@@ -4,25 +4,20 @@ File that contains useful functions
 
 
 import os
-import requests
+import logging
 import datetime
-from dotenv import load_dotenv
-from tapipy.tapis import Tapis
+import threading
+from settings import get_settings
+# "requests" and "tapipy" are imported by the functions that use them (slow to load on a Pi)
 # from utils import get_streamflow_data, set_model_parameters, submit_subtask
 
 
 
-# === ENVIRONMENT  VARIABLES ===
-load_dotenv("./Env/.env")         # Tapis credentials
-load_dotenv("./Env/.env.public")  # Public env variables
-
-
-# === CONFIGURATION ===
-base_url = os.getenv('MINT_URL')
+# === LOGGING ===
+logger = logging.getLogger(__name__)
 
 
 # === TASK SETUP ===
-base_url = os.getenv('MINT_URL')
 problem_statement = 'IDYnqZpBGvZpL4GPLRcg'
 task = 'dwDiJ0dymXPd93kvlF9S'
 sub_task = 'qwiUq7XqNK9bp6crSDj6'
@@ -32,6 +27,7 @@ sub_task = 'qwiUq7XqNK9bp6crSDj6'
 
 def get_streamflow_data():
     """Fetch streamflow data from USGS API and extract the streamflow value."""
+    import requests
     url = "https://waterservices.usgs.gov/nwis/iv/?format=json&sites=15304000&siteStatus=all"
     
     try:
@@ -79,7 +75,9 @@ def get_streamflow_data():
 
 def set_model_parameters(problem_statement_id, task_id, subtask_id, model_config, auth_token=None):
     """Set parameters for a specific subtask/model configuration."""
+    import requests
     # base_url = "https://ensemble-manager.mint.tacc.utexas.edu/v1"
+    base_url = get_settings().mint_url
     endpoint = f"{base_url}/problemStatements/{problem_statement_id}/tasks/{task_id}/subtasks/{subtask_id}/parameters"
     
     headers = {
@@ -111,7 +109,9 @@ def set_model_parameters(problem_statement_id, task_id, subtask_id, model_config
 
 def submit_subtask(problem_statement_id, task_id, subtask_id, model_config, auth_token=None):
     """Submit a subtask for execution."""
+    import requests
     # base_url = "https://ensemble-manager.mint.tacc.utexas.edu/v1"
+    base_url = get_settings().mint_url
     endpoint = f"{base_url}/problemStatements/{problem_statement_id}/tasks/{task_id}/subtasks/{subtask_id}/submit"
     
     headers = {
@@ -180,6 +180,8 @@ def job_submission():
             logger.info("Streamflow Value: %.2f m³/s", streamflow)
 
             # Create python Tapis client for user (for authentication)
+            from tapipy.tapis import Tapis
+            get_settings() # Loads the Tapis credentials from the .env files
             t = Tapis(base_url="https://portals.tapis.io",
                     username=os.getenv('userid'),
                     password=os.getenv('password'))